@@ -0,0 +1,329 @@
+"""Benchmarks for the lab3 propositional tooling
+
+Run this file directly to print the tables:
+    python benchmark.py                 # everything
+    python benchmark.py normalize       # CNF conversion only
+    python benchmark.py solvers --timeout 60 --history history.json
+
+The solver benchmark runs `dpll()` and Z3 (through `to_z3()`) on the
+families below, and appends one record per run to a history file (CSV,
+or JSON lines if the name ends in .json), tagged with the git commit,
+so that a regression shows up as a change between commits. The table
+compares each run with the latest one of another commit. The history
+is kept out of the source tree by default, in `DEFAULT_HISTORY`.
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+import z3
+
+from dpll import PImplies, PNot, POr, PVar, Prop, cnf, conjoin, dpll, flatten, ie, nnf, normalize, to_z3
+
+
+########################################
+# CNF conversion: the three recursive passes ie/nnf/cnf followed by
+# `flatten`, against the fused, non-recursive `normalize`.
+
+# ~(...~(~(p0 -> p1) -> p2)... -> pn), leaning to the left
+def deep_chain(depth: int) -> Prop:
+    prop = PVar("p0")
+    for i in range(1, depth):
+        prop = PNot(PImplies(prop, PVar(f"p{i}")))
+    return prop
+
+
+# (...((p0 \/ ~p1) \/ p2) ... \/ pn), a single long clause
+def deep_clause(depth: int) -> Prop:
+    prop = PVar("p0")
+    for i in range(1, depth):
+        prop = POr(prop, PVar(f"p{i}") if i % 2 == 0 else PNot(PVar(f"p{i}")))
+    return prop
+
+
+# a balanced conjunction of (p_i -> (q_i \/ ~r_i))
+def wide_tree(width: int) -> Prop:
+    return conjoin([PImplies(PVar(f"p{i}"), POr(PVar(f"q{i}"), PNot(PVar(f"r{i}"))))
+                    for i in range(width)])
+
+
+def bench_normalize():
+    def run(convert, prop):
+        start = time.time()
+        try:
+            clauses = convert(prop)
+        except RecursionError:
+            return "RecursionError", None
+        return f"{time.time() - start:.6f}s", clauses
+
+    print(f"{'formula':<20}{'clauses':>10}{'ie/nnf/cnf/flatten':>22}{'normalize':>16}")
+    for name, family, sizes in [("deep_chain", deep_chain, [100, 1000, 10000, 100000]),
+                                ("deep_clause", deep_clause, [100, 1000, 10000, 100000]),
+                                ("wide_tree", wide_tree, [2 ** 10, 2 ** 14, 2 ** 17])]:
+        for size in sizes:
+            prop = family(size)
+            old_time, old = run(lambda p: flatten(cnf(nnf(ie(p)))), prop)
+            new_time, new = run(normalize, prop)
+            assert old is None or old == new
+            print(f"{f'{name}({size})':<20}{len(new):>10}{old_time:>22}{new_time:>16}")
+
+
+########################################
+# SAT families, each a function of its size. The CNF families build
+# their clauses as Props, so both solvers get exactly the same input.
+
+def clause(*lits: Prop) -> Prop:
+    prop = lits[0]
+    for lit in lits[1:]:
+        prop = POr(prop, lit)
+    return prop
+
+
+# uniform random 3-SAT with n variables at the phase transition m = 4.26 n
+def random_3sat(n: int, seed: int = 0) -> Prop:
+    rng = random.Random(seed)
+    xs = [PVar(f"x{i}") for i in range(n)]
+    return conjoin([clause(*(x if rng.random() < 0.5 else PNot(x) for x in rng.sample(xs, 3)))
+                    for _ in range(round(4.26 * n))])
+
+
+# n + 1 pigeons do not fit into n holes
+def pigeonhole(n: int) -> Prop:
+    p = [[PVar(f"p{i}_{j}") for j in range(n)] for i in range(n + 1)]
+    clauses = [clause(*p[i]) for i in range(n + 1)]
+    clauses += [clause(PNot(p[i][j]), PNot(p[k][j]))
+                for j in range(n) for i in range(n + 1) for k in range(i + 1, n + 1)]
+    return conjoin(clauses)
+
+
+# x1 ^ ... ^ xn computed by two chains of XOR gates in different orders,
+# one claimed true and the other false
+def parity_chains(n: int, seed: int = 0) -> Prop:
+    xs = [PVar(f"x{i}") for i in range(n)]
+    shuffled = random.Random(seed).sample(xs, n)
+    clauses = []
+
+    def chain(name: str, inputs: List[Prop]) -> Prop:
+        t = inputs[0]
+        for i, x in enumerate(inputs[1:], 1):
+            u = PVar(f"{name}{i}")
+            # u <-> t ^ x
+            clauses.extend([clause(PNot(u), t, x), clause(PNot(u), PNot(t), PNot(x)),
+                            clause(u, PNot(t), x), clause(u, t, PNot(x))])
+            t = u
+        return t
+
+    clauses.append(chain("a", xs))
+    clauses.append(PNot(chain("b", shuffled)))
+    return conjoin(clauses)
+
+
+# 3-coloring of a random graph with n vertices and 2.2 n edges, close to
+# the threshold of 3-colorability
+def graph_coloring(n: int, colors: int = 3, seed: int = 0) -> Prop:
+    rng = random.Random(seed)
+    c = [[PVar(f"c{v}_{k}") for k in range(colors)] for v in range(n)]
+    edges = set()
+    while len(edges) < round(2.2 * n):
+        u, v = sorted(rng.sample(range(n), 2))
+        edges.add((u, v))
+    clauses = [clause(*c[v]) for v in range(n)]
+    clauses += [clause(PNot(c[v][k]), PNot(c[v][l]))
+                for v in range(n) for k in range(colors) for l in range(k + 1, colors)]
+    clauses += [clause(PNot(c[u][k]), PNot(c[v][k])) for u, v in sorted(edges) for k in range(colors)]
+    return conjoin(clauses)
+
+
+FAMILIES = {
+    "random_3sat": (random_3sat, [50, 100, 150, 200]),
+    "pigeonhole": (pigeonhole, [5, 6, 7, 8]),
+    "parity": (parity_chains, [10, 15, 20, 25]),
+    "coloring": (graph_coloring, [50, 100, 200, 400]),
+}
+
+
+########################################
+# solver runs
+
+def solve_dpll(prop: Prop) -> tuple:
+    stats = {}
+    result = dpll(prop, stats=stats)
+    return "unsat" if result == "unsat" else "sat", stats
+
+
+def solve_z3(prop: Prop) -> tuple:
+    solver = z3.Solver()
+    solver.add(to_z3(prop))
+    result = solver.check()
+    statistics = solver.statistics()
+    # the counters are named "sat decisions", "sat propagations 2ary", ...
+    # or "decisions", "propagations", ... depending on the Z3 core
+    stats = {"decisions": 0, "propagations": 0, "conflicts": 0}
+    for key in statistics.keys():
+        for counter in stats:
+            if counter in key:
+                stats[counter] += statistics.get_key_value(key)
+    return str(result), stats
+
+
+SOLVERS = {"dpll": solve_dpll, "z3": solve_z3}
+
+
+def _measure(solve, prop: Prop, connection):
+    start = time.perf_counter()
+    result, stats = solve(prop)
+    elapsed = time.perf_counter() - start
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connection.send({"result": result, "time": elapsed, "peak_rss": peak,
+                     "decisions": stats["decisions"], "propagations": stats["propagations"],
+                     "conflicts": stats["conflicts"]})
+
+
+def measure(solve, prop: Prop, timeout: float) -> dict:
+    """Run `solve(prop)` in a fresh process, so that its peak RSS is its own."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_measure, args=(solve, prop, sender))
+    process.start()
+    if receiver.poll(timeout):
+        record = receiver.recv()
+    else:
+        record = {"result": "timeout", "time": timeout, "peak_rss": None,
+                  "decisions": None, "propagations": None, "conflicts": None}
+    process.terminate()
+    process.join()
+    return record
+
+
+def git_commit() -> str:
+    folder = Path(__file__).parent
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=folder,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=folder,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("+dirty" if dirty else "")
+
+
+DEFAULT_HISTORY = (Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+                   / "formal-methods-foundation" / "lab3_benchmark_history.csv")
+
+HISTORY_FIELDS = ["date", "commit", "python", "family", "size", "solver", "result", "time",
+                  "peak_rss", "decisions", "propagations", "conflicts"]
+
+
+def load_history(path: Path) -> List[dict]:
+    if not path.exists():
+        return []
+    with open(path, newline="") as fp:
+        if path.suffix == ".json":
+            return [json.loads(line) for line in fp if line.strip()]
+        return list(csv.DictReader(fp))
+
+
+def save_history(path: Path, records: List[dict]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    new = not path.exists()
+    with open(path, "a", newline="") as fp:
+        if path.suffix == ".json":
+            for record in records:
+                fp.write(json.dumps(record) + "\n")
+            return
+        writer = csv.DictWriter(fp, HISTORY_FIELDS)
+        if new:
+            writer.writeheader()
+        writer.writerows(records)
+
+
+def bench_solvers(families=FAMILIES, timeout: float = 60.0, history: str | Path | None = DEFAULT_HISTORY):
+    path = Path(history) if history else None
+    commit = git_commit()
+    # the latest time of each run on another commit
+    previous = {}
+    for record in load_history(path) if path else []:
+        if record["commit"] != commit and record["result"] != "timeout":
+            previous[record["family"], str(record["size"]), record["solver"]] = float(record["time"])
+
+    print(f"{'instance':<20}{'solver':>8}{'result':>9}{'time':>12}{'previous':>12}"
+          f"{'peak RSS':>12}{'decisions':>12}{'propagations':>14}{'conflicts':>12}")
+    records = []
+    date = datetime.now().isoformat(timespec="seconds")
+    for family, (generate, sizes) in families.items():
+        for size in sizes:
+            prop = generate(size)
+            for solver, solve in SOLVERS.items():
+                record = {"date": date, "commit": commit, "python": platform.python_version(),
+                          "family": family, "size": size, "solver": solver,
+                          **measure(solve, prop, timeout)}
+                records.append(record)
+                before = previous.get((family, str(size), solver))
+                print(f"{f'{family}({size})':<20}{solver:>8}{record['result']:>9}{record['time']:>11.4f}s"
+                      f"{f'{before:.4f}s' if before is not None else '-':>12}"
+                      f"{str(record['peak_rss']):>12}{str(record['decisions']):>12}"
+                      f"{str(record['propagations']):>14}{str(record['conflicts']):>12}")
+    if path:
+        save_history(path, records)
+    return records
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_history(self):
+        records = [{"date": "2026-01-01T00:00:00", "commit": "abc1234", "python": "3.11.7", "family": "pigeonhole",
+                    "size": 5, "solver": "dpll", "result": "unsat", "time": 0.5, "peak_rss": None,
+                    "decisions": 10, "propagations": 100, "conflicts": 7}]
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ("history.csv", "history.json"):
+                path = Path(folder) / "nested" / name
+                self.assertEqual(load_history(path), [])
+                save_history(path, records)
+                save_history(path, records)
+                loaded = load_history(path)
+                if path.suffix == ".json":
+                    self.assertEqual(loaded, records * 2)
+                else:
+                    # CSV gives back strings, and None as ""
+                    self.assertEqual(loaded, [{key: "" if value is None else str(value)
+                                               for key, value in record.items()} for record in records * 2])
+
+    def test_records(self):
+        families = {"pigeonhole": (pigeonhole, [3]), "random_3sat": (random_3sat, [10])}
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "history.csv"
+            records = bench_solvers(families, timeout=30, history=path)
+            self.assertEqual([(record["family"], record["solver"]) for record in records],
+                             [(family, solver) for family in families for solver in SOLVERS])
+            for record in records:
+                self.assertEqual(list(record), HISTORY_FIELDS)
+                self.assertEqual(record["commit"], git_commit())
+            # both solvers agree, pigeonhole is unsat
+            self.assertEqual({record["result"] for record in records[:2]}, {"unsat"})
+            self.assertEqual(records[2]["result"], records[3]["result"])
+            self.assertEqual(len(load_history(path)), len(records))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks for the lab3 propositional tooling")
+    parser.add_argument("suite", nargs="?", choices=["normalize", "solvers", "all"], default="all")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per solver run")
+    parser.add_argument("--history", default=DEFAULT_HISTORY,
+                        help=f"history file, .csv or .json (default: {DEFAULT_HISTORY})")
+    args = parser.parse_args()
+    if args.suite in ("normalize", "all"):
+        bench_normalize()
+    if args.suite in ("solvers", "all"):
+        bench_solvers(timeout=args.timeout, history=args.history)
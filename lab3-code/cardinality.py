@@ -0,0 +1,195 @@
+"""Cardinality constraints
+
+Many models need "exactly one of these" or "at most k of these": a
+person takes exactly one seat, a seat holds at most one person. Written
+by hand, at most one of n literals is usually the n(n-1)/2 pairwise
+clauses `Or(Not(x), Not(y))`, or an integer `Sum(...) == 1`, which turns
+a Boolean problem into an arithmetic one. This module builds such
+constraints with the usual encodings, as lists of Z3 constraints:
+
+  * pairwise: a clause per (k+1)-subset, no fresh variable; only
+    reasonable for very few literals;
+  * sequential counter (Sinz 2005): fresh variables s_i_j meaning "at
+    least j of the first i literals are true", O(n*k) clauses;
+  * totalizer (Bailleux and Boufkhad 2003): a binary tree of unary
+    adders, whose root counts the true literals up to k+1;
+  * commander (Klieber and Kwon 2007), at most one only: the literals
+    are split in groups of 3, each with a commander variable implied by
+    its group, and the commanders are constrained recursively;
+  * pb: the native pseudo-Boolean constraints `AtMost` and `PbEq` of Z3.
+
+With the encoding "auto", `choose_encoding()` picks one by the size of
+the constraint. On the seat arrangements of seat_arrange.py, Z3 finds
+arrangements fastest with the native constraints, but refutes the
+impossible ones (more people than seats) slowest with them; the
+totalizer is fast on both, while the sequential counter and the
+commander encoding sometimes take seconds to find an arrangement.
+"""
+
+import unittest
+from itertools import combinations, product
+from typing import List, Sequence
+
+from z3 import *
+
+ENCODINGS = ("pairwise", "sequential", "totalizer", "commander", "pb")
+
+
+def choose_encoding(n: int, k: int = 1) -> str:
+    """The encoding used for at most `k` of `n` literals with "auto"."""
+    # the pairwise clauses need no fresh variable, and are few enough
+    return "pairwise" if n <= 6 else "totalizer"
+
+
+def _pairwise(lits: Sequence[BoolRef], k: int) -> List[BoolRef]:
+    return [Or([Not(lit) for lit in subset]) for subset in combinations(lits, k + 1)]
+
+
+def _sequential(lits: Sequence[BoolRef], k: int) -> List[BoolRef]:
+    n = len(lits)
+    # s[i][j]: at least j + 1 of lits[0..i] are true, for i < n - 1
+    s = [[FreshBool("seq") for _ in range(k)] for _ in range(n - 1)]
+    constraints = [Or(Not(lits[0]), s[0][0])]
+    constraints += [Not(s[0][j]) for j in range(1, k)]
+    for i in range(1, n - 1):
+        constraints.append(Or(Not(lits[i]), s[i][0]))
+        constraints.append(Or(Not(s[i - 1][0]), s[i][0]))
+        for j in range(1, k):
+            constraints.append(Or(Not(lits[i]), Not(s[i - 1][j - 1]), s[i][j]))
+            constraints.append(Or(Not(s[i - 1][j]), s[i][j]))
+        constraints.append(Or(Not(lits[i]), Not(s[i - 1][k - 1])))
+    constraints.append(Or(Not(lits[n - 1]), Not(s[n - 2][k - 1])))
+    return constraints
+
+
+def _totalizer(lits: Sequence[BoolRef], k: int) -> List[BoolRef]:
+    constraints = []
+
+    # the unary count of `lits`, up to k + 1: outputs[j] is true if at
+    # least j + 1 literals are
+    def count(lits: Sequence[BoolRef]) -> List[BoolRef]:
+        if len(lits) == 1:
+            return [lits[0]]
+        left, right = count(lits[:len(lits) // 2]), count(lits[len(lits) // 2:])
+        outputs = [FreshBool("tot") for _ in range(min(len(left) + len(right), k + 1))]
+        for i in range(len(left) + 1):
+            for j in range(len(right) + 1):
+                if 0 < i + j <= len(outputs):
+                    clause = [outputs[i + j - 1]]
+                    if i:
+                        clause.append(Not(left[i - 1]))
+                    if j:
+                        clause.append(Not(right[j - 1]))
+                    constraints.append(Or(clause))
+        return outputs
+
+    outputs = count(lits)
+    if len(outputs) > k:
+        constraints.append(Not(outputs[k]))
+    return constraints
+
+
+def _commander(lits: Sequence[BoolRef], k: int) -> List[BoolRef]:
+    if k != 1:
+        raise ValueError("the commander encoding is for at most one only")
+    constraints = []
+    while len(lits) > 6:
+        commanders = []
+        for start in range(0, len(lits), 3):
+            group = lits[start:start + 3]
+            commander = FreshBool("cmd")
+            constraints += _pairwise(group, 1)
+            constraints += [Or(Not(lit), commander) for lit in group]
+            commanders.append(commander)
+        lits = commanders
+    return constraints + _pairwise(lits, 1)
+
+
+def at_most_k(lits: Sequence[BoolRef], k: int, encoding: str = "auto") -> List[BoolRef]:
+    """Constraints for at most `k` of the literals `lits` being true."""
+    lits = list(lits)
+    if k < 0:
+        return [BoolVal(False)]
+    if k >= len(lits):
+        return []
+    if k == 0:
+        return [Not(lit) for lit in lits]
+    if encoding == "auto":
+        encoding = choose_encoding(len(lits), k)
+    if encoding == "pb":
+        return [AtMost(*lits, k)]
+    encoders = {"pairwise": _pairwise, "sequential": _sequential,
+                "totalizer": _totalizer, "commander": _commander}
+    if encoding not in encoders:
+        raise ValueError(f"unknown encoding {encoding}, expected one of {ENCODINGS}")
+    return encoders[encoding](lits, k)
+
+
+def at_least_k(lits: Sequence[BoolRef], k: int, encoding: str = "auto") -> List[BoolRef]:
+    """Constraints for at least `k` of the literals `lits` being true."""
+    lits = list(lits)
+    if k == 1:
+        return [Or(lits)] if lits else [BoolVal(False)]
+    if encoding == "pb" and 0 < k <= len(lits):
+        return [AtLeast(*lits, k)]
+    # at least k true is at most n - k false
+    return at_most_k([Not(lit) for lit in lits], len(lits) - k, encoding)
+
+
+def exactly_k(lits: Sequence[BoolRef], k: int, encoding: str = "auto") -> List[BoolRef]:
+    """Constraints for exactly `k` of the literals `lits` being true."""
+    lits = list(lits)
+    if encoding == "pb" and 0 < k < len(lits):
+        return [PbEq([(lit, 1) for lit in lits], k)]
+    return at_most_k(lits, k, encoding) + at_least_k(lits, k, encoding)
+
+
+def at_most_one(lits: Sequence[BoolRef], encoding: str = "auto") -> List[BoolRef]:
+    return at_most_k(lits, 1, encoding)
+
+
+def exactly_one(lits: Sequence[BoolRef], encoding: str = "auto") -> List[BoolRef]:
+    return exactly_k(lits, 1, encoding)
+
+
+class TestCardinality(unittest.TestCase):
+    def check(self, build, accept, max_n: int = 7):
+        for n in range(1, max_n + 1):
+            xs = Bools(" ".join(f"x{i}" for i in range(n)))
+            for k in range(n + 1):
+                for encoding in ENCODINGS:
+                    if encoding == "commander" and k != 1:
+                        continue
+                    solver = Solver()
+                    solver.add(build(xs, k, encoding))
+                    # the fresh variables must not rule out any accepted
+                    # assignment, nor allow a rejected one
+                    for values in product([False, True], repeat=n):
+                        assumptions = [x if value else Not(x) for x, value in zip(xs, values)]
+                        self.assertEqual(solver.check(assumptions) == sat, accept(sum(values), k),
+                                         (n, k, encoding, values))
+
+    def test_at_most_k(self):
+        self.check(at_most_k, lambda count, k: count <= k)
+
+    def test_at_least_k(self):
+        self.check(at_least_k, lambda count, k: count >= k, max_n=5)
+
+    def test_exactly_k(self):
+        self.check(exactly_k, lambda count, k: count == k, max_n=5)
+
+    def test_commander(self):
+        xs = Bools(" ".join(f"x{i}" for i in range(20)))
+        solver = Solver()
+        solver.add(exactly_one(xs, "commander"))
+        solver.add(Or(xs[3], xs[17]))
+        count = 0
+        while solver.check() == sat:
+            model = solver.model()
+            count += 1
+            solver.add(Or([x != model.eval(x, True) for x in xs]))
+        self.assertEqual(count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
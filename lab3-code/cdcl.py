@@ -0,0 +1,754 @@
+"""Conflict-driven clause learning (CDCL) SAT solver
+
+The `dpll()` function in dpll.py hands its clauses to the solver defined
+here. Clauses are DIMACS-style integer literals: the variable `v`
+(v >= 1) is written as the literal `v`, and its negation as `-v`. The
+solver keeps all clauses, learned ones included, in a `ClauseDB`.
+
+The search follows the usual MiniSat design:
+  * two-watched-literal unit propagation;
+  * first-UIP conflict analysis with clause minimization;
+  * non-chronological backjumping to the second highest level of the
+    learned clause;
+  * VSIDS variable activities with phase saving;
+  * Luby restarts;
+  * learned clause deletion ranked by LBD (literal block distance).
+
+The solver is incremental: clauses may be added between `solve()`
+calls, which keep the learned clauses and the heuristic state.
+`solve(assumptions)` decides the assumption literals first, as in
+MiniSat, and when they cannot all hold `failed_assumptions()` tells
+which of them are to blame. `push()` and `pop()` open and retract
+frames of clauses: each frame has a selector variable `s`, the clauses
+added in it get the extra literal `-s`, and `s` is assumed while the
+frame is open. A clause learned from the clauses of a frame contains
+`-s` as well, so `pop()` fixes `-s` at level 0 and deletes exactly the
+clauses that depended on the frame; every other learned clause stays.
+
+The heuristics can be varied (see `PHASES` and `RESTARTS`) so that a
+portfolio of differently configured solvers explores different parts
+of the search space, and the `on_learnt` / `fetch_clauses` hooks let
+such solvers exchange learned clauses.
+
+A theory solver plugs in as `theory`, for DPLL(T) (see
+lab5-code/dpllt.py). At each fixpoint of the unit propagation,
+`theory.propagate(trail, start, vals)` gets the literals trail[start:]
+it has not seen yet, and returns clauses that hold in the theory: a
+clause whose literals are all false is a conflict, which is analyzed
+like any other, and a clause with a single unassigned literal
+propagates it. Both are kept as learned clauses. `theory.backtrack(size)`
+takes back the literals from trail[size:].
+"""
+
+import heapq
+import random
+import unittest
+from array import array
+from itertools import product
+
+from clause_db import ClauseDB
+
+
+# the polarity of the decisions: the saved phase, always false, always
+# true, or random
+PHASES = ("save", "false", "true", "random")
+
+# the restart schedule: conflicts between restarts follow the Luby
+# sequence, or grow geometrically by 1.5
+RESTARTS = ("luby", "geometric")
+
+
+def luby(i: int) -> int:
+    """The i-th (0-based) element of the Luby sequence 1 1 2 1 1 2 4 ..."""
+    size, seq = 1, 0
+    while size < i + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        seq -= 1
+        i = i % size
+    return 1 << seq
+
+
+class CDCLSolver:
+    """A CDCL solver over integer literals.
+
+    Per-literal tables (`vals`, `watches`) are Python lists of length
+    2 * capacity + 1 indexed directly by the signed literal: a positive
+    literal `v` lands in slot `v`, a negative literal `-v` wraps around
+    to slot `2 * capacity + 1 - v`. Per-variable tables are indexed by
+    the variable. Clauses are referenced by their index (`cref`) in
+    the clause database `db`; the two watched literals of a clause are
+    its first two literals.
+
+    `clauses` may be any iterable of clauses, or a `ClauseDB`. With a
+    `random_freq` > 0, that fraction of the decisions picks a random
+    variable instead of the most active one; `seed` seeds the random
+    choices.
+    """
+
+    def __init__(self, num_vars: int = 0, clauses=(), var_decay: float = 0.95,
+                 restart_base: int = 100, learnt_ratio: float = 1 / 3,
+                 phase: str = "save", restart: str = "luby",
+                 random_freq: float = 0.0, seed: int = 0):
+        if phase not in PHASES:
+            raise ValueError(f"unknown phase policy {phase!r}, expected one of {PHASES}")
+        if restart not in RESTARTS:
+            raise ValueError(f"unknown restart schedule {restart!r}, expected one of {RESTARTS}")
+        self.ok = True
+        self.num_vars = 0
+        self.capacity = 0
+        self.model = None
+
+        # per literal
+        self.vals = [0]
+        self.watches = [[]]
+        # per variable
+        self.level = [0]
+        self.reason = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        self.seen = [0]
+
+        # clause database
+        self.db = ClauseDB()
+        self.learnt = bytearray()
+        self.lbd = array('i')
+        self.deleted = bytearray()
+        self.num_clauses = 0
+        self.num_learnts = 0
+        # literals of deleted clauses still held by `db`
+        self.wasted = 0
+
+        # assignment trail
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+
+        # heuristics
+        self.heap = []
+        self.var_inc = 1.0
+        self.var_decay = var_decay
+        self.restart_base = restart_base
+        self.learnt_ratio = learnt_ratio
+        self.max_learnts = 0.0
+        self.phase_policy = phase
+        self.restart_policy = restart
+        self.random_freq = random_freq
+        self.random = random.Random(seed)
+
+        # clause exchange: `on_learnt(lits)` is called with every learned
+        # clause, `fetch_clauses()` is polled at each restart for clauses
+        # implied by the input to add as learned ones
+        self.on_learnt = None
+        self.fetch_clauses = None
+
+        # the theory solver, and the part of the trail it has seen
+        self.theory = None
+        self.theory_head = 0
+
+        # incremental solving
+        self.assumptions = []
+        # selector variable of each open frame
+        self.frames = []
+        # the failed assumptions of the last call of solve()
+        self.conflict = []
+
+        # statistics
+        self.decisions = 0
+        self.propagations = 0
+        self.conflicts = 0
+        self.restarts = 0
+
+        if isinstance(clauses, ClauseDB):
+            num_vars = max(num_vars, clauses.num_vars)
+        self.new_vars(num_vars)
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def new_vars(self, amount: int) -> int:
+        """Allocate `amount` fresh variables, return the last one."""
+        if amount <= 0:
+            return self.num_vars
+        new_num = self.num_vars + amount
+        if new_num > self.capacity:
+            self._grow(max(new_num, 2 * self.capacity))
+        for v in range(self.num_vars + 1, new_num + 1):
+            self.level.append(0)
+            self.reason.append(None)
+            self.activity.append(0.0)
+            self.phase.append(False)
+            self.seen.append(0)
+            heapq.heappush(self.heap, (0.0, v))
+        self.num_vars = new_num
+        return new_num
+
+    def _grow(self, capacity: int):
+        size = 2 * capacity + 1
+        vals = [0] * size
+        watches = [[] for _ in range(size)]
+        for v in range(1, self.num_vars + 1):
+            vals[v], vals[-v] = self.vals[v], self.vals[-v]
+            watches[v], watches[-v] = self.watches[v], self.watches[-v]
+        self.vals = vals
+        self.watches = watches
+        self.capacity = capacity
+
+    def stats(self) -> dict:
+        return {"decisions": self.decisions,
+                "propagations": self.propagations,
+                "conflicts": self.conflicts,
+                "restarts": self.restarts,
+                "learnts": self.num_learnts}
+
+    ########################################
+    # incremental interface
+
+    def push(self):
+        """Open a frame, the clauses added from now on are retracted by `pop()`.
+
+        The selector of the frame is a fresh variable, so the variables
+        of the caller should come from `new_vars()`.
+        """
+        self.frames.append(self.new_vars(1))
+
+    def pop(self):
+        """Retract the clauses added since the matching `push()`."""
+        selector = self.frames.pop()
+        if not self.ok:
+            return
+        self._backtrack(0)
+        if self.vals[selector] == 0:
+            self._enqueue(-selector, None)
+            self.ok = self._propagate() is None
+        self._remove_satisfied()
+
+    def decide(self, lit: int) -> bool:
+        """Assign the free literal `lit` on a new decision level, propagate it.
+
+        Returns False on a conflict. Meant for lookahead (see cube.py),
+        `undo()` takes the assignments back.
+        """
+        self.trail_lim.append(len(self.trail))
+        self._enqueue(lit, None)
+        return self._propagate() is None
+
+    def undo(self, level: int = 0):
+        """Take back the decisions above `level`."""
+        self._backtrack(level)
+
+    def failed_assumptions(self) -> list:
+        """The assumptions of the last `solve()` that made it fail.
+
+        The conjunction of these literals is already unsatisfiable with
+        the clauses. An empty list after a failed `solve()` means that
+        the clauses of the open frames are unsatisfiable on their own.
+        """
+        frames = set(self.frames)
+        return [lit for lit in self.conflict if abs(lit) not in frames]
+
+    ########################################
+    # clause database
+
+    def add_clause(self, lits) -> bool:
+        """Add a clause at decision level 0.
+
+        Returns False once the clause set is known to be unsatisfiable.
+        """
+        if self.frames:
+            lits = [*lits, -self.frames[-1]]
+        return self._add(lits, False)
+
+    def _add(self, lits, learnt: bool) -> bool:
+        if not self.ok:
+            return False
+        self._backtrack(0)
+
+        clause = []
+        for lit in lits:
+            var = abs(lit)
+            if var > self.num_vars:
+                self.new_vars(var - self.num_vars)
+            if -lit in clause:
+                return True
+            if lit in clause or self.vals[lit] == -1:
+                continue
+            if self.vals[lit] == 1:
+                return True
+            clause.append(lit)
+
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self._enqueue(clause[0], None)
+            self.ok = self._propagate() is None
+        else:
+            self._attach(clause, learnt, len(clause) if learnt else 0)
+        return self.ok
+
+    def _attach(self, lits, learnt: bool, lbd: int = 0) -> int:
+        cref = self.db.add_clause(lits)
+        self.learnt.append(learnt)
+        self.lbd.append(lbd)
+        self.deleted.append(False)
+        self.watches[lits[0]].append(cref)
+        self.watches[lits[1]].append(cref)
+        if learnt:
+            self.num_learnts += 1
+        else:
+            self.num_clauses += 1
+        return cref
+
+    def _locked(self, cref: int) -> bool:
+        first = self.db.lits[self.db.start[cref]]
+        return self.vals[first] == 1 and self.reason[abs(first)] == cref
+
+    def _reduce_db(self):
+        # keep glue clauses (lbd <= 2) and the clauses that are currently
+        # the reason of some assignment, delete the worse half of the rest.
+        size = self.db.size
+        candidates = [cref for cref in range(len(self.db))
+                      if self.learnt[cref] and not self.deleted[cref]
+                      and self.lbd[cref] > 2 and not self._locked(cref)]
+        candidates.sort(key=lambda cref: (self.lbd[cref], size[cref]))
+        for cref in candidates[len(candidates) // 2:]:
+            self.deleted[cref] = True
+            self.wasted += size[cref]
+            self.num_learnts -= 1
+        self.max_learnts *= 1.1
+        if self.wasted > len(self.db.lits) // 2:
+            self._collect_garbage()
+
+    def _remove_satisfied(self):
+        """Delete the clauses satisfied at level 0."""
+        vals, lits, start, size = self.vals, self.db.lits, self.db.start, self.db.size
+        for cref in range(len(self.db)):
+            if self.deleted[cref]:
+                continue
+            begin = start[cref]
+            if any(vals[lit] == 1 for lit in lits[begin:begin + size[cref]]):
+                self.deleted[cref] = True
+                self.wasted += size[cref]
+                if self.learnt[cref]:
+                    self.num_learnts -= 1
+                else:
+                    self.num_clauses -= 1
+        if self.wasted > len(lits) // 2:
+            self._collect_garbage()
+
+    def _collect_garbage(self):
+        """Move the live clauses into a fresh database and renumber them."""
+        db, deleted = self.db, self.deleted
+        new_db = ClauseDB()
+        learnt = bytearray()
+        lbd = array('i')
+        remap = [-1] * len(db)
+        for cref in range(len(db)):
+            if not deleted[cref]:
+                remap[cref] = new_db.add_clause(db[cref])
+                learnt.append(self.learnt[cref])
+                lbd.append(self.lbd[cref])
+        for ws in self.watches:
+            ws[:] = [remap[cref] for cref in ws if not deleted[cref]]
+        reason = self.reason
+        for var in range(1, self.num_vars + 1):
+            if reason[var] is not None:
+                # the reasons of level 0 may have been deleted
+                reason[var] = remap[reason[var]] if remap[reason[var]] >= 0 else None
+        self.db = new_db
+        self.learnt = learnt
+        self.lbd = lbd
+        self.deleted = bytearray(len(new_db))
+        self.wasted = 0
+
+    ########################################
+    # assignment
+
+    def _enqueue(self, lit: int, reason):
+        var = abs(lit)
+        self.vals[lit] = 1
+        self.vals[-lit] = -1
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def _backtrack(self, level: int):
+        if len(self.trail_lim) <= level:
+            return
+        vals, phase, reason = self.vals, self.phase, self.reason
+        heap, activity = self.heap, self.activity
+        lim = self.trail_lim[level]
+        for lit in reversed(self.trail[lim:]):
+            var = abs(lit)
+            phase[var] = lit > 0
+            vals[lit] = vals[-lit] = 0
+            reason[var] = None
+            heapq.heappush(heap, (-activity[var], var))
+        del self.trail[lim:]
+        del self.trail_lim[level:]
+        self.qhead = lim
+        if self.theory is not None and self.theory_head > lim:
+            self.theory.backtrack(lim)
+            self.theory_head = lim
+
+    def _propagate(self):
+        """Unit propagation, return the conflicting clause or None."""
+        vals, watches, deleted = self.vals, self.watches, self.deleted
+        lits, start, size = self.db.lits, self.db.start, self.db.size
+        trail = self.trail
+        while self.qhead < len(trail):
+            false_lit = -trail[self.qhead]
+            self.qhead += 1
+            self.propagations += 1
+            ws = watches[false_lit]
+            i = j = 0
+            n = len(ws)
+            while i < n:
+                cref = ws[i]
+                i += 1
+                if deleted[cref]:
+                    continue
+                begin = start[cref]
+                # make sure the false literal is the second one
+                first = lits[begin]
+                if first == false_lit:
+                    first = lits[begin] = lits[begin + 1]
+                    lits[begin + 1] = false_lit
+                if vals[first] == 1:
+                    ws[j] = cref
+                    j += 1
+                    continue
+                # look for a new literal to watch
+                for k in range(begin + 2, begin + size[cref]):
+                    lit = lits[k]
+                    if vals[lit] != -1:
+                        lits[begin + 1] = lit
+                        lits[k] = false_lit
+                        watches[lit].append(cref)
+                        break
+                else:
+                    ws[j] = cref
+                    j += 1
+                    if vals[first] == -1:
+                        ws[j:] = ws[i:n]
+                        self.qhead = len(trail)
+                        return cref
+                    self._enqueue(first, cref)
+            del ws[j:]
+        return None
+
+    def _propagate_theory(self):
+        """Unit propagation and theory propagation to a common fixpoint.
+
+        Returns the conflicting clause, or -1 for a conflict at level 0,
+        or None.
+        """
+        confl = self._propagate()
+        theory, vals, level = self.theory, self.vals, self.level
+        while confl is None and theory is not None and self.theory_head < len(self.trail):
+            start, self.theory_head = self.theory_head, len(self.trail)
+            for clause in theory.propagate(self.trail, start, vals):
+                if any(vals[q] == 1 for q in clause):
+                    continue
+                free = [q for q in clause if vals[q] == 0]
+                if len(free) > 1:
+                    continue
+                # the false literals by decreasing level, the highest one
+                # is watched
+                lits = free + sorted((q for q in clause if vals[q] == -1), key=lambda q: -level[abs(q)])
+                if free and len(lits) > 1:
+                    lbd = len({level[abs(q)] for q in lits[1:]})
+                    self._enqueue(lits[0], self._attach(lits, True, lbd))
+                elif not free:
+                    # a conflict, analyzed on the level of its last literal
+                    top = level[abs(lits[0])] if lits else 0
+                    if top == 0:
+                        self._backtrack(0)
+                        return -1
+                    if len(lits) == 1:
+                        self._backtrack(0)
+                        self._enqueue(lits[0], None)
+                        break
+                    self._backtrack(top)
+                    return self._attach(lits, True, len({level[abs(q)] for q in lits}))
+            confl = self._propagate()
+        return confl
+
+    ########################################
+    # conflict analysis
+
+    def _bump(self, var: int):
+        activity = self.activity
+        activity[var] += self.var_inc
+        if activity[var] > 1e100:
+            for v in range(1, self.num_vars + 1):
+                activity[v] *= 1e-100
+            self.var_inc *= 1e-100
+            self._rebuild_heap()
+        elif self.vals[var] == 0:
+            heapq.heappush(self.heap, (-activity[var], var))
+
+    def _rebuild_heap(self):
+        self.heap = [(-self.activity[v], v) for v in range(1, self.num_vars + 1) if self.vals[v] == 0]
+        heapq.heapify(self.heap)
+
+    def _analyze(self, confl: int):
+        """First-UIP learning, return (learnt clause, backjump level)."""
+        seen, level, reason, trail = self.seen, self.level, self.reason, self.trail
+        lits, start, size = self.db.lits, self.db.start, self.db.size
+        current = len(self.trail_lim)
+        learnt = [0]
+        counter = 0
+        lit = 0
+        index = len(trail) - 1
+        while True:
+            begin = start[confl]
+            # the first literal of a reason clause is the implied one
+            for k in range(begin if lit == 0 else begin + 1, begin + size[confl]):
+                q = lits[k]
+                var = abs(q)
+                if not seen[var] and level[var] > 0:
+                    seen[var] = 1
+                    self._bump(var)
+                    if level[var] >= current:
+                        counter += 1
+                    else:
+                        learnt.append(q)
+            while not seen[abs(trail[index])]:
+                index -= 1
+            lit = trail[index]
+            index -= 1
+            var = abs(lit)
+            confl = reason[var]
+            seen[var] = 0
+            counter -= 1
+            if counter == 0:
+                break
+        learnt[0] = -lit
+
+        # clause minimization: drop a literal if its reason is subsumed
+        # by the other literals of the learnt clause
+        marked = learnt[1:]
+        kept = [learnt[0]]
+        for q in marked:
+            r = reason[abs(q)]
+            if r is None or any(not seen[abs(x)] and level[abs(x)] > 0
+                                for x in lits[start[r] + 1:start[r] + size[r]]):
+                kept.append(q)
+        for q in marked:
+            seen[abs(q)] = 0
+        learnt = kept
+
+        if len(learnt) == 1:
+            return learnt, 0
+        # the literal with the highest level goes to the second watch
+        best = max(range(1, len(learnt)), key=lambda k: level[abs(learnt[k])])
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, level[abs(learnt[1])]
+
+    def _analyze_final(self, p: int) -> list:
+        """The assumptions that imply the negation of the assumption `p`."""
+        failed = [p]
+        if self.level[abs(p)] == 0:
+            return failed
+        seen, level, reason, trail = self.seen, self.level, self.reason, self.trail
+        lits, start, size = self.db.lits, self.db.start, self.db.size
+        seen[abs(p)] = 1
+        # every decision so far is an assumption
+        for index in range(len(trail) - 1, self.trail_lim[0] - 1, -1):
+            lit = trail[index]
+            var = abs(lit)
+            if seen[var]:
+                confl = reason[var]
+                if confl is None:
+                    failed.append(lit)
+                else:
+                    for q in lits[start[confl] + 1:start[confl] + size[confl]]:
+                        if level[abs(q)] > 0:
+                            seen[abs(q)] = 1
+                seen[var] = 0
+        return failed
+
+    ########################################
+    # search
+
+    def _pick_branch(self) -> int:
+        heap, vals, activity = self.heap, self.vals, self.activity
+        var = 0
+        if self.random_freq and self.num_vars and self.random.random() < self.random_freq:
+            var = self.random.randint(1, self.num_vars)
+            if vals[var] != 0:
+                var = 0
+        if var == 0:
+            if len(heap) > 4 * self.num_vars + 64:
+                self._rebuild_heap()
+                heap = self.heap
+            while heap:
+                act, var = heapq.heappop(heap)
+                if vals[var] == 0 and -act == activity[var]:
+                    break
+            else:
+                return 0
+        match self.phase_policy:
+            case "save":
+                return var if self.phase[var] else -var
+            case "false":
+                return -var
+            case "true":
+                return var
+            case _:
+                return var if self.random.random() < 0.5 else -var
+
+    def _search(self, budget: int):
+        conflicts = 0
+        while True:
+            confl = self._propagate_theory()
+            if confl is not None:
+                self.conflicts += 1
+                conflicts += 1
+                if not self.trail_lim:
+                    self.ok = False
+                    return False
+                learnt, back_level = self._analyze(confl)
+                if self.on_learnt is not None:
+                    self.on_learnt(learnt)
+                self._backtrack(back_level)
+                if len(learnt) == 1:
+                    self._enqueue(learnt[0], None)
+                else:
+                    lbd = len({self.level[abs(q)] for q in learnt})
+                    self._enqueue(learnt[0], self._attach(learnt, True, lbd))
+                self.var_inc /= self.var_decay
+            else:
+                if conflicts >= budget:
+                    self._backtrack(0)
+                    return None
+                if self.num_learnts - len(self.trail) >= self.max_learnts:
+                    self._reduce_db()
+                lit = 0
+                # the first levels decide the assumptions, one each
+                while len(self.trail_lim) < len(self.assumptions):
+                    p = self.assumptions[len(self.trail_lim)]
+                    if self.vals[p] == 1:
+                        self.trail_lim.append(len(self.trail))
+                    elif self.vals[p] == -1:
+                        self.conflict = self._analyze_final(p)
+                        return False
+                    else:
+                        lit = p
+                        break
+                if lit == 0:
+                    lit = self._pick_branch()
+                    if lit == 0:
+                        return True
+                self.decisions += 1
+                self.trail_lim.append(len(self.trail))
+                self._enqueue(lit, None)
+
+    def solve(self, assumptions=()) -> bool:
+        """Search for a model, return True (sat) or False (unsat).
+
+        The literals of `assumptions` hold in the model, they are not
+        added as clauses. On success `model[v]` holds the value of the
+        variable `v`, on failure see `failed_assumptions()`.
+        """
+        self.model = None
+        self.conflict = []
+        if not self.ok:
+            return False
+        self._backtrack(0)
+        for lit in assumptions:
+            if abs(lit) > self.num_vars:
+                self.new_vars(abs(lit) - self.num_vars)
+        self.assumptions = self.frames + list(assumptions)
+        if self._propagate() is not None:
+            self.ok = False
+            return False
+
+        self.max_learnts = max(self.num_clauses * self.learnt_ratio, 1000.0)
+        while True:
+            if self.restart_policy == "luby":
+                budget = luby(self.restarts) * self.restart_base
+            else:
+                budget = int(self.restart_base * 1.5 ** self.restarts)
+            status = self._search(budget)
+            if status is True:
+                vals = self.vals
+                self.model = [False] + [vals[v] == 1 for v in range(1, self.num_vars + 1)]
+                return True
+            if status is False:
+                self._backtrack(0)
+                return False
+            self.restarts += 1
+            if self.fetch_clauses is not None:
+                for clause in self.fetch_clauses():
+                    if not self._add(clause, True):
+                        return False
+
+
+class TestCDCL(unittest.TestCase):
+    @staticmethod
+    def satisfies(model: list, clauses) -> bool:
+        return all(any(model[abs(lit)] == (lit > 0) for lit in clause) for clause in clauses)
+
+    def test_luby(self):
+        self.assertEqual([luby(i) for i in range(15)], [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8])
+
+    def test_random(self):
+        # agree with brute force on small random 3-CNFs around the threshold
+        rng = random.Random(0)
+        for _ in range(200):
+            n = rng.randint(1, 10)
+            clauses = [[rng.choice([-1, 1]) * rng.randint(1, n) for _ in range(rng.randint(1, 3))]
+                       for _ in range(rng.randint(1, 5 * n))]
+            expected = any(all(any(model[abs(lit) - 1] == (lit > 0) for lit in clause) for clause in clauses)
+                           for model in product([False, True], repeat=n))
+            for phase in PHASES:
+                solver = CDCLSolver(n, clauses, phase=phase, restart_base=2, random_freq=0.1, seed=rng.random())
+                self.assertEqual(solver.solve(), expected, clauses)
+                if expected:
+                    self.assertTrue(self.satisfies(solver.model, clauses), clauses)
+
+    def test_pigeonhole(self):
+        from portfolio import pigeonhole
+        for restart in RESTARTS:
+            self.assertFalse(CDCLSolver(clauses=pigeonhole(6, 5), restart=restart).solve())
+        db = pigeonhole(6, 6)
+        solver = CDCLSolver(clauses=db)
+        self.assertTrue(solver.solve())
+        self.assertTrue(self.satisfies(solver.model, db))
+
+    def test_learning(self):
+        # a small restart budget forces restarts
+        from portfolio import pigeonhole
+        db = pigeonhole(7, 6)
+        learnts = []
+        solver = CDCLSolver(clauses=db, restart_base=5)
+        solver.on_learnt = learnts.append
+        self.assertFalse(solver.solve())
+        stats = solver.stats()
+        self.assertGreater(stats["conflicts"], 0)
+        self.assertGreater(stats["restarts"], 0)
+        self.assertEqual(len(learnts), stats["conflicts"] - 1)
+        # the learned clauses follow from the input: each one conflicts
+        # with the clauses when all its literals are assumed false
+        for lits in learnts[:50]:
+            self.assertFalse(CDCLSolver(clauses=db).solve([-lit for lit in lits]))
+
+    def test_incremental(self):
+        solver = CDCLSolver(3, [[1, 2], [-1, 3]])
+        self.assertTrue(solver.solve([-2]))
+        self.assertTrue(solver.model[1] and solver.model[3])
+        self.assertFalse(solver.solve([-2, -3]))
+        self.assertEqual(sorted(solver.failed_assumptions()), [-3, -2])
+        solver.push()
+        solver.add_clause([-3])
+        self.assertTrue(solver.solve())
+        self.assertFalse(solver.solve([-2]))
+        solver.pop()
+        self.assertTrue(solver.solve([-2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
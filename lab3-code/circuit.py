@@ -7,43 +7,123 @@ Hints:
  You can reuse the `sat_all` function that you've implemented in exercise 1
  if you think necessary."""
 
+import time
+import unittest
+
 from z3 import *
 
 
-def sat_all(props, f):
-    """Get all solutions of given proposition set props that satisfy f
+def iter_models(props, f, limit=None, timeout=None):
+    """Enumerate the solutions of f projected on props, one at a time
+
+    Each solution is yielded as a cube: a dict from some of the props to
+    True/False, such that every assignment of the props extending it
+    satisfies f; the props missing from the cube are free, so it stands
+    for 2 ** (len(props) - len(cube)) solutions. The cubes are disjoint
+    and together cover all the solutions.
+
+    f is added to the solver once, and each cube is then blocked by a
+    single clause. The cube is the model shrunk to a minimal set of
+    literals that still implies f and none of the previous cubes. This
+    is checked by a second solver with the literals as assumptions, on
+        Or(Not(f), cube_1, ..., cube_k)
+    which grows by one cube at a time through the chain
+        Or(Not(f), t_1), Implies(t_1, Or(cube_1, t_2)), ...
+    where the last `t` is assumed false.
 
     Arguments:
         props {BoolRef} -- Proposition list
         f {Boolref} -- logical express that consist of props
+        limit {int} -- stop after that many cubes
+        timeout {float} -- give up after that many seconds, raising a
+            TimeoutError: the cubes yielded so far miss some solutions
     """
-    solver = Solver()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    solver = Solver(ctx=f.ctx)
     solver.add(f)
-    result = []
-    while solver.check() == sat:
+    negation = Solver(ctx=f.ctx)
+    tail = FreshBool(ctx=f.ctx)
+    negation.add(Or(Not(f), tail))
+
+    def remaining():
+        # the time left in milliseconds, None without a timeout
+        if deadline is None:
+            return None
+        return max(0, int((deadline - time.monotonic()) * 1000))
+
+    def core(assumptions):
+        # the assumptions in an unsat core of the negation, None if they
+        # do not imply f and the previous cubes, or if time is up
+        budget = remaining()
+        if budget is not None:
+            if budget == 0:
+                return None
+            negation.set("timeout", budget)
+        if negation.check(Not(tail), *assumptions) != unsat:
+            return None
+        found = negation.unsat_core()
+        return [literal for literal in assumptions if any(literal.eq(other) for other in found)]
+
+    count = 0
+    while limit is None or count < limit:
+        budget = remaining()
+        if budget is not None:
+            if budget == 0:
+                raise TimeoutError(f"timed out after {count} cubes")
+            solver.set("timeout", budget)
+        result = solver.check()
+        if result == unknown:
+            raise TimeoutError(f"gave up after {count} cubes: {solver.reason_unknown()}")
+        if result != sat:
+            return
         m = solver.model()
-        result.append(m)
-        block = []
-        # Save all prop in True
-        for prop in props:
-            prop_is_true = m.eval(prop, model_completion=True)
-            # Judge each prop in m is True or False
-            if prop_is_true:
-                new_prop = prop
-            else:
-                new_prop = Not(prop)
-            block.append(new_prop)
-        solver.add(And(f, Not(And(block))))
-        # raise NotImplementedError('TODO: Your code here!')
+        literals = [prop if is_true(m.eval(prop, model_completion=True)) else Not(prop) for prop in props]
+
+        # when f also depends on variables outside props, the whole
+        # projected model may not imply f, then it is blocked as it is
+        cube = core(literals)
+        if cube is None:
+            cube = literals
+        else:
+            # drop the literals that are not needed, one by one
+            for literal in list(cube):
+                if any(literal.eq(other) for other in cube):
+                    smaller = core([other for other in cube if not other.eq(literal)])
+                    if smaller is not None:
+                        cube = smaller
+
+        solver.add(Or([Not(literal) for literal in cube]))
+        next_tail = FreshBool(ctx=f.ctx)
+        negation.add(Implies(tail, Or(And(cube), next_tail)))
+        tail = next_tail
+        count += 1
+        yield {literal.arg(0) if is_not(literal) else literal: not is_not(literal) for literal in cube}
 
-    print("the given proposition: ", f)
-    print("the number of solutions: ", len(result))
 
-    def print_model(m):
-        print(sorted([(d, m[d]) for d in m], key=lambda x: str(x[0])))
+def sat_all(props, f, timeout=None):
+    """Get all solutions of given proposition set props that satisfy f
+
+    The solutions are printed as the cubes of `iter_models`, as soon as
+    they are found. When the `timeout` (in seconds) runs out first, the
+    count printed and returned is only a lower bound.
 
-    for m in result:
-        print_model(m)
+    Arguments:
+        props {BoolRef} -- Proposition list
+        f {Boolref} -- logical express that consist of props
+        timeout {float} -- stop enumerating after that many seconds
+    """
+    print("the given proposition: ", f)
+    total = 0
+    try:
+        for cube in iter_models(props, f, timeout=timeout):
+            total += 2 ** (len(props) - len(cube))
+            print(sorted(cube.items(), key=lambda x: str(x[0])))
+    except TimeoutError as error:
+        print(f"enumeration incomplete, {error}")
+        print("the number of solutions: at least", total)
+        return total
+    print("the number of solutions: ", total)
+    return total
 
 
 # Exercise 4: Circuit Layout
@@ -65,6 +145,29 @@ def circuit_layout():
     sat_all([a, b, c, d], Not(F))
 
 
+class TestCircuit(unittest.TestCase):
+    def test_iter_models(self):
+        a, b, c, d = Bools('a b c d')
+        F = Or(And(d, And(a, b)), And(Not(c), And(a, b)))
+        self.assertEqual(sat_all([a, b, c, d], F), 3)
+        self.assertEqual(sat_all([a, b, c, d], Not(F)), 13)
+        # the cubes are minimal: each literal is needed
+        for cube in iter_models([a, b, c, d], F):
+            self.assertIn(len(cube), (3, 4))
+
+        xs = Bools(' '.join(f'x{i}' for i in range(40)))
+        self.assertEqual(len(list(iter_models(xs, Or(xs), limit=5))), 5)
+        self.assertEqual(sum(2 ** (40 - len(cube)) for cube in iter_models(xs, Or(xs))), 2 ** 40 - 1)
+        # a timeout is reported, not taken for the end of the solutions
+        with self.assertRaises(TimeoutError):
+            list(iter_models(xs, Or(xs), timeout=0))
+        self.assertEqual(sat_all(xs, Or(xs), timeout=0), 0)
+        self.assertEqual(sat_all([a, b, c, d], F, timeout=60), 3)
+        # projected on x0, x1: x5 is not a prop, so the cubes are not shrunk
+        self.assertCountEqual(list(iter_models(xs[:2], And(Or(xs[0], xs[5]), Not(xs[5])))),
+                              [{xs[0]: True, xs[1]: False}, {xs[0]: True, xs[1]: True}])
+
+
 if __name__ == '__main__':
     # circuit_layout should have 3 solutions for F and 13 solutions for Not(F)
     circuit_layout()
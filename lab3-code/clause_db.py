@@ -0,0 +1,83 @@
+"""Compact clause storage
+
+A `ClauseDB` keeps all clauses of a CNF in one flat `array('i')` of
+DIMACS-style integer literals (variable `v` is `v`, its negation `-v`),
+together with the start offset and the size of every clause. Variable
+names are interned to the integers 1, 2, 3, ...
+
+Compared with the `List[List[Prop]]` produced by `flatten()`, a literal
+costs 4 bytes instead of a Python object, and adding a clause appends to
+the arrays instead of copying lists around.
+"""
+
+from array import array
+from typing import Iterable, List
+
+
+class ClauseDB:
+    def __init__(self, names: Iterable[str] = ()):
+        # names[v] is the name of the variable v, names[0] is unused
+        self.names: List[str | None] = [None]
+        self.index = {}
+        self.lits = array('i')
+        self.start = array('q')
+        self.size = array('i')
+        for name in names:
+            self.var(name)
+
+    @property
+    def num_vars(self) -> int:
+        return len(self.names) - 1
+
+    @property
+    def num_lits(self) -> int:
+        return sum(self.size)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __getitem__(self, cref: int) -> array:
+        begin = self.start[cref]
+        return self.lits[begin:begin + self.size[cref]]
+
+    def __iter__(self):
+        lits, start, size = self.lits, self.start, self.size
+        for cref in range(len(start)):
+            yield lits[start[cref]:start[cref] + size[cref]]
+
+    def __str__(self):
+        def name(lit):
+            var = self.names[abs(lit)] if abs(lit) < len(self.names) else None
+            var = var if var is not None else str(abs(lit))
+            return var if lit > 0 else f"~{var}"
+
+        return "[" + ", ".join("[" + ", ".join(map(name, clause)) + "]" for clause in self) + "]"
+
+    def nbytes(self) -> int:
+        """Memory held by the literal and offset arrays."""
+        return sum(a.itemsize * len(a) for a in (self.lits, self.start, self.size))
+
+    def var(self, name: str) -> int:
+        """The integer of variable `name`, allocating one if it is new."""
+        var = self.index.get(name)
+        if var is None:
+            var = self.index[name] = len(self.names)
+            self.names.append(name)
+        return var
+
+    def new_vars(self, amount: int) -> int:
+        """Allocate `amount` anonymous variables, return the last one."""
+        self.names.extend([None] * amount)
+        return self.num_vars
+
+    def add_clause(self, lits: Iterable[int]) -> int:
+        """Append a clause, return its index.
+
+        The variables of `lits` should come from `var()` or `new_vars()`.
+        """
+        cref = len(self.start)
+        begin = len(self.lits)
+        self.lits.extend(lits)
+        self.start.append(begin)
+        self.size.append(len(self.lits) - begin)
+        return cref
@@ -0,0 +1,218 @@
+"""Cube and conquer
+
+Instances too hard for one CDCL search, even in a portfolio, can be
+split into many easier ones. A lookahead *cuber* builds a binary tree
+of decisions down to a fixed depth; the leaves are *cubes*, partial
+assignments whose disjunction covers every model. The cubes are then
+*conquered* by a pool of CDCL solvers, each of which keeps one
+incremental solver and solves its cubes as assumptions, so the clauses
+learned on one cube help with the next ones.
+
+The cuber decides on the variable whose two branches propagate the
+most: each candidate `x` is probed by assigning `x`, and then `~x`, and
+counting the implied literals `n+` and `n-`; the score is
+`(n+ + 1) * (n- + 1)`, which favours balanced splits. A probe that
+conflicts is a failed literal, its negation is assigned for the whole
+subtree, both branches below the node included; the cubes leave it out,
+it follows from their decisions and the clauses. A branch that
+conflicts needs no cube at all: it is refuted by the cuber already.
+
+Run this file on some DIMACS files to cube and conquer them:
+    python cube.py --depth 10 --workers 8 hole10.cnf
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import unittest
+from typing import List
+
+from cdcl import CDCLSolver
+from clause_db import ClauseDB
+from portfolio import pigeonhole
+
+
+def lookahead(solver: CDCLSolver, lit: int) -> int | None:
+    """The number of literals implied by `lit`, or None if it fails."""
+    level = len(solver.trail_lim)
+    start = len(solver.trail)
+    ok = solver.decide(lit)
+    implied = len(solver.trail) - start
+    solver.undo(level)
+    return implied if ok else None
+
+
+class Cuber:
+    """Split the clauses of `db` into cubes by lookahead.
+
+    The tree is `depth` decisions deep, so there are at most 2^depth
+    cubes; only the `candidates` variables with the most occurrences
+    are probed at each node.
+    """
+
+    def __init__(self, db: ClauseDB, depth: int = 10, candidates: int = 32):
+        self.solver = CDCLSolver(clauses=db)
+        self.depth = depth
+        self.candidates = candidates
+        occurrences = [0] * (db.num_vars + 1)
+        for lit in db.lits:
+            occurrences[abs(lit)] += 1
+        self.order = sorted(range(1, db.num_vars + 1), key=lambda v: -occurrences[v])
+        self.cubes: List[List[int]] = []
+        self.refuted = 0
+        self.time = 0.0
+
+    def run(self) -> List[List[int]]:
+        """Build the cubes; none at all means the clauses are unsatisfiable."""
+        start = time.time()
+        if self.solver.ok:
+            self._split([], self.depth)
+        else:
+            self.refuted += 1
+        self.time = time.time() - start
+        return self.cubes
+
+    def _split(self, cube: List[int], depth: int):
+        solver = self.solver
+        level = len(solver.trail_lim)
+        scores = {}
+        candidates = 0
+        for var in self.order:
+            if candidates == self.candidates:
+                break
+            if solver.vals[var] != 0:
+                continue
+            candidates += 1
+            positive, negative = lookahead(solver, var), lookahead(solver, -var)
+            if positive is None or negative is None:
+                # a failed literal: the other branch is implied
+                if (positive is None and negative is None) \
+                        or not solver.decide(-var if positive is None else var):
+                    self.refuted += 1
+                    solver.undo(level)
+                    return
+                continue
+            scores[var] = (positive + 1) * (negative + 1)
+
+        # a later failed literal may have assigned some candidates
+        best = max((var for var in scores if solver.vals[var] == 0), key=scores.get, default=0)
+        if depth == 0 or best == 0:
+            self.cubes.append(cube)
+        else:
+            # the negated failed literals stay decided for both branches
+            branch_level = len(solver.trail_lim)
+            for lit in (best, -best):
+                if solver.decide(lit):
+                    self._split(cube + [lit], depth - 1)
+                else:
+                    self.refuted += 1
+                solver.undo(branch_level)
+        solver.undo(level)
+
+
+def _conquer_worker(db: ClauseDB, tasks, results):
+    solver = CDCLSolver(clauses=db)
+    while (cube := tasks.get()) is not None:
+        result = solver.solve(cube)
+        results.put((result, solver.model if result else None))
+
+
+def conquer(db: ClauseDB, cubes: List[List[int]], workers: int | None = None, progress: bool = False):
+    """Solve the cubes on `workers` processes, return (result, model).
+
+    Stops at the first satisfiable cube; the clauses are unsatisfiable
+    if every cube is. With `progress`, prints the number of cubes done.
+    Raises a RuntimeError if a worker dies, as its cube is lost.
+    """
+    workers = min(workers or os.cpu_count(), max(len(cubes), 1))
+    # a Queue feeds the tasks from a thread, so thousands of cubes do not
+    # fill the pipe before the workers start reading
+    tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+    for cube in cubes:
+        tasks.put(cube)
+    for _ in range(workers):
+        tasks.put(None)
+    processes = [multiprocessing.Process(target=_conquer_worker, args=(db, tasks, results), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for done in range(1, len(cubes) + 1):
+            while True:
+                try:
+                    result, model = results.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    # the workers exit with 0 only once the cubes run out
+                    codes = [process.exitcode for process in processes]
+                    if any(code not in (None, 0) for code in codes) \
+                            or (None not in codes and results.empty()):
+                        raise RuntimeError(f"a conquer worker died, exit codes {codes}")
+            if progress:
+                print(f"\rcubes {done}/{len(cubes)}", end="", file=sys.stderr, flush=True)
+            if result:
+                return True, model
+        return False, None
+    finally:
+        if progress:
+            print(file=sys.stderr)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+def cube_and_conquer(db: ClauseDB, depth: int = 10, workers: int | None = None, progress: bool = False):
+    """Cube `db` with a `Cuber` of the given depth and `conquer()` the cubes."""
+    cuber = Cuber(db, depth)
+    cubes = cuber.run()
+    if progress:
+        print(f"{len(cubes)} cubes, {cuber.refuted} refuted by lookahead in {cuber.time:.6f}s", file=sys.stderr)
+    if not cubes:
+        return False, None
+    return conquer(db, cubes, workers, progress)
+
+
+class TestCube(unittest.TestCase):
+    def test_cubes(self):
+        db = pigeonhole(6, 5)
+        cuber = Cuber(db, depth=4)
+        cubes = cuber.run()
+        self.assertLessEqual(len(cubes), 16)
+        self.assertGreater(len(cubes) + cuber.refuted, 1)
+        # the cubes and the refuted branches cover all assignments, so
+        # the clauses are unsat iff every cube is
+        for cube in cubes:
+            self.assertFalse(CDCLSolver(clauses=db).solve(cube))
+
+    def test_dead_worker(self):
+        # a worker that crashes on its cube
+        with self.assertRaises(RuntimeError):
+            conquer(pigeonhole(4, 3), [[1], ["not a literal"]], workers=2)
+
+    def test_cube_and_conquer(self):
+        self.assertEqual(cube_and_conquer(pigeonhole(6, 5), depth=5, workers=2), (False, None))
+        db = pigeonhole(7, 7)
+        result, model = cube_and_conquer(db, depth=6, workers=2)
+        self.assertTrue(result)
+        self.assertTrue(all(any(model[abs(lit)] == (lit > 0) for lit in clause) for clause in db))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        from dimacs import read_dimacs
+
+        parser = argparse.ArgumentParser(description="Cube and conquer DIMACS files")
+        parser.add_argument("--depth", type=int, default=10)
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("files", nargs="+")
+        args = parser.parse_args()
+        for file in args.files:
+            start = time.time()
+            result, _ = cube_and_conquer(read_dimacs(file), args.depth, args.workers, progress=True)
+            print(f"cube and conquer {file} by time {time.time() - start:.6f}s: {'sat' if result else 'unsat'}")
+    else:
+        unittest.main()
@@ -0,0 +1,172 @@
+"""DIMACS CNF reader and writer
+
+The DIMACS CNF format is what the SAT competitions use for their
+benchmarks:
+
+    c a comment
+    p cnf 3 2
+    1 -3 0
+    2 3 -1 0
+
+The header gives the number of variables and clauses, then each clause
+is a list of integer literals terminated by 0.
+
+`read_dimacs` streams a file (plain, gzip or xz compressed) straight
+into a `ClauseDB`, without building any `Prop`. `write_dimacs` dumps a
+`ClauseDB`, or the clauses of `flatten()`, so the same instance can be
+fed to `dpll()` and to Z3.
+
+Run this file on some DIMACS files to compare the CDCL solver with Z3:
+    python dimacs.py uf250-01.cnf hole8.cnf.gz
+"""
+
+import gzip
+import lzma
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import List
+
+import z3
+
+from cdcl import CDCLSolver
+from clause_db import ClauseDB
+from dpll import Prop, PVar, PNot, clause_sink, dnf_prop, flatten
+
+
+def open_dimacs(path, mode: str = "rt"):
+    """Open a DIMACS file, compressed or not (detected by magic bytes)."""
+    with open(path, "rb") as fp:
+        magic = fp.read(6)
+    if magic.startswith(b"\x1f\x8b"):
+        return gzip.open(path, mode)
+    if magic.startswith(b"\xfd7zXZ\x00"):
+        return lzma.open(path, mode)
+    return open(path, mode)
+
+
+def read_dimacs(path) -> ClauseDB:
+    """Read the clauses of a DIMACS CNF file into a `ClauseDB`.
+
+    Variable `v` of the file is named `str(v)`. Clauses may span lines;
+    a line starting with `%` ends the input, as in the SATLIB files.
+    """
+    db = ClauseDB()
+    clause = []
+    with open_dimacs(path) as fp:
+        for line in fp:
+            first = line[:1]
+            if first == "c" or first == "\n":
+                continue
+            if first == "p":
+                _, fmt, num_vars, _ = line.split()
+                if fmt != "cnf":
+                    raise ValueError(f"{path}: not a CNF file")
+                for v in range(1, int(num_vars) + 1):
+                    db.var(str(v))
+                continue
+            if first == "%":
+                break
+            for lit in map(int, line.split()):
+                if lit:
+                    clause.append(lit)
+                else:
+                    add_dimacs_clause(db, clause)
+                    clause = []
+    if clause:
+        add_dimacs_clause(db, clause)
+    return db
+
+
+def add_dimacs_clause(db: ClauseDB, clause: List[int]):
+    # some files use more variables than their header announces
+    for v in range(db.num_vars + 1, max(map(abs, clause), default=0) + 1):
+        db.var(str(v))
+    db.add_clause(clause)
+
+
+def write_dimacs(clauses: ClauseDB | List[List[Prop]], path, comments: bool = True):
+    """Write clauses to a DIMACS file, compressed if `path` ends in .gz or .xz.
+
+    `clauses` is a `ClauseDB`, or the result of `flatten()`. With
+    `comments`, a line `c <var> <name>` records the name of each variable.
+    """
+    if not isinstance(clauses, ClauseDB):
+        db = ClauseDB()
+        add = clause_sink(db)
+        for atoms in clauses:
+            add(atoms)
+        clauses = db
+
+    path = Path(path)
+    opener = {".gz": gzip.open, ".xz": lzma.open}.get(path.suffix, open)
+    with opener(path, "wt") as fp:
+        if comments:
+            for v in range(1, clauses.num_vars + 1):
+                if clauses.names[v] is not None:
+                    fp.write(f"c {v} {clauses.names[v]}\n")
+        fp.write(f"p cnf {clauses.num_vars} {len(clauses)}\n")
+        for clause in clauses:
+            fp.write(" ".join(map(str, clause)))
+            fp.write(" 0\n")
+
+
+def compare_with_z3(path) -> dict:
+    """Solve a DIMACS file with `CDCLSolver` and with Z3, return both results."""
+    db = read_dimacs(path)
+
+    start = time.time()
+    solver = CDCLSolver(clauses=db)
+    result = solver.solve()
+    dpll_time = time.time() - start
+    if result:
+        assert all(any(solver.model[abs(lit)] == (lit > 0) for lit in clause) for clause in db)
+    print(f"dpll solve {path} by time {dpll_time:.6f}s: {'sat' if result else 'unsat'}")
+
+    z3_vars = [None] + [z3.Bool(name) for name in db.names[1:]]
+    z3_solver = z3.Solver()
+    for clause in db:
+        z3_solver.add(z3.Or([z3_vars[lit] if lit > 0 else z3.Not(z3_vars[-lit]) for lit in clause]))
+    start = time.time()
+    z3_result = z3_solver.check()
+    z3_time = time.time() - start
+    print(f"z3 solve {path} by time {z3_time:.6f}s: {z3_result}")
+
+    assert result == (z3_result == z3.sat)
+    return {"dpll": result, "dpll_time": dpll_time, "z3": z3_result == z3.sat, "z3_time": z3_time}
+
+
+class TestDimacs(unittest.TestCase):
+    def test_read_dimacs(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "test.cnf"
+            path.write_text("c comment\np cnf 4 3\n1 -3 0\n2 3\n-1 0\n-4 0\n%\n0\n")
+            db = read_dimacs(path)
+            self.assertEqual([list(clause) for clause in db], [[1, -3], [2, 3, -1], [-4]])
+            self.assertEqual(db.num_vars, 4)
+
+    def test_roundtrip(self):
+        clauses = flatten(PNot(dnf_prop(4)), "distribute")
+        for suffix in (".cnf", ".cnf.gz", ".cnf.xz"):
+            with tempfile.TemporaryDirectory() as folder:
+                path = Path(folder) / f"test{suffix}"
+                write_dimacs(clauses, path)
+                db = read_dimacs(path)
+                self.assertEqual(len(db), len(clauses))
+                self.assertEqual(list(db.lits)[:4], [-1, -2, -3, -4])
+
+    def test_compare_with_z3(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "test.cnf.gz"
+            write_dimacs(flatten(PVar("p"), "tseitin") + flatten(PNot(PVar("p"))), path)
+            self.assertEqual(compare_with_z3(path)["dpll"], False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        for file in sys.argv[1:]:
+            compare_with_z3(file)
+    else:
+        unittest.main()
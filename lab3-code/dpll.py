@@ -1,9 +1,19 @@
+import functools
+import gc
+import itertools
+import threading
 import unittest
+import weakref
 from dataclasses import dataclass
-from typing import List
+from typing import Callable, Iterator, List
 
 from z3 import *
 
+from cdcl import CDCLSolver
+from clause_db import ClauseDB
+from portfolio import solve_portfolio
+from preprocess import Preprocessor
+
 # In this problem, you will implement the DPLL algorithm as discussed
 # in the class.
 
@@ -21,13 +31,39 @@ P ::= p
 '''
 
 
-@dataclass
+# The nodes are hash-consed: constructing a node that is structurally
+# equal to a live one returns that very object, so equality is identity
+# and the (structural) hash is computed once, at construction. A
+# formula with shared subformulas is thus stored as a DAG.
+# The unique table only holds weak references to the nodes.
+_unique_table = weakref.WeakValueDictionary()
+
+
+@dataclass(frozen=True, eq=False)
 class Prop:
+    def __new__(cls, *args, **kwargs):
+        if kwargs:
+            args += tuple(kwargs[name] for name in cls.__match_args__[len(args):])
+        key = (cls, *args)
+        node = _unique_table.get(key)
+        if node is None:
+            node = object.__new__(cls)
+            object.__setattr__(node, "_hash", hash((cls.__name__, *args)))
+            _unique_table[key] = node
+        return node
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # unpickling goes through the unique table as well
+        return type(self), tuple(getattr(self, name) for name in self.__match_args__)
+
     def __repr__(self):
         return self.__str__()
 
 
-@dataclass(repr=False)
+@dataclass(frozen=True, eq=False, repr=False)
 class PVar(Prop):
     var: str
 
@@ -37,23 +73,20 @@ class PVar(Prop):
     def __repr__(self):
         return self.__str__()
 
-    def __hash__(self):
-        return hash(self.var)
-
 
-@dataclass(repr=False)
+@dataclass(frozen=True, eq=False, repr=False)
 class PTrue(Prop):
     def __str__(self):
         return "True"
 
 
-@dataclass(repr=False)
+@dataclass(frozen=True, eq=False, repr=False)
 class PFalse(Prop):
     def __str__(self):
         return "False"
 
 
-@dataclass(repr=False)
+@dataclass(frozen=True, eq=False, repr=False)
 class PAnd(Prop):
     left: Prop
     right: Prop
@@ -62,7 +95,7 @@ class PAnd(Prop):
         return f"({self.left} /\\ {self.right})"
 
 
-@dataclass(repr=False)
+@dataclass(frozen=True, eq=False, repr=False)
 class POr(Prop):
     left: Prop
     right: Prop
@@ -71,7 +104,7 @@ class POr(Prop):
         return f"({self.left} \\/ {self.right})"
 
 
-@dataclass(repr=False)
+@dataclass(frozen=True, eq=False, repr=False)
 class PImplies(Prop):
     left: Prop
     right: Prop
@@ -80,7 +113,7 @@ class PImplies(Prop):
         return f"({self.left} -> {self.right})"
 
 
-@dataclass(repr=False)
+@dataclass(frozen=True, eq=False, repr=False)
 class PNot(Prop):
     p: Prop
 
@@ -88,26 +121,147 @@ class PNot(Prop):
         return f"~{self.p}"
 
 
+def memoize(transform):
+    """Cache the result of `transform` per argument node(s).
+
+    As the nodes are hash-consed, each distinct subformula is transformed
+    only once. The cache holds neither the arguments nor the result alive.
+    """
+    cache = weakref.WeakKeyDictionary()
+
+    @functools.wraps(transform)
+    def memoized(*props: Prop) -> Prop:
+        table = cache
+        for prop in props[:-1]:
+            inner = table.get(prop)
+            if inner is None:
+                inner = table[prop] = weakref.WeakKeyDictionary()
+            table = inner
+        ref = table.get(props[-1])
+        result = ref() if ref is not None else None
+        if result is None:
+            result = transform(*props)
+            table[props[-1]] = weakref.ref(result)
+        return result
+
+    return memoized
+
+
 # Exercise 3-1: try to complete the `to_z3()` method to make
 # we can convert the above defined syntax into Z3's representation, so
 # that we can check it's validity easily:
-def to_z3(prop: Prop) -> z3.BoolRef:
-    match prop:
-        case PVar(var):
-            return Bool(var)
-        case PTrue():
-            return True
-        case PFalse():
-            return False
-        # raise NotImplementedError('TODO: Your code here!')
-        case PAnd(left, right):
-            return And(to_z3(left), to_z3(right))
-        case POr(left, right):
-            return Or(to_z3(left), to_z3(right))
-        case PImplies(left, right):
-            return Implies(to_z3(left), to_z3(right))
-        case PNot(p):
-            return Not(to_z3(p))
+#
+# Each Z3 context has a table of the constant of every variable, and of
+# the translation of every node seen so far (held weakly), so a shared
+# subformula is translated once however often it is referenced. The
+# tables are an attribute of the context: the translations refer to
+# their context, so a global table keyed by the context, even weakly,
+# would keep every context alive. They go with the context, or with
+# `clear_z3_tables()`.
+_Z3_TABLES = "_prop_tables"
+_z3_tables_lock = threading.Lock()
+
+
+def z3_tables(ctx: Context | None = None) -> tuple:
+    """The (variable constants, node translations) tables of `ctx`."""
+    ctx = ctx or main_ctx()
+    with _z3_tables_lock:
+        tables = getattr(ctx, _Z3_TABLES, None)
+        if tables is None:
+            tables = ({}, weakref.WeakKeyDictionary())
+            setattr(ctx, _Z3_TABLES, tables)
+        return tables
+
+
+def clear_z3_tables(ctx: Context | None = None):
+    with _z3_tables_lock:
+        vars(ctx or main_ctx()).pop(_Z3_TABLES, None)
+
+
+def to_z3(prop: Prop, ctx: Context | None = None) -> z3.BoolRef:
+    """Translate `prop` into a Z3 term of the context `ctx`.
+
+    Threads translating at the same time should pass their own context,
+    as Z3 contexts are not thread safe.
+    """
+    ctx = ctx or main_ctx()
+    consts, nodes = z3_tables(ctx)
+    # post-order walk: a node is translated once its children are
+    stack = [prop]
+    while stack:
+        node = stack[-1]
+        if node in nodes:
+            stack.pop()
+            continue
+        match node:
+            case PVar(var):
+                const = consts.get(var)
+                if const is None:
+                    const = consts[var] = Bool(var, ctx)
+                nodes[node] = const
+            case PTrue():
+                nodes[node] = BoolVal(True, ctx)
+            case PFalse():
+                nodes[node] = BoolVal(False, ctx)
+            # raise NotImplementedError('TODO: Your code here!')
+            case PNot(p):
+                if p not in nodes:
+                    stack.append(p)
+                    continue
+                nodes[node] = Not(nodes[p])
+            case PAnd(left, right) | POr(left, right) | PImplies(left, right):
+                if left not in nodes or right not in nodes:
+                    stack.extend(child for child in (left, right) if child not in nodes)
+                    continue
+                connective = And if isinstance(node, PAnd) else Or if isinstance(node, POr) else Implies
+                nodes[node] = connective(nodes[left], nodes[right])
+        stack.pop()
+    return nodes[prop]
+
+
+def from_z3(expr: z3.BoolRef) -> Prop:
+    """Translate a propositional Z3 term back into a `Prop`.
+
+    Besides And/Or/Implies/Not, Boolean ==, Xor, Distinct and If are
+    rewritten with them. A shared Z3 subterm becomes a shared node.
+    """
+    props = {}
+    stack = [expr]
+    while stack:
+        term = stack[-1]
+        if term.get_id() in props:
+            stack.pop()
+            continue
+        missing = [child for child in term.children() if child.get_id() not in props]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        args = [props[child.get_id()] for child in term.children()]
+        if is_true(term):
+            prop = PTrue()
+        elif is_false(term):
+            prop = PFalse()
+        elif is_const(term) and is_bool(term):
+            prop = PVar(term.decl().name())
+        elif is_not(term):
+            prop = PNot(args[0])
+        elif is_and(term):
+            prop = conjoin(args) if args else PTrue()
+        elif is_or(term):
+            prop = functools.reduce(POr, args) if args else PFalse()
+        elif is_implies(term):
+            prop = PImplies(args[0], args[1])
+        elif (is_eq(term) or is_distinct(term) or is_app_of(term, Z3_OP_XOR)) \
+                and len(args) == 2 and is_bool(term.arg(0)):
+            iff = PAnd(PImplies(args[0], args[1]), PImplies(args[1], args[0]))
+            prop = iff if is_eq(term) else PNot(iff)
+        elif is_app_of(term, Z3_OP_ITE) and is_bool(term):
+            prop = POr(PAnd(args[0], args[1]), PAnd(PNot(args[0]), args[2]))
+        else:
+            raise Exception(f"{term} is not a propositional formula")
+        props[term.get_id()] = prop
+    return props[expr.get_id()]
 
 
 #####################
@@ -120,6 +274,7 @@ def to_z3(prop: Prop) -> z3.BoolRef:
 #   C(P\/Q)   = C(P) \/ C(Q)
 #   C(P->Q)   = ~C(P) \/ C(Q)
 
+@memoize
 def ie(prop: Prop) -> Prop:
     # raise NotImplementedError('TODO: Your code here!')
     match prop:
@@ -145,6 +300,7 @@ def ie(prop: Prop) -> Prop:
 #   C(P\/Q)    = C(P) \/ C(Q)
 #   C(~(P/\Q)) = C(~P) \/ C(~Q)
 #   C(~(P\/Q)) = C(~P) /\ C(~Q)
+@memoize
 def nnf(prop_without_implies: Prop) -> Prop:
     match prop_without_implies:
         case PImplies(left, right):
@@ -179,33 +335,147 @@ def nnf(prop_without_implies: Prop) -> Prop:
 #   D(P=P1/\P2, Q) = D(P1, Q) /\ D(P2, Q)
 #   D(P, Q=Q1/\Q2) = D(P, Q1) /\ D(P, Q2)
 #   D(P, Q)        = P \/ Q
-def cnf(nnf_prop: Prop) -> Prop:
-    def cnf_d(left: Prop, right: Prop) -> Prop:
-        # raise NotImplementedError('TODO: Your code here!')
-        match left:
-            case PAnd(left_left, left_right):
-                return PAnd(cnf_d(left_left, right), cnf_d(left_right, right))
-            case _:
-                match right:
-                    case PAnd(right_left, right_right):
-                        return PAnd(cnf_d(left, right_left), cnf_d(left, right_right))
-                    case _:
-                        return POr(left, right)
+def cnf(nnf_prop: Prop, mode: str = "distribute") -> Prop:
+    if mode not in ENCODINGS:
+        raise ValueError(f"unknown CNF encoding: {mode}")
+    if mode != "distribute":
+        return cnf_tseitin(nnf_prop, full=(mode == "tseitin"))
+    return cnf_distribute(nnf_prop)
+
+
+@memoize
+def cnf_d(left: Prop, right: Prop) -> Prop:
+    # raise NotImplementedError('TODO: Your code here!')
+    match left:
+        case PAnd(left_left, left_right):
+            return PAnd(cnf_d(left_left, right), cnf_d(left_right, right))
+        case _:
+            match right:
+                case PAnd(right_left, right_right):
+                    return PAnd(cnf_d(left, right_left), cnf_d(left, right_right))
+                case _:
+                    return POr(left, right)
+
 
+@memoize
+def cnf_distribute(nnf_prop: Prop) -> Prop:
     match nnf_prop:
         case PAnd(left, right):
-            return PAnd(cnf(left), cnf(right))
+            return PAnd(cnf_distribute(left), cnf_distribute(right))
         case POr(left, right):
-            return cnf_d(cnf(left), cnf(right))
+            return cnf_d(cnf_distribute(left), cnf_distribute(right))
         case PNot(p):
-            return PNot(cnf(p))
-        case PVar(p):
-            return p
+            return PNot(cnf_distribute(p))
         case _:
             return nnf_prop
 
 
-def flatten(cnf_prop: Prop) -> List[List[Prop]]:
+# The distributive conversion above may blow up exponentially: a
+# disjunction of n two-literal conjunctions becomes 2^n clauses. The
+# Tseitin encoding instead names every subformula P with a fresh
+# variable t_P and only relates t_P to the names of its children:
+#   T(P/\Q) : t -> t_P,  t -> t_Q,  t_P /\ t_Q -> t
+#   T(P\/Q) : t -> t_P \/ t_Q,  t_P -> t,  t_Q -> t
+# The result is equisatisfiable with the input and linear in its size.
+# Since the input is in NNF every subformula occurs positively, so the
+# Plaisted-Greenbaum variant keeps only the first (t -> ...) half.
+ENCODINGS = ("distribute", "tseitin", "pg")
+
+# prefix of the fresh variables, `cnf_tseitin()` rejects user variables
+# starting with it
+TSEITIN_PREFIX = "_t"
+
+
+def conjoin(props: List[Prop]) -> Prop:
+    """Join props with /\\ as a balanced tree, so its depth stays logarithmic."""
+    if len(props) == 1:
+        return props[0]
+    mid = len(props) // 2
+    return PAnd(conjoin(props[:mid]), conjoin(props[mid:]))
+
+
+def negate_literal(literal: Prop) -> Prop:
+    match literal:
+        case PNot(p):
+            return p
+        case _:
+            return PNot(literal)
+
+
+def cnf_tseitin(nnf_prop: Prop, full: bool = True) -> Prop:
+    """Convert a NNF proposition into an equisatisfiable CNF.
+
+    Fresh variables are named `TSEITIN_PREFIX` + counter, so variables
+    of `nnf_prop` must not start with it. With `full` each fresh variable
+    is equivalent to its subformula (Tseitin), otherwise it only implies
+    it (Plaisted-Greenbaum).
+    """
+    clashes = [var for var in variables(nnf_prop) if var.startswith(TSEITIN_PREFIX)]
+    if clashes:
+        raise ValueError(f"variables {clashes} clash with the fresh Tseitin variables {TSEITIN_PREFIX}0, ...")
+    clauses = []
+    names = {}
+
+    def name(prop: Prop) -> Prop:
+        match prop:
+            case PImplies():
+                raise Exception("Proposition should not contain implication in CNF conversion")
+            case PNot(PAnd() | POr()):
+                raise Exception("Proposition should be in NNF in CNF conversion")
+            case PAnd(left, right) | POr(left, right):
+                # shared subformulas get the same name
+                if prop in names:
+                    return names[prop]
+                a, b = name(left), name(right)
+                t = PVar(f"{TSEITIN_PREFIX}{len(names)}")
+                names[prop] = t
+                if isinstance(prop, PAnd):
+                    clauses.append(POr(PNot(t), a))
+                    clauses.append(POr(PNot(t), b))
+                    if full:
+                        clauses.append(POr(t, POr(negate_literal(a), negate_literal(b))))
+                else:
+                    clauses.append(POr(PNot(t), POr(a, b)))
+                    if full:
+                        clauses.append(POr(t, negate_literal(a)))
+                        clauses.append(POr(t, negate_literal(b)))
+                return t
+            case _:
+                return prop
+
+    # top level conjunctions need no names
+    roots = [nnf_prop]
+    while roots:
+        match roots.pop():
+            case PAnd(left, right):
+                roots += [right, left]
+            case root:
+                clauses.append(name(root))
+    return conjoin(clauses)
+
+
+def iter_clauses(cnf_prop: Prop) -> Iterator[List[Prop]]:
+    """Yield the clauses of a CNF AST one by one, from left to right."""
+    # walk the tree with explicit stacks, left subtrees first, so that
+    # deep trees neither copy lists nor hit the recursion limit
+    conjuncts = [cnf_prop]
+    while conjuncts:
+        match conjuncts.pop():
+            case PAnd(left, right):
+                conjuncts += [right, left]
+            case clause:
+                atoms = []
+                disjuncts = [clause]
+                while disjuncts:
+                    match disjuncts.pop():
+                        case POr(left, right):
+                            disjuncts += [right, left]
+                        case atom:
+                            atoms.append(atom)
+                yield atoms
+
+
+def flatten(cnf_prop: Prop, mode: str | None = None) -> List[List[Prop]]:
     """Flatten CNF Propositions to nested list structure .
 
     The CNF Propositions generated by `cnf` method is AST.
@@ -217,6 +487,9 @@ def flatten(cnf_prop: Prop) -> List[List[Prop]]:
     ----------
     cnf_prop : Prop
         CNF Propositions generated by `cnf` method.
+    mode : str, optional
+        If given, `cnf_prop` may be any proposition, it is converted
+        by `cnf(nnf(ie(cnf_prop)), mode)` first.
 
     Returns
     -------
@@ -225,39 +498,279 @@ def flatten(cnf_prop: Prop) -> List[List[Prop]]:
         and second level lists is connected by `Or`.
 
     """
+    if mode is not None:
+        return flatten(cnf(nnf(ie(cnf_prop)), mode))
+
+    return list(iter_clauses(cnf_prop))
+
+
+def variables(prop: Prop) -> List[str]:
+    """Names of the variables in `prop`, in order of first occurrence."""
+    names = {}
+    visited = set()
+    stack = [prop]
+    while stack:
+        p = stack.pop()
+        if p in visited:
+            continue
+        visited.add(p)
+        match p:
+            case PVar(var):
+                names.setdefault(var, None)
+            case PAnd(left, right) | POr(left, right) | PImplies(left, right):
+                stack += [right, left]
+            case PNot(p):
+                stack.append(p)
+    return list(names)
+
+
+def clause_sink(db: ClauseDB) -> Callable[[List[Prop]], None]:
+    """A function adding a clause of literal Props to `db`.
+
+    Literals True/False are simplified away. `db` may be anything with
+    the `var()` and `add_clause()` methods of `ClauseDB`, such as a
+    `DpllSolver`.
+    """
+    def add(atoms: List[Prop]):
+        lits = []
+        for atom in atoms:
+            match atom:
+                case PVar(var):
+                    lits.append(db.var(var))
+                case PNot(PVar(var)):
+                    lits.append(-db.var(var))
+                case PTrue() | PNot(PFalse()):
+                    return
+                case PFalse() | PNot(PTrue()):
+                    pass
+                case _:
+                    raise Exception(f"Proposition {atom} is not a literal in CNF")
+        db.add_clause(lits)
 
-    def get_atom_from_disjunction(prop: Prop) -> List[Prop]:
-        match prop:
+    return add
+
+
+def to_clause_db(cnf_prop: Prop, names: List[str] = ()) -> ClauseDB:
+    """Store the clauses of `cnf_prop` in a `ClauseDB` in one pass.
+
+    `names` are interned first, so they get the integers 1, 2, ...
+    """
+    db = ClauseDB(names)
+    add = clause_sink(db)
+    for atoms in iter_clauses(cnf_prop):
+        add(atoms)
+    return db
+
+
+# The three passes ie(), nnf() and cnf() above are recursive and build a
+# new tree each. `normalize()` fuses them: it walks the input once with
+# an explicit stack, tracking the polarity of each subformula, so that
+# implications are eliminated and negations pushed inwards on the fly:
+#   N+(P/\Q) = N+(P) /\ N+(Q)      N-(P/\Q) = N-(P) \/ N-(Q)
+#   N+(P\/Q) = N+(P) \/ N+(Q)      N-(P\/Q) = N-(P) /\ N-(Q)
+#   N+(P->Q) = N-(P) \/ N+(Q)      N-(P->Q) = N+(P) /\ N-(Q)
+#   N+(~P)   = N-(P)               N-(~P)   = N+(P)
+# where the clause set of a disjunction is the pairwise union of the
+# clause sets of its sides, in the order `cnf_d` produces them.
+def normalize(prop: Prop, sink: Callable[[List[Prop]], None] | None = None) -> List[List[Prop]] | None:
+    """Compute `flatten(cnf(nnf(ie(prop))))` in a single pass.
+
+    The clauses are passed one by one to `sink`, e.g. `clause_sink(db)`;
+    without a sink they are returned as a list.
+    """
+    if sink is None:
+        clauses = []
+        normalize(prop, clauses.append)
+        return clauses
+
+    def strip_negations(p: Prop, positive: bool) -> tuple:
+        while isinstance(p, PNot):
+            p, positive = p.p, not positive
+        return p, positive
+
+    def split(p: Prop, positive: bool):
+        # (is_conjunction, left, right) with the polarities of the sides,
+        # or None for atoms
+        match p:
+            case PAnd(left, right):
+                return positive, (left, positive), (right, positive)
             case POr(left, right):
-                return get_atom_from_disjunction(left) + get_atom_from_disjunction(right)
-            case PVar(prop):
-                return [prop]
-            case _:
-                return [prop]
+                return not positive, (left, positive), (right, positive)
+            case PImplies(left, right):
+                return not positive, (left, not positive), (right, positive)
+        return None
+
+    def operands(p: Prop, positive: bool, is_and: bool) -> List[tuple]:
+        # the maximal subformulas below a chain of /\ (or of \/), so that
+        # long chains are combined at once instead of level by level
+        result = []
+        stack = [(p, positive)]
+        while stack:
+            p, positive = strip_negations(*stack.pop())
+            parts = split(p, positive)
+            if parts is not None and parts[0] == is_and:
+                stack += [parts[2], parts[1]]
+            else:
+                result.append((p, positive))
+        return result
+
+    # clause sets of the subformulas below disjunctions, per polarity
+    results = {}
+
+    def clauses_of(p: Prop, positive: bool) -> List[tuple]:
+        stack = [(p, positive)]
+        while stack:
+            key = stack[-1]
+            if key in results:
+                stack.pop()
+                continue
+            parts = split(*key)
+            if parts is None:
+                atom, atom_positive = key
+                results[key] = [(atom if atom_positive else PNot(atom),)]
+                stack.pop()
+                continue
+            ops = operands(*key, parts[0])
+            missing = [op for op in ops if op not in results]
+            if missing:
+                stack += missing
+                continue
+            stack.pop()
+            if parts[0]:
+                results[key] = [clause for op in ops for clause in results[op]]
+            else:
+                results[key] = [tuple(itertools.chain.from_iterable(combination))
+                                for combination in itertools.product(*(results[op] for op in ops))]
+        return results[p, positive]
+
+    # top level conjunctions are streamed to the sink directly
+    for p, positive in operands(prop, True, True):
+        for clause in clauses_of(p, positive):
+            sink(list(clause))
+    return None
+
+
+def dpll(prop: Prop, mode: str = "distribute", preprocess: bool = False,
+         workers: int = 1, share: bool = True, stats: dict | None = None) -> dict | str:
+    """Decide the satisfiability of `prop` with a CDCL search.
+
+    `mode` selects the CNF encoding, see `ENCODINGS`. With `preprocess`
+    the clauses are simplified by a `Preprocessor` first. With several
+    `workers` a portfolio of solvers runs on as many processes, and
+    exchanges short learned clauses if `share`, see portfolio.py. A
+    `stats` dict is filled with the counters of the (winning) solver,
+    and those of the preprocessing prefixed by "preprocess_".
+
+    Returns a model like {"p1": True, "p2": False, ...} covering every
+    variable of `prop` (the fresh Tseitin variables are dropped), or
+    "unsat" if there is no solution.
+    """
+    names = variables(prop)
+    if mode == "distribute":
+        db = ClauseDB(names)
+        normalize(prop, clause_sink(db))
+    else:
+        db = to_clause_db(cnf(nnf(ie(prop)), mode), names)
+    if preprocess:
+        preprocessor = Preprocessor(db)
+        clauses = preprocessor.simplify()
+    else:
+        clauses = db
+    if workers > 1:
+        result, model, _, solver_stats = solve_portfolio(clauses, workers, share)
+    else:
+        solver = CDCLSolver(clauses=clauses)
+        result, model = solver.solve(), solver.model
+        solver_stats = solver.stats()
+    if stats is not None:
+        stats.update(solver_stats)
+        if preprocess:
+            stats.update({f"preprocess_{key}": value for key, value in preprocessor.stats().items()})
+    if not result:
+        return "unsat"
+    if preprocess:
+        model = preprocessor.extend(model)
+    return {var: model[db.index[var]] for var in names}
+
+
+class DpllSolver:
+    """An incremental version of `dpll()`.
+
+    The solver keeps its clauses, and what it learned from them, between
+    calls, so a series of related queries does not start from scratch:
+
+        solver = DpllSolver()
+        solver.add(PImplies(PVar("p"), PVar("q")))
+        solver.solve([PVar("p"), PNot(PVar("q"))])    # False
+        solver.failed_assumptions()                   # [~q, p]
+        solver.push()
+        solver.add(PVar("p"))
+        solver.solve()                                # True, q holds
+        solver.pop()                                  # p is free again
+
+    `mode` selects the CNF encoding of `add()`, see `ENCODINGS`.
+    """
 
-    match cnf_prop:
-        case PAnd(left, right):
-            return flatten(left) + flatten(right)
-        case POr():
-            return [get_atom_from_disjunction(cnf_prop)]
-        case _:
-            return [[cnf_prop]]
-
-
-def dpll(prop: Prop) -> dict:
-    cnf_flat = flatten(cnf(nnf(ie(prop))))
-    print(cnf_flat)
-
-    # Challenge: implement the dpll algorithm we've discussed in the lecture
-    # you can deal with flattened cnf which generated by `flatten` method for convenience,
-    # or, as another choice, you can process the original cnf destructure generated by `cnf` method
-    #
-    # your implementation should output the result as dict like :
-    # {"p1": True, "p2": False, "p3": False, "p4": True} if there is solution;
-    # output "unsat" if there is no solution
-    #
-    # feel free to add new method.
-    # raise NotImplementedError('TODO: Your code here!')
+    def __init__(self, mode: str = "distribute"):
+        if mode not in ENCODINGS:
+            raise ValueError(f"unknown CNF encoding {mode!r}, expected one of {ENCODINGS}")
+        self.mode = mode
+        self.solver = CDCLSolver()
+        self.index = {}
+        # the fresh Tseitin variables of the current call of add()
+        self.fresh = {}
+        self.assumptions = {}
+
+    def var(self, name: str) -> int:
+        fresh = self.mode != "distribute" and name.startswith(TSEITIN_PREFIX)
+        table = self.fresh if fresh else self.index
+        var = table.get(name)
+        if var is None:
+            var = table[name] = self.solver.new_vars(1)
+        return var
+
+    def add_clause(self, lits: List[int]):
+        self.solver.add_clause(lits)
+
+    def add(self, prop: Prop):
+        """Add `prop` to the current frame."""
+        if self.mode == "distribute":
+            normalize(prop, clause_sink(self))
+            return
+        # each call numbers its fresh variables from 0 again
+        self.fresh = {}
+        add = clause_sink(self)
+        for atoms in iter_clauses(cnf(nnf(ie(prop)), self.mode)):
+            add(atoms)
+
+    def push(self):
+        """Open a frame, the props added from now on are dropped by `pop()`."""
+        self.solver.push()
+
+    def pop(self):
+        """Drop the props added since the matching `push()`."""
+        self.solver.pop()
+
+    def solve(self, assumptions: List[Prop] = ()) -> bool:
+        """Decide the props added so far, with the literals `assumptions` true."""
+        self.assumptions = {}
+        for literal in assumptions:
+            match literal:
+                case PVar(var):
+                    self.assumptions[self.var(var)] = literal
+                case PNot(PVar(var)):
+                    self.assumptions[-self.var(var)] = literal
+                case _:
+                    raise Exception(f"Assumption {literal} is not a literal")
+        return self.solver.solve(list(self.assumptions))
+
+    def model(self) -> dict:
+        """The model found by the last successful `solve()`."""
+        return {var: self.solver.model[v] for var, v in self.index.items()}
+
+    def failed_assumptions(self) -> List[Prop]:
+        """The assumptions responsible for the last failed `solve()`."""
+        return [self.assumptions[lit] for lit in self.solver.failed_assumptions()]
 
 
 #####################
@@ -273,6 +786,14 @@ test_prop_2 = PNot(PAnd(
 ))
 
 
+# (p1 /\ q1) \/ (p2 /\ q2) \/ ... \/ (pn /\ qn)
+def dnf_prop(n: int) -> Prop:
+    prop = PAnd(PVar("p0"), PVar("q0"))
+    for i in range(1, n):
+        prop = POr(prop, PAnd(PVar(f"p{i}"), PVar(f"q{i}")))
+    return prop
+
+
 # #####################
 class TestDpll(unittest.TestCase):
     def test_to_z3_1(self):
@@ -281,6 +802,53 @@ class TestDpll(unittest.TestCase):
     def test_to_z3_2(self):
         self.assertEqual(str(to_z3(test_prop_2)), "Not(And(Or(p1, Not(p2)), Or(p3, Not(p4))))")
 
+    def test_to_z3_shared(self):
+        self.assertEqual(str(to_z3(PAnd(PTrue(), PNot(PFalse())))), "And(True, Not(False))")
+        # 2^60 leaves, but only 61 distinct nodes
+        prop = PVar("p")
+        for _ in range(60):
+            prop = POr(prop, prop)
+        s = Solver()
+        s.add(Not(to_z3(prop) == Bool("p")))
+        self.assertEqual(str(s.check()), "unsat")
+        self.assertIs(to_z3(PVar("p")), to_z3(PVar("p")))
+
+        def translate(results: list, index: int):
+            ctx = Context()
+            solver = Solver(ctx=ctx)
+            solver.add(to_z3(PAnd(test_prop_2, PVar(f"p{index}")), ctx))
+            results[index] = str(solver.check())
+
+        results = [None] * 4
+        threads = [threading.Thread(target=translate, args=(results, i)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["sat"] * 4)
+
+    def test_z3_tables_lifetime(self):
+        # the tables do not keep a context alive
+        ctx = Context()
+        to_z3(test_prop_2, ctx)
+        self.assertTrue(z3_tables(ctx)[1])
+        alive = weakref.ref(ctx)
+        del ctx
+        gc.collect()
+        self.assertIsNone(alive())
+        ctx = Context()
+        term = to_z3(test_prop_2, ctx)
+        clear_z3_tables(ctx)
+        self.assertFalse(z3_tables(ctx)[1])
+        self.assertIsNot(to_z3(test_prop_2, ctx), term)
+
+    def test_from_z3(self):
+        self.assertIs(from_z3(to_z3(test_prop_2)), test_prop_2)
+        p, q, r = Bools("p q r")
+        self.assertEqual(str(from_z3(And(p, Or(q, r, Not(p)), p == q))),
+                         "(p /\\ (((q \\/ r) \\/ ~p) /\\ ((p -> q) /\\ (q -> p))))")
+        self.assertRaises(Exception, from_z3, Int("x") > 0)
+
     def test_ie_1(self):
         self.assertEqual(str(ie(test_prop_1)), "(~p \\/ (~q \\/ p))")
 
@@ -302,12 +870,10 @@ class TestDpll(unittest.TestCase):
 
     def test_cnf_flatten_1(self):
         test_1_flatten = flatten(cnf(nnf(ie(test_prop_1))))
-        raise NotImplementedError('TODO: ERROR in output string!')
         self.assertEqual(str(test_1_flatten), "[[~p, ~q, p]]")
 
     def test_cnf_flatten_2(self):
         test_2_flatten = flatten(cnf(nnf(ie(test_prop_2))))
-        raise NotImplementedError('TODO: ERROR in output string!')
         self.assertEqual(str(test_2_flatten), "[[~p1, ~p3], [~p1, p4], [p2, ~p3], [p2, p4]]")
 
     def test_dpll_1(self):
@@ -322,6 +888,110 @@ class TestDpll(unittest.TestCase):
         s.add(Not(Not(And(Or(res["p1"], Not(res["p2"])), Or(res["p3"], Not(res["p4"]))))))
         self.assertEqual(str(s.check()), "unsat")
 
+    def test_cnf_tseitin(self):
+        self.assertEqual(str(flatten(test_prop_2, "pg")),
+                         "[[~_t0, ~p1], [~_t0, p2], [~_t1, ~p3], [~_t1, p4], [~_t2, _t0, _t1], [_t2]]")
+        self.assertEqual(len(flatten(dnf_prop(10), "distribute")), 2 ** 10)
+        self.assertEqual(len(flatten(dnf_prop(10), "pg")), 3 * 10)
+        self.assertEqual(len(flatten(dnf_prop(10), "tseitin")), 6 * 10 - 2)
+
+    def test_clause_db(self):
+        db = to_clause_db(cnf(nnf(ie(test_prop_2))))
+        self.assertEqual(list(db.lits), [-1, -2, -1, 3, 4, -2, 4, 3])
+        self.assertEqual(str(db), "[[~p1, ~p3], [~p1, p4], [p2, ~p3], [p2, p4]]")
+        self.assertEqual(str(to_clause_db(PAnd(PTrue(), POr(PVar("p"), PFalse())))), "[[p]]")
+
+    def test_normalize(self):
+        for prop in (test_prop_1, test_prop_2, dnf_prop(4), PNot(PImplies(dnf_prop(3), PNot(dnf_prop(2))))):
+            self.assertEqual(normalize(prop), flatten(cnf(nnf(ie(prop)))))
+
+        # ~(...~(~(p0 -> p1) -> p2)... -> pn), far deeper than the recursion limit
+        prop = PVar("p0")
+        for i in range(1, 20000):
+            prop = PNot(PImplies(prop, PVar(f"p{i}")))
+        self.assertEqual(str(normalize(prop)[:3]), "[[p0], [~p1], [~p2]]")
+        self.assertEqual(len(dpll(prop)), 20000)
+
+    def test_hash_consing(self):
+        self.assertIs(PAnd(PVar("p"), PNot(PVar("q"))), PAnd(PVar("p"), PNot(PVar("q"))))
+        self.assertIs(PVar(var="p"), PVar("p"))
+        self.assertIsNot(PAnd(PVar("p"), PVar("q")), POr(PVar("p"), PVar("q")))
+        self.assertIs(ie(test_prop_1), ie(test_prop_1))
+
+        # a chain of n shared nodes stands for a tree of 2^n leaves, its
+        # NNF has one node per level and polarity
+        prop = PVar("p")
+        for _ in range(40):
+            prop = PImplies(prop, prop)
+        self.assertIs(ie(prop).left.p, ie(prop).right)
+        self.assertEqual(len(flatten(prop, "tseitin")), 6 * 40 - 2)
+
+    def test_tseitin_prefix(self):
+        prop = POr(PAnd(PVar("p"), PVar("q")), PVar(f"{TSEITIN_PREFIX}0"))
+        for mode in ("tseitin", "pg"):
+            with self.assertRaises(ValueError):
+                cnf(prop, mode)
+        self.assertEqual(set(dpll(prop)), {"p", "q", f"{TSEITIN_PREFIX}0"})
+        solver = DpllSolver()
+        solver.add(prop)
+        self.assertTrue(solver.solve([PNot(PVar("p"))]))
+        self.assertTrue(solver.model()[f"{TSEITIN_PREFIX}0"])
+
+    def test_dpll_tseitin(self):
+        for mode in ("tseitin", "pg"):
+            s = Solver()
+            res = dpll(test_prop_2, mode)
+            self.assertEqual(sorted(res), ["p1", "p2", "p3", "p4"])
+            s.add(Not(Not(And(Or(res["p1"], Not(res["p2"])), Or(res["p3"], Not(res["p4"]))))))
+            self.assertEqual(str(s.check()), "unsat")
+            self.assertEqual(dpll(PAnd(test_prop_2, PAnd(PVar("p1"), PVar("p3"))), mode), "unsat")
+
+    def test_dpll_preprocess(self):
+        prop = PAnd(PNot(dnf_prop(6)), POr(PVar("p0"), PVar("q5")))
+        for mode in ENCODINGS:
+            res = dpll(prop, mode, preprocess=True)
+            s = Solver()
+            s.add(Not(to_z3(prop)))
+            s.add([Bool(var) == value for var, value in res.items()])
+            self.assertEqual(str(s.check()), "unsat")
+            self.assertEqual(dpll(PAnd(prop, PAnd(PVar("p0"), PVar("q0"))), mode, preprocess=True), "unsat")
+        stats = {}
+        dpll(prop, "tseitin", preprocess=True, stats=stats)
+        self.assertIn("decisions", stats)
+        self.assertGreater(stats["preprocess_vars_before"], len(variables(prop)))
+        self.assertLess(stats["preprocess_vars_after"], stats["preprocess_vars_before"])
+        self.assertLessEqual(stats["preprocess_clauses_after"], stats["preprocess_clauses_before"])
+
+    def test_dpll_portfolio(self):
+        s = Solver()
+        res = dpll(test_prop_2, "tseitin", workers=3)
+        s.add(Not(Not(And(Or(res["p1"], Not(res["p2"])), Or(res["p3"], Not(res["p4"]))))))
+        self.assertEqual(str(s.check()), "unsat")
+        self.assertEqual(dpll(PAnd(test_prop_2, PAnd(PVar("p1"), PVar("p3"))), workers=2), "unsat")
+
+    def test_dpll_solver(self):
+        p, q = PVar("p"), PVar("q")
+        for mode in ENCODINGS:
+            solver = DpllSolver(mode)
+            solver.add(test_prop_2)
+            self.assertFalse(solver.solve([p, PVar("p1"), PVar("p3")]))
+            self.assertEqual(str(solver.failed_assumptions()), "[p3, p1]")
+            solver.push()
+            solver.add(PImplies(p, PNot(PVar("p2"))))
+            solver.add(POr(p, PVar("p4")))
+            self.assertTrue(solver.solve([p]))
+            self.assertEqual(solver.model()["p2"], False)
+            self.assertFalse(solver.solve([p, PVar("p2")]))
+            self.assertEqual(str(solver.failed_assumptions()), "[p2, p]")
+            solver.pop()
+            self.assertTrue(solver.solve([p, PVar("p2")]))
+            solver.push()
+            solver.add(PAnd(q, PNot(q)))
+            self.assertFalse(solver.solve([p]))
+            self.assertEqual(solver.failed_assumptions(), [])
+            solver.pop()
+            self.assertTrue(solver.solve([q]))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,264 @@
+"""Exact model counting (#SAT)
+
+Enumerating the solutions of a formula with blocking clauses takes time
+linear in their number, which may be astronomical. `count_models()`
+counts them without enumeration, in the style of sharpSAT:
+
+  * the formula goes through the full Tseitin encoding, whose fresh
+    variables are determined by the original ones, so the clauses have
+    exactly as many models over the original variables as the formula;
+  * unit propagation simplifies the clauses after each decision;
+  * the clauses are split into connected components (sharing no
+    variable), whose counts multiply;
+  * the count of each component is cached under its canonical form,
+    the sorted tuple of its sorted clauses, in a LRU cache;
+  * a component is counted by branching on its most frequent variable,
+    the counts of both branches add up. The branches nest as deep as
+    there are variables, so they are run on an explicit stack rather
+    than by recursion.
+
+Python integers have arbitrary precision, so counts do not overflow.
+"""
+
+import random
+import unittest
+from collections import OrderedDict
+from itertools import product
+from typing import Generator, Iterable, List, Set, Tuple
+
+import z3
+
+from dpll import PAnd, PFalse, PNot, POr, PTrue, PVar, Prop, cnf, from_z3, ie, nnf, to_clause_db, variables
+
+Clause = Tuple[int, ...]
+
+
+def _propagate(clauses: List[Clause]) -> Tuple[List[Clause] | None, Set[int]]:
+    """Unit propagation, return the remaining clauses and the assigned variables.
+
+    The clauses are None on a conflict, or if one of them is empty. Each
+    clause keeps the number of its literals not yet false, so an
+    assignment only visits the clauses of its variable.
+    """
+    if any(not clause for clause in clauses):
+        return None, set()
+    occurs = {}
+    for index, clause in enumerate(clauses):
+        for lit in clause:
+            occurs.setdefault(lit, []).append(index)
+    size = [len(clause) for clause in clauses]
+    satisfied = [False] * len(clauses)
+    value = {}
+    queue = [clause[0] for clause in clauses if len(clause) == 1]
+    while queue:
+        lit = queue.pop()
+        var = abs(lit)
+        if var in value:
+            if value[var] != lit:
+                return None, set(value)
+            continue
+        value[var] = lit
+        for index in occurs.get(lit, ()):
+            satisfied[index] = True
+        for index in occurs.get(-lit, ()):
+            if satisfied[index]:
+                continue
+            size[index] -= 1
+            if size[index] == 0:
+                return None, set(value)
+            if size[index] == 1:
+                queue.append(next(q for q in clauses[index] if abs(q) not in value))
+    if not value:
+        return clauses, set()
+    return [tuple(q for q in clause if abs(q) not in value)
+            for index, clause in enumerate(clauses) if not satisfied[index]], set(value)
+
+
+def _components(clauses: List[Clause]) -> List[List[Clause]]:
+    """Split the clauses into groups sharing no variable."""
+    parent = {}
+
+    def find(var):
+        while parent[var] != var:
+            parent[var] = parent[parent[var]]
+            var = parent[var]
+        return var
+
+    for clause in clauses:
+        for lit in clause:
+            parent.setdefault(abs(lit), abs(lit))
+        root = find(abs(clause[0]))
+        for lit in clause[1:]:
+            other = find(abs(lit))
+            if other != root:
+                parent[other] = root
+    groups = {}
+    for clause in clauses:
+        groups.setdefault(find(abs(clause[0])), []).append(clause)
+    return list(groups.values())
+
+
+class ModelCounter:
+    """Count the assignments of the `counted` variables satisfying clauses.
+
+    The other variables must be determined by the counted ones, like
+    the Tseitin variables. At most `cache_size` component counts are
+    kept, the least recently used ones are dropped first.
+    """
+
+    def __init__(self, counted: Iterable[int], cache_size: int = 1 << 16):
+        self.counted = set(counted)
+        self.cache: OrderedDict = OrderedDict()
+        self.cache_size = cache_size
+        self.decisions = 0
+        self.hits = 0
+
+    def stats(self) -> dict:
+        return {"decisions": self.decisions, "cache hits": self.hits, "cache entries": len(self.cache)}
+
+    def count(self, clauses: Iterable[Iterable[int]]) -> int:
+        clauses = [tuple(sorted(set(clause))) for clause in clauses]
+        if any(not clause for clause in clauses):
+            # the empty clause, e.g. of a False in the formula
+            return 0
+        clauses = [clause for clause in clauses if not any(-lit in clause for lit in clause)]
+        occurring = {abs(lit) for clause in clauses for lit in clause}
+        return 2 ** len(self.counted - occurring) * self._run(self._count(clauses))
+
+    @staticmethod
+    def _run(task: Generator) -> int:
+        # `_count()` and `_count_component()` are generators that yield the
+        # generator of each subproblem and are sent back its count; they
+        # are driven here on an explicit stack instead of recursing
+        stack = [task]
+        result = None
+        while stack:
+            try:
+                subtask = stack[-1].send(result)
+            except StopIteration as stop:
+                stack.pop()
+                result = stop.value
+                continue
+            stack.append(subtask)
+            result = None
+        return result
+
+    def _count(self, clauses: List[Clause]) -> Generator:
+        # the counted variables occurring in `clauses`
+        before = {abs(lit) for clause in clauses for lit in clause} & self.counted
+        clauses, assigned = _propagate(clauses)
+        if clauses is None:
+            return 0
+        after = {abs(lit) for clause in clauses for lit in clause}
+        # variables whose clauses were all satisfied are free
+        result = 2 ** len(before - after - assigned)
+        for component in _components(clauses):
+            result *= yield self._count_component(component)
+            if result == 0:
+                break
+        return result
+
+    def _count_component(self, component: List[Clause]) -> Generator:
+        key = tuple(sorted(component))
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return cached
+
+        occurrences = {}
+        for clause in component:
+            for lit in clause:
+                occurrences[abs(lit)] = occurrences.get(abs(lit), 0) + 1
+        var = max(occurrences, key=occurrences.get)
+        self.decisions += 1
+        result = (yield self._count(component + [(var,)])) + (yield self._count(component + [(-var,)]))
+
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+
+def count_models(prop: Prop | z3.BoolRef, over: Iterable[str | PVar | z3.BoolRef] | None = None,
+                 cache_size: int = 1 << 16) -> int:
+    """The number of models of `prop`, a `Prop` or a propositional Z3 term.
+
+    The models are counted over the variables `over`, by default those
+    of `prop`; listed variables that do not occur in `prop` double the
+    count, like the free props of `iter_models()`.
+    """
+    if isinstance(prop, z3.ExprRef):
+        prop = from_z3(prop)
+    if over is None:
+        names = variables(prop)
+    else:
+        names = [var.var if isinstance(var, PVar) else str(var) for var in over]
+        missing = set(variables(prop)) - set(names)
+        if missing:
+            raise ValueError(f"variables {sorted(missing)} of the formula are not counted")
+    db = to_clause_db(cnf(nnf(ie(prop)), "tseitin"), names)
+    counter = ModelCounter((db.index[name] for name in names), cache_size)
+    return counter.count(db)
+
+
+class TestModelCount(unittest.TestCase):
+    def test_circuit(self):
+        a, b, c, d = z3.Bools('a b c d')
+        F = z3.Or(z3.And(d, z3.And(a, b)), z3.And(z3.Not(c), z3.And(a, b)))
+        self.assertEqual(count_models(F, [a, b, c, d]), 3)
+        self.assertEqual(count_models(z3.Not(F), [a, b, c, d]), 13)
+        self.assertEqual(count_models(F, [a, b, c, d, "e"]), 6)
+        self.assertEqual(count_models(z3.And(a, z3.Not(a))), 0)
+        self.assertEqual(count_models(z3.And(a, z3.BoolVal(False))), 0)
+
+    def test_false(self):
+        a = PVar('a')
+        self.assertEqual(count_models(PAnd(a, PFalse())), 0)
+        self.assertEqual(count_models(PAnd(a, PNot(PTrue()))), 0)
+        self.assertEqual(count_models(POr(a, PFalse())), 1)
+        self.assertEqual(ModelCounter([1, 2]).count([(1, 2), ()]), 0)
+        self.assertEqual(_propagate([(1,), ()]), (None, set()))
+
+    def test_deep(self):
+        # a chain of implications x1 -> x2 -> ... branches about n / 2
+        # deep, past the recursion limit
+        n = 1500
+        self.assertEqual(ModelCounter(range(1, n + 1)).count([(-i, i + 1) for i in range(1, n)]), n + 1)
+
+    def test_big(self):
+        xs = [PVar(f"x{i}") for i in range(300)]
+        prop = xs[0]
+        for x in xs[1:]:
+            prop = POr(prop, x)
+        self.assertEqual(count_models(prop), 2 ** 300 - 1)
+
+        # n x n permutation matrices: exactly one per row and per column
+        n = 7
+        p = [[PVar(f"p{i}_{j}") for j in range(n)] for i in range(n)]
+        lines = [[p[i][j] for j in range(n)] for i in range(n)] + [[p[i][j] for i in range(n)] for j in range(n)]
+        constraints = []
+        for line in lines:
+            one = line[0]
+            for x in line[1:]:
+                one = POr(one, x)
+            constraints.append(one)
+            constraints += [POr(PNot(x), PNot(y)) for k, x in enumerate(line) for y in line[k + 1:]]
+        prop = constraints[0]
+        for constraint in constraints[1:]:
+            prop = PAnd(prop, constraint)
+        self.assertEqual(count_models(prop), 5040)
+
+    def test_random(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            n = rng.randint(1, 8)
+            clauses = [[rng.choice([-1, 1]) * rng.randint(1, n) for _ in range(rng.randint(1, 3))]
+                       for _ in range(rng.randint(0, 3 * n))]
+            expected = sum(all(any(model[abs(lit) - 1] == (lit > 0) for lit in clause) for clause in clauses)
+                           for model in product([False, True], repeat=n))
+            self.assertEqual(ModelCounter(range(1, n + 1), cache_size=4).count(clauses), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Portfolio solving on several processes
+
+A portfolio runs differently configured `CDCLSolver`s on the same
+clauses in parallel: different seeds, phase policies and restart
+schedules make them explore the search space in different orders, and
+whichever finishes first answers for all. The other workers are then
+terminated; this is why they are plain processes rather than a
+`multiprocessing.Pool`, whose `terminate()` can hang when it kills a
+worker in the middle of a task.
+
+With `share`, the workers also exchange their short learned clauses
+through a ring buffer in shared memory. A slot of the buffer holds the
+id of the writing worker, the length of the clause and up to
+`SHARE_SIZE` literals; a shared counter, whose lock also guards the
+buffer, numbers the clauses written so far. Each worker remembers how
+far it has read, and collects the clauses of the other workers at every
+restart. A worker that falls more than `SHARE_SLOTS` clauses behind
+just misses the oldest ones.
+"""
+
+import multiprocessing
+import os
+import queue
+import unittest
+from typing import List
+
+from cdcl import CDCLSolver
+from clause_db import ClauseDB
+
+# the configurations of the workers, cycled with a new seed when there
+# are more workers than entries
+CONFIGS = [
+    {},
+    {"phase": "false", "restart": "geometric", "restart_base": 100},
+    {"phase": "save", "restart": "luby", "restart_base": 50, "random_freq": 0.02},
+    {"phase": "true", "restart": "luby", "restart_base": 200, "var_decay": 0.9},
+    {"phase": "random", "restart": "luby", "restart_base": 100, "random_freq": 0.05},
+    {"phase": "save", "restart": "geometric", "restart_base": 300, "var_decay": 0.99},
+]
+
+# learned clauses up to this length are shared
+SHARE_SIZE = 8
+SHARE_SLOTS = 4096
+SLOT = 2 + SHARE_SIZE
+
+
+def worker_config(worker: int) -> dict:
+    return {**CONFIGS[worker % len(CONFIGS)], "seed": worker}
+
+
+def _solve_worker(worker: int, db: ClauseDB, buffer, counter, results):
+    solver = CDCLSolver(clauses=db, **worker_config(worker))
+    if buffer is not None:
+        position = 0
+
+        def export(lits: List[int]):
+            if len(lits) > SHARE_SIZE:
+                return
+            with counter.get_lock():
+                base = counter.value % SHARE_SLOTS * SLOT
+                counter.value += 1
+                buffer[base] = worker
+                buffer[base + 1] = len(lits)
+                buffer[base + 2:base + 2 + len(lits)] = lits
+
+        def fetch() -> List[List[int]]:
+            nonlocal position
+            clauses = []
+            with counter.get_lock():
+                end = counter.value
+                for k in range(max(position, end - SHARE_SLOTS), end):
+                    base = k % SHARE_SLOTS * SLOT
+                    if buffer[base] != worker:
+                        clauses.append(buffer[base + 2:base + 2 + buffer[base + 1]])
+            position = end
+            return clauses
+
+        solver.on_learnt = export
+        solver.fetch_clauses = fetch
+    result = solver.solve()
+    results.put((worker, result, solver.model, solver.stats()))
+
+
+def solve_portfolio(db: ClauseDB, workers: int | None = None, share: bool = True):
+    """Solve the clauses of `db` with a portfolio of `workers` processes.
+
+    Returns (result, model, winner, stats) like `CDCLSolver.solve()`
+    and `model`, where `winner` is the worker that answered, see
+    `worker_config()`, and `stats` its statistics. Raises a
+    RuntimeError if every worker dies without an answer.
+    """
+    workers = workers or os.cpu_count()
+    if share:
+        buffer = multiprocessing.RawArray('i', SHARE_SLOTS * SLOT)
+        counter = multiprocessing.Value('q', 0)
+    else:
+        buffer = counter = None
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_solve_worker, args=(worker, db, buffer, counter, results),
+                                         daemon=True)
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        while True:
+            try:
+                worker, result, model, stats = results.get(timeout=0.1)
+                break
+            except queue.Empty:
+                # an answer is flushed to the queue before its worker exits
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    codes = [process.exitcode for process in processes]
+                    raise RuntimeError(f"all portfolio workers died, exit codes {codes}")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    return result, model, worker, stats
+
+
+def pigeonhole(pigeons: int, holes: int) -> ClauseDB:
+    """The clauses putting each pigeon in a hole, no two in the same one.
+
+    Unsatisfiable iff there are more pigeons than holes, and hard for
+    CDCL then; the tests of the parallel solvers run on it.
+    """
+    # p(i, j): pigeon i sits in hole j
+    db = ClauseDB()
+    p = [[db.var(f"p{i}_{j}") for j in range(holes)] for i in range(pigeons)]
+    for i in range(pigeons):
+        db.add_clause(p[i])
+    for j in range(holes):
+        for i in range(pigeons):
+            for k in range(i + 1, pigeons):
+                db.add_clause([-p[i][j], -p[k][j]])
+    return db
+
+
+class TestPortfolio(unittest.TestCase):
+    def test_unsat(self):
+        for share in (False, True):
+            result, model, worker, stats = solve_portfolio(pigeonhole(7, 6), 3, share)
+            self.assertFalse(result)
+            self.assertIn(worker, range(3))
+
+    def test_dead_workers(self):
+        # a worker that crashes on its clauses
+        with self.assertRaises(RuntimeError):
+            solve_portfolio([[1, 2], "not a clause"], 2)
+
+    def test_sat(self):
+        db = pigeonhole(8, 8)
+        result, model, worker, stats = solve_portfolio(db, 4)
+        self.assertTrue(result)
+        self.assertTrue(all(any(model[abs(lit)] == (lit > 0) for lit in clause) for clause in db))
+
+
+if __name__ == '__main__':
+    unittest.main()
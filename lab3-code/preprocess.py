@@ -0,0 +1,352 @@
+"""CNF preprocessing
+
+The distributive `cnf()` produces many duplicate and subsumed clauses,
+and the Tseitin encodings many variables that only serve as
+definitions. `Preprocessor` shrinks a `ClauseDB` before the search:
+
+  * unit propagation and pure literal elimination;
+  * subsumption and self-subsuming strengthening, using occurrence
+    lists: a clause C removes every clause D containing it, and
+    strengthens every D containing C with one literal negated
+        C = (a \\/ b),  D = (~a \\/ b \\/ c)   ==>   D = (b \\/ c)
+  * bounded variable elimination (BVE): a variable x is replaced by all
+    the resolvents of the clauses containing x with those containing ~x,
+    if that does not add clauses.
+
+The result is equisatisfiable. The removed clauses are pushed on a
+reconstruction stack, together with a witness literal, so `extend()` can
+turn a model of the simplified clauses into a model of the input.
+
+Run this file on some DIMACS files to print what the preprocessing does:
+    python preprocess.py uf250-01.cnf hole8.cnf.gz
+"""
+
+import sys
+import time
+import unittest
+from itertools import product
+from typing import Iterable, List
+
+from clause_db import ClauseDB
+
+
+def _occurring_vars(db: ClauseDB) -> int:
+    """Number of variables occurring in some clause of `db`."""
+    return len({abs(lit) for lit in db.lits})
+
+
+class Preprocessor:
+    """Simplify the clauses of a `ClauseDB`.
+
+    Variables of `frozen` are never eliminated, use it for the variables
+    later constrained by assumptions or new clauses. A variable is only
+    eliminated if it has at most `occ_limit` occurrences of one sign and
+    all its resolvents are at most `clause_limit` literals long.
+    """
+
+    def __init__(self, db: ClauseDB, frozen: Iterable[int] = (),
+                 occ_limit: int = 16, clause_limit: int = 20):
+        self.names = db.names
+        self.index = db.index
+        self.num_vars = db.num_vars
+        self.frozen = set(frozen)
+        self.occ_limit = occ_limit
+        self.clause_limit = clause_limit
+        self.ok = True
+
+        # clauses as sets of literals, None once removed
+        self.clauses: List[set | None] = []
+        # occurs[lit] are the clauses containing lit, indexed like the
+        # per-literal tables of `CDCLSolver`
+        self.occurs = [set() for _ in range(2 * self.num_vars + 1)]
+        self.units = []
+        self.assigned = set()
+        self.eliminated = set()
+        # clauses to check for subsumption
+        self.touched = set()
+        # (witness literal, clause) pairs, see `extend()`
+        self.stack = []
+
+        self.before = (len(db), db.num_lits, _occurring_vars(db))
+        self.after = self.before
+        self.counts = {"fixed": 0, "pure": 0, "eliminated": 0,
+                       "duplicates": 0, "subsumed": 0, "strengthened": 0}
+        self.time = 0.0
+
+        seen = set()
+        for clause in db:
+            lits = set(clause)
+            if any(-lit in lits for lit in lits):
+                continue
+            key = frozenset(lits)
+            if key in seen:
+                self.counts["duplicates"] += 1
+                continue
+            seen.add(key)
+            self._add(lits)
+
+    def stats(self) -> dict:
+        return {"clauses_before": self.before[0], "lits_before": self.before[1],
+                "vars_before": self.before[2],
+                "clauses_after": self.after[0], "lits_after": self.after[1],
+                "vars_after": self.after[2],
+                **self.counts, "time": self.time}
+
+    def report(self) -> str:
+        return (f"preprocess: {self.before[0]} clauses, {self.before[1]} literals,"
+                f" {self.before[2]} variables -> {self.after[0]} clauses,"
+                f" {self.after[1]} literals, {self.after[2]} variables"
+                f" in {self.time:.6f}s ({', '.join(f'{k} {v}' for k, v in self.counts.items())})")
+
+    ########################################
+    # clause set
+
+    def _add(self, lits: set):
+        if not lits:
+            self.ok = False
+            return
+        cid = len(self.clauses)
+        self.clauses.append(lits)
+        for lit in lits:
+            self.occurs[lit].add(cid)
+        if len(lits) == 1:
+            self.units.append(next(iter(lits)))
+        self.touched.add(cid)
+
+    def _remove(self, cid: int):
+        for lit in self.clauses[cid]:
+            self.occurs[lit].discard(cid)
+        self.clauses[cid] = None
+
+    def _strengthen(self, cid: int, lit: int):
+        clause = self.clauses[cid]
+        clause.discard(lit)
+        self.occurs[lit].discard(cid)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.units.append(next(iter(clause)))
+        self.touched.add(cid)
+
+    ########################################
+    # simplifications
+
+    def _propagate(self):
+        occurs = self.occurs
+        while self.units and self.ok:
+            lit = self.units.pop()
+            if lit in self.assigned:
+                continue
+            if -lit in self.assigned:
+                self.ok = False
+                return
+            self.assigned.add(lit)
+            self.stack.append((lit, (lit,)))
+            self.counts["fixed"] += 1
+            for cid in list(occurs[lit]):
+                self._remove(cid)
+            for cid in list(occurs[-lit]):
+                self._strengthen(cid, -lit)
+
+    def _pure(self):
+        occurs = self.occurs
+        candidates = set(range(1, self.num_vars + 1)) - self.frozen - self.eliminated
+        while candidates and self.ok:
+            var = candidates.pop()
+            if var in self.frozen or var in self.eliminated:
+                continue
+            for lit in (var, -var):
+                if occurs[lit] and not occurs[-lit]:
+                    self.stack.append((lit, (lit,)))
+                    self.eliminated.add(var)
+                    self.counts["pure"] += 1
+                    for cid in list(occurs[lit]):
+                        candidates.update(abs(q) for q in self.clauses[cid])
+                        self._remove(cid)
+
+    def _subsume(self):
+        """Backward subsumption and strengthening with the touched clauses."""
+        clauses, occurs = self.clauses, self.occurs
+        while self.touched and self.ok:
+            queue = sorted(self.touched, key=lambda cid: len(clauses[cid] or ()))
+            self.touched = set()
+            for cid in queue:
+                clause = clauses[cid]
+                if clause is None:
+                    continue
+                # every candidate contains the least occurring variable of
+                # the clause, with one sign or the other
+                best = min(clause, key=lambda lit: len(occurs[lit]) + len(occurs[-lit]))
+                for other in [*occurs[best], *occurs[-best]]:
+                    target = clauses[other]
+                    if other == cid or target is None or len(target) < len(clause):
+                        continue
+                    # the only literal of `clause` negated in `target`
+                    flipped = 0
+                    for lit in clause:
+                        if lit not in target:
+                            if flipped or -lit not in target:
+                                break
+                            flipped = lit
+                    else:
+                        if flipped:
+                            self.counts["strengthened"] += 1
+                            self._strengthen(other, -flipped)
+                        else:
+                            self.counts["subsumed"] += 1
+                            self._remove(other)
+                self._propagate()
+                if not self.ok:
+                    return
+
+    def _eliminate(self, var: int) -> bool:
+        clauses, occurs = self.clauses, self.occurs
+        pos, neg = occurs[var], occurs[-var]
+        if len(pos) > self.occ_limit and len(neg) > self.occ_limit:
+            return False
+        resolvents = []
+        for p, n in product(pos, neg):
+            left, right = clauses[p], clauses[n]
+            if any(-lit in right for lit in left if lit != var):
+                continue
+            resolvent = (left | right) - {var, -var}
+            if len(resolvent) > self.clause_limit:
+                return False
+            resolvents.append(resolvent)
+            if len(resolvents) > len(pos) + len(neg):
+                return False
+
+        for lit in (var, -var):
+            for cid in list(occurs[lit]):
+                self.stack.append((lit, tuple(clauses[cid])))
+                self._remove(cid)
+        self.eliminated.add(var)
+        self.counts["eliminated"] += 1
+        for resolvent in resolvents:
+            self._add(resolvent)
+        return True
+
+    def _eliminate_all(self):
+        occurs = self.occurs
+        done = self.frozen | self.eliminated | {abs(lit) for lit in self.assigned}
+        candidates = [var for var in range(1, self.num_vars + 1)
+                      if var not in done and (occurs[var] or occurs[-var])]
+        candidates.sort(key=lambda var: len(occurs[var]) * len(occurs[-var]))
+        for var in candidates:
+            if not self.ok:
+                return
+            if var in self.eliminated or var in self.assigned or -var in self.assigned:
+                continue
+            if self._eliminate(var):
+                self._propagate()
+                self._subsume()
+
+    def simplify(self) -> ClauseDB:
+        """Run all the simplifications, return the remaining clauses.
+
+        The variables keep their numbers, so a model of the result
+        indexes like a model of the input.
+        """
+        start = time.time()
+        self._propagate()
+        self._subsume()
+        if self.ok:
+            self._pure()
+            self._eliminate_all()
+
+        db = ClauseDB()
+        db.names = list(self.names)
+        db.index = dict(self.index)
+        if self.ok:
+            for clause in self.clauses:
+                if clause is not None:
+                    db.add_clause(sorted(clause, key=abs))
+        else:
+            db.add_clause([])
+        self.after = (len(db), db.num_lits, _occurring_vars(db))
+        self.time = time.time() - start
+        return db
+
+    def extend(self, model: List[bool]) -> List[bool]:
+        """Turn a model of the simplified clauses into one of the input.
+
+        The stack is replayed backwards: whenever a removed clause is
+        false, its witness literal is made true. For an eliminated
+        variable at most one sign needs this, since the resolvents hold.
+        """
+        model = list(model)
+        for witness, clause in reversed(self.stack):
+            if not any(model[abs(lit)] == (lit > 0) for lit in clause):
+                model[abs(witness)] = witness > 0
+        return model
+
+
+class TestPreprocess(unittest.TestCase):
+    @staticmethod
+    def brute_force(num_vars: int, clauses) -> bool:
+        return any(all(any(model[abs(lit) - 1] == (lit > 0) for lit in clause) for clause in clauses)
+                   for model in product([False, True], repeat=num_vars))
+
+    def test_subsumption(self):
+        db = ClauseDB(["a", "b", "c", "d"])
+        for clause in ([1, 2], [-1, 2, 3], [1, 2, 4], [1, 2], [3, 4, -2], [-3, 4, -2]):
+            db.add_clause(clause)
+        pre = Preprocessor(db, frozen=[1, 2, 3, 4])
+        self.assertEqual([list(clause) for clause in pre.simplify()], [[1, 2], [2, 3], [3, 4], [-2, 4]])
+        self.assertEqual(pre.stats()["duplicates"], 1)
+        self.assertEqual(pre.stats()["subsumed"], 1)
+        self.assertEqual(pre.stats()["strengthened"], 3)
+        self.assertEqual((pre.stats()["vars_before"], pre.stats()["vars_after"]), (4, 4))
+
+    def test_elimination(self):
+        # a chain of definitions t_i <-> t_{i-1} /\ x_i
+        db = ClauseDB()
+        t = db.new_vars(1)
+        for _ in range(20):
+            x = db.new_vars(1)
+            s = db.new_vars(1)
+            db.add_clause([-s, t])
+            db.add_clause([-s, x])
+            db.add_clause([s, -t, -x])
+            t = s
+        db.add_clause([t])
+        pre = Preprocessor(db)
+        simplified = pre.simplify()
+        self.assertEqual(len(simplified), 0)
+        model = pre.extend([False] * (db.num_vars + 1))
+        self.assertTrue(all(any(model[abs(lit)] == (lit > 0) for lit in clause) for clause in db))
+
+    def test_random(self):
+        import random
+        rng = random.Random(0)
+        for _ in range(300):
+            num_vars = rng.randint(1, 8)
+            db = ClauseDB()
+            db.new_vars(num_vars)
+            for _ in range(rng.randint(1, 4 * num_vars)):
+                db.add_clause([rng.choice([-1, 1]) * rng.randint(1, num_vars)
+                               for _ in range(rng.randint(1, 3))])
+            pre = Preprocessor(db, occ_limit=3, clause_limit=4)
+            simplified = pre.simplify()
+            sat = self.brute_force(num_vars, list(db))
+            self.assertEqual(self.brute_force(num_vars, list(simplified)), sat)
+            if sat:
+                # any model of the simplified clauses extends
+                for model in product([False, True], repeat=num_vars):
+                    model = [False, *model]
+                    if all(any(model[abs(lit)] == (lit > 0) for lit in clause) for clause in simplified):
+                        model = pre.extend(model)
+                        self.assertTrue(all(any(model[abs(lit)] == (lit > 0) for lit in clause)
+                                            for clause in db))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        from dimacs import read_dimacs
+
+        for file in sys.argv[1:]:
+            pre = Preprocessor(read_dimacs(file))
+            pre.simplify()
+            print(f"{file}: {pre.report()}")
+    else:
+        unittest.main()
@@ -7,8 +7,13 @@ Hints:
  You can reuse the `sat_all` function that you've implemented in exercise 1
  if you think necessary."""
 
+import time
+import unittest
+
 from z3 import *
 
+from cardinality import ENCODINGS, at_most_one, exactly_one
+
 
 # Exercise 5
 # Seat Arrangement Problem
@@ -23,75 +28,103 @@ from z3 import *
 
 
 def seat_arrangement():
-    solver = Solver()
     # First we need to modeling the problem
     # Let say:
-    #   A_i means Alice takes seat Ai,
-    #   B_i means Bob takes seat Bi,
-    #   C_i means Carol takes seat Ci.
-    # And since there are only 3 seats, so 1 <= i <= 3
-
-    n_seat = 3
-    a1, a2, a3 = Bools('a1 a2 a3')
-    b1, b2, b3 = Bools('b1 b2 b3')
-    c1, c2, c3 = Bools('c1 c2 c3')
-
-    # alice must take a seat:
-    alice_take_seat_1 = And(a1, Not(a2), Not(a3), Not(b1), Not(c1))
-    alice_take_seat_2 = And(a2, Not(a1), Not(a3), Not(b2), Not(c2))
-    alice_take_seat_3 = And(a3, Not(a1), Not(a2), Not(b3), Not(c3))
-    solver.add(Or(alice_take_seat_1, alice_take_seat_2, alice_take_seat_3))
-
-    # Exercise 5-1: try to add constraints that indicate Bob must take a seat
-    # bob must take a seat:
-    # raise NotImplementedError('TODO: Your code here!')
-    bob_take_seat_1 = And(b1, Not(b2), Not(b3), Not(a1), Not(c1))
-    bob_take_seat_2 = And(b2, Not(b1), Not(b3), Not(a2), Not(c2))
-    bob_take_seat_3 = And(b3, Not(b1), Not(b2), Not(a3), Not(c3))
-    solver.add(Or(bob_take_seat_1, bob_take_seat_2, bob_take_seat_3))
-    # Exercise 5-2: try to add constraints that indicate Carol must take a seat
-    # carol must take a seat:
-    # raise NotImplementedError('TODO: Your code here!')
-    carol_take_seat_1 = And(c1, Not(c2), Not(c3), Not(a1), Not(b1))
-    carol_take_seat_2 = And(c2, Not(c1), Not(c3), Not(a2), Not(b2))
-    carol_take_seat_3 = And(c3, Not(c1), Not(c2), Not(a3), Not(b3))
-    solver.add(Or(carol_take_seat_1, carol_take_seat_2, carol_take_seat_3))
-
-    # alice can not sit near to carol:
-    alice_not_near_carol = And(Implies(a1, Not(c2)), Implies(a2, Not(Or(c1, c3))), Implies(a3, Not(c2)))
-    solver.add(alice_not_near_carol)
-
-    # Exercise 5-3: try to add constraints that indicate Bob can not sit right to Alice
-    # bob can not sit right to Alice
-    # raise NotImplementedError('TODO: Your code here!')
-    bob_not_right_alice = And(Implies(a1, Not(b2)), Implies(a2, Not(b3)), Implies(a3, Not(b1)))
-    solver.add(bob_not_right_alice)
-    # Hint: here only one solution is printed, you may change this to
-    # print all the solutions to check your implementation.
-    solver.check()
+    #   Alice_i means Alice takes seat i,
+    #   Bob_i means Bob takes seat i,
+    #   Carol_i means Carol takes seat i.
+    # And since there are only 3 seats, so 0 <= i < 3
+    # `seat_model()` below builds the constraints: the two requirements,
+    # and everyone takes exactly one seat and a seat holds at most one
+    # person, by the cardinality encodings of cardinality.py.
+    constraints, seats = seat_model(3, encoding="auto")
+    solver = Solver()
+    solver.add(constraints)
+    # Hint: here only one solution is printed, see `count_arrangements()`
+    # for all the solutions.
+    if solver.check() != sat:
+        print("no arrangement")
+        return None
     model = solver.model()
-    # print(model)
     # fancy printing
-    if model.evaluate(a1):
-        print("Alice ", end='')
-    if model.evaluate(b1):
-        print("Bob ", end='')
-    if model.evaluate(c1):
-        print("Carol ", end='')
-    if model.evaluate(a2):
-        print("Alice ", end='')
-    if model.evaluate(b2):
-        print("Bob ", end='')
-    if model.evaluate(c2):
-        print("Carol ", end='')
-    if model.evaluate(a3):
-        print("Alice", end='')
-    if model.evaluate(b3):
-        print("Bob", end='')
-    if model.evaluate(c3):
-        print("Carol", end='')
+    arrangement = [person for i in range(3) for person, seat in seats.items()
+                   if is_true(model.eval(seat[i], model_completion=True))]
+    print(" ".join(arrangement), end='')
+    return arrangement
+
+
+# The same problem with n seats: a person takes exactly one seat and a
+# seat holds at most one person, which are cardinality constraints; see
+# cardinality.py for their encodings.
+def seat_model(n_seat: int, people=("Alice", "Bob", "Carol"), encoding: str = "auto"):
+    """Return the constraints of the arrangement and the variables seats[person][i]."""
+    seats = {person: [Bool(f"{person}_{i}") for i in range(n_seat)] for person in people}
+    constraints = []
+    for person in people:
+        constraints += exactly_one(seats[person], encoding)
+    for i in range(n_seat):
+        constraints += at_most_one([seats[person][i] for person in people], encoding)
+
+    if "Alice" in seats and "Carol" in seats:
+        alice, carol = seats["Alice"], seats["Carol"]
+        constraints += [Implies(alice[i], Not(carol[j])) for i in range(n_seat)
+                        for j in (i - 1, i + 1) if 0 <= j < n_seat]
+    if "Alice" in seats and "Bob" in seats:
+        # as above, the seat right to the last one is the first one
+        alice, bob = seats["Alice"], seats["Bob"]
+        constraints += [Implies(alice[i], Not(bob[(i + 1) % n_seat])) for i in range(n_seat)]
+    return constraints, seats
+
+
+def count_arrangements(n_seat: int, people=("Alice", "Bob", "Carol"), encoding: str = "auto") -> int:
+    constraints, seats = seat_model(n_seat, people, encoding)
+    solver = Solver()
+    solver.add(constraints)
+    variables = [seat for person in people for seat in seats[person]]
+    count = 0
+    while solver.check() == sat:
+        count += 1
+        model = solver.model()
+        # block the seats only, the encodings may add fresh variables
+        solver.add(Or([var != model.eval(var, True) for var in variables]))
+    return count
+
+
+def benchmark_encodings(sizes=(10, 20, 30), unsat_sizes=(6, 7, 8), timeout: int = 60):
+    """Solve n people in n seats, and n + 1 people in n seats, with each encoding.
+
+    A check taking more than `timeout` seconds is unknown.
+    """
+    for unsat in (False, True):
+        for n in unsat_sizes if unsat else sizes:
+            people = ["Alice", "Bob", "Carol"] + [f"p{i}" for i in range(3, n + unsat)]
+            for encoding in ENCODINGS:
+                start = time.time()
+                constraints, _ = seat_model(n, people, encoding)
+                solver = Solver()
+                solver.set("timeout", timeout * 1000)
+                solver.add(constraints)
+                build_time = time.time() - start
+                start = time.time()
+                result = solver.check()
+                print(f"{len(people):>3} people {n:>3} seats {encoding:>10}: {len(constraints):>7} constraints,"
+                      f" built by {build_time:.6f}s, {result} by {time.time() - start:.6f}s")
+
+
+class TestSeatArrange(unittest.TestCase):
+    def test_seat_arrangement(self):
+        # Alice and Carol take the end seats, and Bob is not right to Alice
+        self.assertEqual(seat_arrangement(), ["Carol", "Bob", "Alice"])
+
+    def test_count_arrangements(self):
+        # seat_arrangement should have 1 solution
+        self.assertEqual(count_arrangements(3), 1)
+        for n in (4, 5):
+            counts = {count_arrangements(n, encoding=encoding) for encoding in ENCODINGS}
+            self.assertEqual(len(counts), 1)
 
 
 if __name__ == '__main__':
-    # seat_arrangement should have 1 solution
     seat_arrangement()
+    print()
+    benchmark_encodings()
@@ -0,0 +1,105 @@
+"""Benchmark of the float and exact modes of `simplex()` and `fourier_motzkin()`,
+and of the revised simplex
+
+Each solver runs on the cases of the tests and on random systems of
+constraints with one-decimal coefficients, in each mode; the table
+gives the result and the time, and marks with `!` the results that
+differ from the exact one.
+
+Run this file to print the table:
+    python benchmark.py
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import time
+from typing import List
+
+import simpex
+from constraint import Constraint, Rel
+from fourier_motzkin import fourier_motzkin
+from simpex import simplex
+
+# the cases of the tests
+TEST_CASES = {
+    "simplex_sat": [Constraint([1, 1], 2), Constraint([2, -1], 0), Constraint([-1, 2], 1)],
+    "simplex_unsat": [Constraint([-1, 1, 0], 0), Constraint([-1, 0, 1], 0), Constraint([1, -1, -2], 0),
+                      Constraint([0, 0, 1], 1)],
+    "fm_sat": [Constraint([1, 1], 0.8), Constraint([1, -1], 0.2)],
+    "fm_unsat": [Constraint([-1, -1], 0.8), Constraint([-1, -5], 0.2), Constraint([1, 3], 0)],
+}
+
+SOLVERS = {
+    "simplex float": lambda constraints: simplex(constraints, exact=False),
+    "simplex revised": lambda constraints: simplex(constraints, exact=False, method="revised"),
+    "simplex auto": lambda constraints: simplex(constraints),
+    "simplex exact": lambda constraints: simplex(constraints, exact=True),
+    "fm float": lambda constraints: fourier_motzkin(constraints, exact=False),
+    "fm exact": lambda constraints: fourier_motzkin(constraints, exact=True),
+}
+
+
+def random_system(n_vars: int, n_constraints: int, seed: int = 0) -> List[Constraint]:
+    """Random constraints, a tenth of them equations.
+
+    They hold at a random point, except for odd seeds, where some
+    constraints are shifted so the system is likely unsatisfiable.
+    """
+    rng = random.Random(seed)
+    point = [rng.uniform(-5, 5) for _ in range(n_vars)]
+    constraints = []
+    for _ in range(n_constraints):
+        coefficients = [round(rng.uniform(-3, 3), 1) if rng.random() < 0.6 else 0 for _ in range(n_vars)]
+        total = sum(a * x for a, x in zip(coefficients, point))
+        if rng.random() < 0.1:
+            constraints.append(Constraint(coefficients, round(total, 1), Rel.EQ))
+        else:
+            slack = rng.uniform(0, 3) if seed % 2 == 0 else rng.uniform(-3, 1)
+            constraints.append(Constraint(coefficients, round(total - slack, 1)))
+    return constraints
+
+
+def measure(solve, constraints: List[Constraint]) -> tuple:
+    """(result, seconds) of solving the constraints, without their printing."""
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = solve(constraints)
+    return result, time.time() - start
+
+
+def bench(sizes=((5, 10), (10, 20), (20, 40), (40, 80)), fm_max_vars: int = 6, seeds: int = 3):
+    instances = dict(TEST_CASES)
+    for n_vars, n_constraints in sizes:
+        for seed in range(seeds):
+            instances[f"random_{n_vars}x{n_constraints}_{seed}"] = random_system(n_vars, n_constraints, seed)
+
+    print(f"{'instance':<22}" + "".join(f"{name:>22}" for name in SOLVERS))
+    totals = dict.fromkeys(SOLVERS, 0.0)
+    for name, constraints in instances.items():
+        cells, expected = [], None
+        for solver, solve in SOLVERS.items():
+            if solver.startswith("fm") and len(constraints[0].coefficients) > fm_max_vars:
+                cells.append("-")
+                continue
+            result, seconds = measure(solve, constraints)
+            totals[solver] += seconds
+            sat = result != "no solution"
+            if solver.endswith("exact") and expected is None:
+                expected = sat
+            cells.append(f"{'sat' if sat else 'unsat'} {seconds:10.6f}s")
+        # the exact results come last, mark the others against them
+        cells = [cell if cell == "-" or expected is None or (cell.startswith("sat")) == expected else f"!{cell}"
+                 for cell in cells]
+        print(f"{name:<22}" + "".join(f"{cell:>22}" for cell in cells))
+    print(f"{'total':<22}" + "".join(f"{totals[solver]:>21.6f}s" for solver in SOLVERS))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the float and exact modes of the LA solvers")
+    parser.add_argument("--fm-max-vars", type=int, default=6, help="skip Fourier-Motzkin on more variables")
+    parser.add_argument("--seeds", type=int, default=3)
+    args = parser.parse_args()
+    simpex.VERBOSE = False
+    bench(fm_max_vars=args.fm_max_vars, seeds=args.seeds)
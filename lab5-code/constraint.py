@@ -1,7 +1,10 @@
-from typing import List
+from typing import Iterable, List, Tuple
+import unittest
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
+
 
 class Rel(Enum):
     EQ = "="
@@ -35,6 +38,208 @@ class Constraint:
         return f"{coefficients_str} {self.relation.value} {self.value}"
 
 
+def compress(major: np.ndarray, minor: np.ndarray, data: np.ndarray, size: int):
+    """The (indptr, indices, data) of a sparse matrix given by the triplets (major, minor, data).
+
+    The entries of major index i are data[indptr[i]:indptr[i + 1]], in the
+    minor indices indices[indptr[i]:indptr[i + 1]]: with the row indices as
+    major this is CSR, with the column indices CSC.
+    """
+    order = np.lexsort((minor, major))
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(major, minlength=size), out=indptr[1:])
+    return indptr, minor[order], data[order]
+
+
+class ConstraintSystem:
+    """Constraints `values[i] <= A[i] . x`, or < or = by `relations[i]`, in one sparse matrix A.
+
+    A is in CSR form: the non-zero coefficients of constraint i are
+    data[indptr[i]:indptr[i + 1]], of the variables
+    indices[indptr[i]:indptr[i + 1]]. The arrays are not copied by the
+    constructors, nor by `RevisedSimplex`; the dense tableau of
+    `GeneralSimplex` copies A into a dense matrix. Indexing or iterating
+    the system gives `ConstraintView`s, which read like `Constraint`s.
+    """
+
+    __slots__ = ("n_vars", "indptr", "indices", "data", "values", "relations")
+
+    def __init__(self, n_vars: int, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                 values: np.ndarray, relations: np.ndarray | None = None):
+        self.n_vars = n_vars
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.data = np.asarray(data, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+        if relations is None:
+            relations = np.full(len(self.values), Rel.LE, dtype=object)
+        self.relations = np.asarray(relations, dtype=object)
+
+    @classmethod
+    def from_coo(cls, rows: np.ndarray, cols: np.ndarray, data: np.ndarray, values: np.ndarray, n_vars: int,
+                 relations: np.ndarray | None = None) -> "ConstraintSystem":
+        """The system of the coefficients data[k] of x_{cols[k]} in constraint rows[k]; repeated ones add up."""
+        rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+        data = np.asarray(data, dtype=np.float64)
+        indptr, indices, data = compress(rows, cols, data, len(values))
+        rows = np.repeat(np.arange(len(values)), np.diff(indptr))
+        # add up the repeated coefficients, then drop the zeros
+        first = np.ones(len(indices), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (indices[1:] != indices[:-1])
+        starts = np.flatnonzero(first)
+        if len(starts):
+            data, indices, rows = np.add.reduceat(data, starts), indices[starts], rows[starts]
+        nonzero = data != 0
+        data, indices, rows = data[nonzero], indices[nonzero], rows[nonzero]
+        indptr = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(values)), out=indptr[1:])
+        return cls(n_vars, indptr, indices, data, values, relations)
+
+    @classmethod
+    def from_dense(cls, matrix: np.ndarray, values: np.ndarray,
+                   relations: np.ndarray | None = None) -> "ConstraintSystem":
+        """The system of the rows of a dense matrix."""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        rows, cols = np.nonzero(matrix)
+        indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.count_nonzero(matrix, axis=1), out=indptr[1:])
+        return cls(matrix.shape[1], indptr, cols, matrix[rows, cols], values, relations)
+
+    @classmethod
+    def from_constraints(cls, constraints: Iterable, n_vars: int | None = None) -> "ConstraintSystem":
+        """The system of the `Constraint`s, or tuples (coefficients, value[, relation]), of any iterable.
+
+        The coefficients are dense sequences, or dicts from the variable
+        indices to their coefficients, which need `n_vars`. They are read
+        one after the other, so a generator is never held in memory.
+        """
+        indptr, indices, data, values, relations = [0], [], [], [], []
+        for constraint in constraints:
+            if isinstance(constraint, (Constraint, ConstraintView)):
+                coefficients, value, relation = constraint.coefficients, constraint.value, constraint.relation
+            else:
+                coefficients, value, relation = (tuple(constraint) + (Rel.LE,))[:3]
+            if isinstance(coefficients, dict):
+                if any(not 0 <= var < (n_vars or 0) for var in coefficients):
+                    raise IllegalConstraintError(constraint)
+                row = [(var, a) for var, a in sorted(coefficients.items()) if a]
+                indices.extend(var for var, _ in row)
+                data.extend(a for _, a in row)
+            else:
+                coefficients = np.asarray(coefficients, dtype=np.float64)
+                if n_vars is None:
+                    n_vars = len(coefficients)
+                if len(coefficients) != n_vars:
+                    raise IllegalConstraintError(constraint)
+                nonzero = np.flatnonzero(coefficients)
+                indices.extend(nonzero.tolist())
+                data.extend(coefficients[nonzero].tolist())
+            indptr.append(len(indices))
+            values.append(value)
+            relations.append(relation)
+        return cls(n_vars or 0, np.array(indptr), np.array(indices, dtype=np.int64), np.array(data),
+                   np.array(values, dtype=np.float64), np.array(relations, dtype=object))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index: int) -> "ConstraintView":
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return ConstraintView(self, index % len(self))
+
+    def __iter__(self):
+        return (ConstraintView(self, index) for index in range(len(self)))
+
+    def rows(self) -> np.ndarray:
+        """The constraint of each non-zero coefficient, the row indices of the COO form."""
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    def to_dense(self) -> np.ndarray:
+        matrix = np.zeros((len(self), self.n_vars))
+        matrix[self.rows(), self.indices] = self.data
+        return matrix
+
+    def __str__(self):
+        return "\n".join(str(constraint) for constraint in self)
+
+
+class ConstraintView:
+    """Constraint `index` of a `ConstraintSystem`, read like a `Constraint`."""
+
+    __slots__ = ("system", "index")
+
+    def __init__(self, system: ConstraintSystem, index: int):
+        self.system = system
+        self.index = index
+
+    def nonzero(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The variables with a non-zero coefficient, and these coefficients, as views of the system."""
+        start, end = self.system.indptr[self.index], self.system.indptr[self.index + 1]
+        return self.system.indices[start:end], self.system.data[start:end]
+
+    @property
+    def coefficients(self) -> np.ndarray:
+        coefficients = np.zeros(self.system.n_vars)
+        indices, data = self.nonzero()
+        coefficients[indices] = data
+        return coefficients
+
+    @property
+    def value(self) -> float:
+        return self.system.values[self.index]
+
+    @property
+    def relation(self) -> Rel:
+        return self.system.relations[self.index]
+
+    def to_constraint(self) -> Constraint:
+        return Constraint(self.coefficients.tolist(), float(self.value), self.relation)
+
+    __str__ = Constraint.__str__
+
+
+class TestConstraintSystem(unittest.TestCase):
+
+    constraints = [Constraint([1, 0, 2], 2), Constraint([0, 0, 0], -1, Rel.LT), Constraint([-1, 3, 0], 0, Rel.EQ)]
+
+    def check(self, system: ConstraintSystem):
+        self.assertEqual(len(system), 3)
+        self.assertEqual(list(system.indptr), [0, 2, 2, 4])
+        self.assertEqual(list(system.indices), [0, 2, 0, 1])
+        self.assertEqual([view.to_constraint() for view in system], self.constraints)
+
+    def test_constructors(self):
+        self.check(ConstraintSystem.from_constraints(self.constraints))
+        self.check(ConstraintSystem.from_constraints((c.coefficients, c.value, c.relation) for c in self.constraints))
+        self.check(ConstraintSystem.from_constraints([({0: 1, 2: 2}, 2), ({}, -1, Rel.LT), ({1: 3, 0: -1}, 0, Rel.EQ)],
+                                                     n_vars=3))
+        relations = [c.relation for c in self.constraints]
+        matrix = np.array([c.coefficients for c in self.constraints])
+        self.check(ConstraintSystem.from_dense(matrix, [2, -1, 0], relations))
+        # the coefficients of x0 in the last constraint add up
+        self.check(ConstraintSystem.from_coo([2, 0, 2, 0, 2, 1], [1, 2, 0, 0, 0, 2], [3, 2, -3, 1, 2, 0],
+                                             [2, -1, 0], 3, relations))
+        with self.assertRaises(IllegalConstraintError):
+            ConstraintSystem.from_constraints([Constraint([1, 2], 0), Constraint([1], 0)])
+
+    def test_compress(self):
+        dense = np.array([[0, 2, 0], [1, 0, 3], [0, 0, 0], [4, 5, 0]], dtype=np.float64)
+        rows, cols = np.nonzero(dense)
+        indptr, indices, data = compress(cols, rows, dense[rows, cols], 3)
+        self.assertEqual(list(indptr), [0, 2, 4, 5])
+        self.assertEqual(list(indices), [1, 3, 0, 3, 1])
+        self.assertEqual(list(data), [1, 4, 2, 5, 3])
+
+    def test_view(self):
+        system = ConstraintSystem.from_constraints(self.constraints)
+        view = system[-1]
+        self.assertEqual(str(view), "-1.0*x0 + 3.0*x1 = 0.0")
+        indices, data = view.nonzero()
+        data[0] = -2
+        self.assertEqual(system.to_dense()[2, 0], -2)
+
+
 if __name__ == '__main__':
     A = [Constraint([1, 1], 2), Constraint([2, -1], 0), Constraint([-1, 2], 1)]
     for constr in A:
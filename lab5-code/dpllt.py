@@ -0,0 +1,630 @@
+"""DPLL(T) for linear arithmetic
+
+`dpllt()` decides a Z3 formula that mixes Boolean structure with linear
+constraints, lazily: the CDCL solver of lab 3 searches the Boolean
+abstraction of the formula, where each linear atom is a Boolean
+variable, and a theory solver checks the atoms it assigns.
+
+  * Each atom is brought to the form `t >= c` or `t > c`, with the first
+    coefficient of t being 1, so x + y <= 2 is the negation of the atom
+    x + y > 2, and 2x >= 4 is the atom x >= 2. Equalities become two
+    atoms. On integer variables the bounds are rounded, x > 0 is x >= 1
+    and x < 1 is x <= 0, the negation of x > 0.
+  * The theory solves the real relaxation of the Int variables. When a
+    model gives an Int variable x a fractional value v, `dpllt()`
+    branches: it adds the clause x >= ceil(v) or x <= floor(v), with new
+    atoms if need be, and solves again, keeping what the solver learned.
+    When the Boolean structure pins the Int variables to integers, like
+    the 0-1 flags of `check_zero_la()` (la-theory.py) or of the
+    knapsack (knapsack.py), no branch is needed.
+  * `LATheory` asserts the assigned atoms as bounds of the slack
+    variable of their term in an incremental `GeneralSimplex`, and
+    `check()`s it at each fixpoint of the unit propagation. A `push()`
+    per batch of atoms makes backtracking a `pop()`.
+  * A conflict is explained by the atoms of the bounds of the
+    conflicting row: the bound of its basic variable, and those of the
+    non-basic variables that keep it from moving. The solver learns the
+    clause that forbids them together. The explanation is minimal:
+    without any one of these bounds, its variable can move and satisfy
+    the row, and no other bounds constrain the row.
+  * The bounds of a term imply the other atoms on the term: x >= 3
+    implies x >= 2 and the negation of x >= 4 once x <= 3 holds. These
+    atoms are propagated with the single bound as explanation.
+
+Run this file for the tests; `benchmark()` compares it with Z3 on the
+`check_zero_la` and 0-1 knapsack formulas.
+"""
+
+import contextlib
+import io
+import math
+import random
+import sys
+import time
+import unittest
+from fractions import Fraction
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from z3 import *
+from z3.z3util import get_vars
+
+import simpex
+from constraint import Constraint
+from simpex import GeneralSimplex, Status
+
+# the SAT solver of lab 3, after the modules of this lab
+sys.path.append(str(Path(__file__).resolve().parent.parent / "lab3-code"))
+from cdcl import CDCLSolver
+from dpll import cnf, from_z3, ie, nnf, to_clause_db, variables
+
+# prefix of the Boolean variables of the atoms, `Abstraction` rejects
+# user variables starting with it
+ATOM_PREFIX = "_a"
+
+# a linear term: the coefficient of each variable, and the constant
+Linear = Tuple[Dict[int, Fraction], Fraction]
+# an atom `t >= bound`, or `t > bound` if strict, on the term t of this index
+Atom = Tuple[int, Fraction, bool]
+
+
+class Abstraction:
+    """The Boolean abstraction of a formula.
+
+    The arithmetic variables are numbered by `variables`, the distinct
+    terms by `terms` and the atoms by `atoms`: atom k is the Boolean
+    variable `ATOM_PREFIX`k of `formula`, so the Boolean variables of the
+    input must not start with `ATOM_PREFIX`.
+    """
+
+    def __init__(self, formula: BoolRef):
+        self.variables: Dict[str, int] = {}
+        self.ints: List[bool] = []
+        # the coefficients of each term, (variable, coefficient) pairs
+        self.terms: Dict[tuple, int] = {}
+        self.atoms: Dict[Atom, int] = {}
+        self._linear: Dict[int, Linear] = {}
+        self.formula = self._abstract(formula)
+
+    def names(self) -> List[str]:
+        return [f"{ATOM_PREFIX}{k}" for k in range(len(self.atoms))]
+
+    def coefficients(self) -> List[Dict[int, Fraction]]:
+        """The coefficients of each term, by its index."""
+        return [dict(key) for key in self.terms]
+
+    def _abstract(self, formula: BoolRef) -> BoolRef:
+        # the arithmetic atoms under the Boolean connectives
+        atoms, seen = [], set()
+        stack = [formula]
+        while stack:
+            term = stack.pop()
+            if term.get_id() in seen:
+                continue
+            seen.add(term.get_id())
+            if (is_eq(term) or is_distinct(term) or is_le(term) or is_lt(term) or is_ge(term)
+                    or is_gt(term)) and is_arith(term.arg(0)):
+                atoms.append(term)
+            elif is_const(term) and term.decl().kind() == Z3_OP_UNINTERPRETED:
+                if term.decl().name().startswith(ATOM_PREFIX):
+                    raise ValueError(f"variable {term} clashes with the atoms {ATOM_PREFIX}0, ...")
+            else:
+                stack.extend(child for child in reversed(term.children()) if is_bool(child))
+        return substitute(formula, *[(atom, self._atom(atom)) for atom in atoms]) if atoms else formula
+
+    def _atom(self, term: BoolRef) -> BoolRef:
+        args = [self.linear(arg) for arg in term.children()]
+        if is_eq(term) or is_distinct(term):
+            differences = [_difference(a, b) for i, a in enumerate(args) for b in args[i + 1:]]
+            equations = [And(self._compare(d, ">="), self._compare(d, "<=")) for d in differences]
+            return And(equations) if is_eq(term) else And([Not(e) for e in equations])
+        op = "<=" if is_le(term) else "<" if is_lt(term) else ">=" if is_ge(term) else ">"
+        return self._compare(_difference(args[0], args[1]), op)
+
+    def _compare(self, linear: Linear, op: str) -> BoolRef:
+        literal = self.literal(linear, op)
+        if isinstance(literal, bool):
+            return BoolVal(literal)
+        index, positive = literal
+        atom = Bool(f"{ATOM_PREFIX}{index}")
+        return atom if positive else Not(atom)
+
+    def literal(self, linear: Linear, op: str) -> Tuple[int, bool] | bool:
+        """The atom of `t + constant op 0` and whether it holds or its negation.
+
+        A comparison without variables is just True or False.
+        """
+        coefficients, constant = linear
+        if not coefficients:
+            return {">=": 0 >= -constant, ">": 0 > -constant,
+                    "<=": 0 <= -constant, "<": 0 < -constant}[op]
+        bound = -constant
+        if all(self.ints[var] for var in coefficients):
+            # integer coefficients, without common divisor, and integer bounds
+            scale = math.lcm(*(a.denominator for a in coefficients.values()))
+            scale = Fraction(scale, math.gcd(*(int(a * scale) for a in coefficients.values())))
+            coefficients = {var: a * scale for var, a in coefficients.items()}
+            bound *= scale
+            # the tightest non-strict bounds: the real relaxation keeps them
+            bound = {">=": math.ceil(bound), ">": math.floor(bound) + 1,
+                     "<=": math.floor(bound), "<": math.ceil(bound) - 1}[op]
+            op = ">=" if op in (">=", ">") else "<="
+        # t >= c is the atom, t <= c the negation of t > c, t < c of t >= c
+        positive = op in (">=", ">")
+        strict = op in (">", "<=")
+        first = coefficients[min(coefficients)]
+        if first < 0:
+            # -t' >= c is the negation of t' > -c, -t' > c of t' >= -c
+            positive, strict = not positive, not strict
+        key = tuple((var, a / first) for var, a in sorted(coefficients.items()))
+        term = self.terms.setdefault(key, len(self.terms))
+        atom = (term, Fraction(bound) / first, strict)
+        return self.atoms.setdefault(atom, len(self.atoms)), positive
+
+    def add_int_terms(self):
+        """Add the term x of each Int variable x, the atoms of the branches are on it."""
+        for var, is_int_var in enumerate(self.ints):
+            if is_int_var:
+                self.terms.setdefault(((var, Fraction(1)),), len(self.terms))
+
+    def linear(self, expr: ArithRef) -> Linear:
+        """The coefficients and the constant of the linear term `expr`."""
+        memo = self._linear
+        stack = [expr]
+        while stack:
+            term = stack[-1]
+            if term.get_id() in memo:
+                stack.pop()
+                continue
+            missing = [child for child in term.children() if child.get_id() not in memo]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            args = [memo[child.get_id()] for child in term.children()]
+            if is_int_value(term) or is_rational_value(term):
+                linear = {}, Fraction(term.as_string())
+            elif is_const(term) and term.decl().kind() == Z3_OP_UNINTERPRETED:
+                var = self.variables.setdefault(term.decl().name(), len(self.variables))
+                if var == len(self.ints):
+                    self.ints.append(is_int(term))
+                linear = {var: Fraction(1)}, Fraction(0)
+            elif is_add(term):
+                linear = {}, Fraction(0)
+                for arg in args:
+                    linear = _difference(linear, _scaled(arg, -1))
+            elif is_sub(term):
+                linear = args[0]
+                for arg in args[1:]:
+                    linear = _difference(linear, arg)
+            elif is_app_of(term, Z3_OP_UMINUS):
+                linear = _scaled(args[0], -1)
+            elif is_to_real(term):
+                linear = args[0]
+            elif is_mul(term) and sum(1 for coefficients, _ in args if coefficients) <= 1:
+                factor = math.prod(constant for coefficients, constant in args if not coefficients)
+                linear = next((arg for arg in args if arg[0]), ({}, Fraction(1)))
+                linear = _scaled(linear, factor)
+            elif is_div(term) and not args[1][0] and args[1][1]:
+                linear = _scaled(args[0], 1 / args[1][1])
+            else:
+                raise Exception(f"{term} is not a linear term")
+            memo[term.get_id()] = linear
+        return memo[expr.get_id()]
+
+
+def _scaled(linear: Linear, factor: Fraction) -> Linear:
+    coefficients, constant = linear
+    return {var: a * factor for var, a in coefficients.items() if a * factor}, constant * factor
+
+
+def _difference(left: Linear, right: Linear) -> Linear:
+    coefficients = dict(left[0])
+    for var, a in right[0].items():
+        coefficients[var] = coefficients.get(var, 0) - a
+    return {var: a for var, a in coefficients.items() if a}, left[1] - right[1]
+
+
+class LATheory:
+    """The linear arithmetic theory of the atoms of a `CDCLSolver`.
+
+    `atoms` maps the solver variables of the atoms to the atoms on the
+    `terms`, the coefficients of the variables x0..x{n_vars - 1}. The
+    terms are the slack variables of a `GeneralSimplex`, with the
+    bounds of the assigned atoms; the reason of a bound is the literal
+    `lit` of the atom, encoded as 2 * var + (lit < 0).
+    """
+
+    def __init__(self, n_vars: int, terms: List[Dict[int, Fraction]], atoms: Dict[int, Atom],
+                 exact: bool = False):
+        self.number = number = Fraction if exact else float
+        self.n_vars = n_vars
+        self.terms = terms
+        self.exact = exact
+        rows = [Constraint([number(term.get(var, 0)) for var in range(n_vars)], 0) for term in terms]
+        self.simplex = GeneralSimplex(rows, exact)
+        self.atoms = {}
+        # the atoms on each term
+        self.on_term: List[List[int]] = [[] for _ in terms]
+        for var, atom in atoms.items():
+            self.add_atom(var, atom)
+        # the trail sizes at the push()es of the simplex
+        self.checkpoints = []
+        self.stats = {"checks": 0, "conflicts": 0, "implied": 0}
+
+    def add_atom(self, var: int, atom: Atom):
+        """Make the solver variable `var` the atom `atom` on one of the terms."""
+        term, bound, strict = atom
+        self.atoms[var] = (term, self.number(bound), int(strict))
+        self.on_term[term].append(var)
+
+    @staticmethod
+    def _literal(reason: int) -> int:
+        return -(reason >> 1) if reason & 1 else reason >> 1
+
+    def propagate(self, trail: List[int], start: int, vals: list) -> List[List[int]]:
+        """Assert the atoms of trail[start:], return a conflict clause or the implied atoms."""
+        lits = [lit for lit in trail[start:] if abs(lit) in self.atoms]
+        if not lits:
+            return []
+        simplex = self.simplex
+        simplex.push()
+        self.checkpoints.append(start)
+        changed = {}
+        for lit in lits:
+            term, bound, strict = self.atoms[abs(lit)]
+            slack = self.n_vars + term
+            reason = 2 * abs(lit) + (lit < 0)
+            # the negation of t >= c is t < c, of t > c it is t <= c
+            if lit > 0:
+                ok = simplex.assert_lower(slack, bound, strict, reason)
+            else:
+                ok = simplex.assert_upper(slack, bound, strict - 1, reason)
+            if not ok:
+                return [self._explain(simplex.conflict)]
+            changed[term] = True
+        self.stats["checks"] += 1
+        if simplex.check() == Status.UNSAT:
+            return [self._explain(simplex.conflict)]
+        clauses = []
+        for term in changed:
+            clauses += self._implied(term, vals)
+        self.stats["implied"] += len(clauses)
+        return clauses
+
+    def backtrack(self, size: int):
+        """Take back the atoms of trail[size:]."""
+        while self.checkpoints and self.checkpoints[-1] >= size:
+            self.checkpoints.pop()
+            self.simplex.pop()
+
+    def _implied(self, term: int, vals: list) -> List[List[int]]:
+        # the unassigned atoms on the term implied by its bounds
+        simplex = self.simplex
+        slack = self.n_vars + term
+        lower, lower_delta, lower_reason = simplex.lower[slack], simplex.lower_delta[slack], simplex.lower_reason[slack]
+        upper, upper_delta, upper_reason = simplex.upper[slack], simplex.upper_delta[slack], simplex.upper_reason[slack]
+        clauses = []
+        for var in self.on_term[term]:
+            if vals[var] != 0:
+                continue
+            _, bound, strict = self.atoms[var]
+            if lower_reason >= 0 and not simplex._less(lower, lower_delta, bound, strict):
+                clauses.append([var, -self._literal(int(lower_reason))])
+            elif upper_reason >= 0 and simplex._less(upper, upper_delta, bound, strict):
+                clauses.append([-var, -self._literal(int(upper_reason))])
+        return clauses
+
+    def _explain(self, conflict: set) -> List[int]:
+        # the clause that forbids the conflicting atoms together
+        self.stats["conflicts"] += 1
+        return [-self._literal(reason) for reason in sorted(conflict) if reason >= 0]
+
+    def model(self) -> dict:
+        return self.simplex.model()
+
+
+def dpllt(formula: BoolRef, exact: bool = False, stats: dict | None = None,
+          max_branches: int = 1000) -> dict | str:
+    """Decide a formula over Booleans and linear arithmetic with DPLL(T).
+
+    With `exact` the simplex computes with `Fraction`s. A `stats` dict is
+    filled with the counters of the SAT solver and of the theory, and
+    the number of `branches` on Int variables.
+
+    Returns a model like {"x": 1.0, "n": 2, "p": True, ...} of the
+    arithmetic and Boolean variables of `formula`, or "unsat", or
+    "unknown" when the Int variables still take fractional values after
+    `max_branches` branches, as they may forever on unbounded ones.
+    """
+    abstraction = Abstraction(formula)
+    prop = from_z3(abstraction.formula)
+    atom_names = abstraction.names()
+    names = [name for name in variables(prop) if not name.startswith(ATOM_PREFIX)]
+    db = to_clause_db(cnf(nnf(ie(prop)), "tseitin"), atom_names + names)
+    solver = CDCLSolver(clauses=db)
+    # the solver variable of each atom
+    atom_vars = {index: db.index[atom_names[index]] for index in abstraction.atoms.values()}
+    if abstraction.atoms:
+        abstraction.add_int_terms()
+        atoms = {atom_vars[index]: atom for atom, index in abstraction.atoms.items()}
+        solver.theory = LATheory(len(abstraction.variables), abstraction.coefficients(), atoms, exact)
+    ints = [(name, var) for name, var in abstraction.variables.items() if abstraction.ints[var]]
+
+    def branch_literal(var: int, bound: int, op: str) -> int:
+        # the solver literal of `x op bound`, a new atom gets a new variable
+        index, positive = abstraction.literal(({var: Fraction(1)}, Fraction(-bound)), op)
+        if index not in atom_vars:
+            atom_vars[index] = solver.new_vars(1)
+            atom = next(atom for atom, i in abstraction.atoms.items() if i == index)
+            solver.theory.add_atom(atom_vars[index], atom)
+        return atom_vars[index] if positive else -atom_vars[index]
+
+    branches = 0
+    while True:
+        result = solver.solve()
+        if not result or solver.theory is None:
+            break
+        values = solver.theory.model()
+        fractional = next(((var, values[f"x{var}"]) for _, var in ints
+                           if abs(values[f"x{var}"] - round(values[f"x{var}"])) > 1e-9), None)
+        if fractional is None:
+            break
+        if branches == max_branches:
+            result = None
+            break
+        branches += 1
+        var, value = fractional
+        solver.add_clause([branch_literal(var, math.ceil(value), ">="), branch_literal(var, math.floor(value), "<=")])
+    if stats is not None:
+        stats.update(solver.stats())
+        if solver.theory is not None:
+            stats.update(solver.theory.stats)
+        stats["branches"] = branches
+    if result is None:
+        return "unknown"
+    if not result:
+        return "unsat"
+    # the variables of atoms that fold to constants are free, 0 will do
+    model = {name: 0 if abstraction.ints[var] else 0.0 for name, var in abstraction.variables.items()}
+    if solver.theory is not None:
+        model.update({name: values[f"x{var}"] for name, var in abstraction.variables.items()})
+        model.update({name: round(values[f"x{var}"]) for name, var in ints})
+    model.update({name: solver.model[db.index[name]] for name in names})
+    return model
+
+
+def zero_la_formula(l: List[int]) -> BoolRef:
+    """The constraints of `check_zero_la(l)` in la-theory.py: is there a 0 in l?"""
+    xs = [Int(f"x_{i}") for i in range(len(l))]
+    return And([Or(x == 0, x == 1) for x in xs] + [sum(xs) == 1] + [x * e == 0 for x, e in zip(xs, l)])
+
+
+def knapsack_formula(weights: List[int], values: List[int], cap: int, target: int) -> BoolRef:
+    """The 0-1 knapsack of knapsack.py as a decision: can the items worth `target` fit in `cap`?"""
+    flags = [Int(f"x_{i}") for i in range(len(weights))]
+    return And([Or(flag == 0, flag == 1) for flag in flags]
+               + [Sum([w * flag for w, flag in zip(weights, flags)]) <= cap,
+                  Sum([v * flag for v, flag in zip(values, flags)]) >= target])
+
+
+def _z3_check(formula: BoolRef) -> bool:
+    solver = Solver()
+    solver.add(formula)
+    return solver.check() == sat
+
+
+def _holds(formula: BoolRef, model: dict) -> bool:
+    # evaluate the formula on the model, integers rounded, and the
+    # reals to the nearest fractions of small denominators
+    pairs = []
+    for var in get_vars(formula):
+        value = model[var.decl().name()]
+        if is_bool(var):
+            pairs.append((var, BoolVal(value)))
+        elif is_int(var):
+            pairs.append((var, IntVal(round(value))))
+        else:
+            pairs.append((var, RealVal(Fraction(value).limit_denominator(10 ** 6))))
+    return is_true(simplify(substitute(formula, *pairs)))
+
+
+def benchmark(zero_sizes=(10, 20, 40, 80), knapsack_sizes=(6, 9, 12, 15), seed: int = 0):
+    """Time `dpllt()` and Z3 on `check_zero_la` and knapsack formulas.
+
+    The lists of `check_zero_la` have one zero or none; the knapsack
+    asks for the best value (sat) or one more (unsat).
+    """
+    from knapsack import zero_one_knapsack_dp
+    rng = random.Random(seed)
+    instances = []
+    for n in zero_sizes:
+        for zero in (True, False):
+            l = [rng.randint(1, 9) for _ in range(n)]
+            if zero:
+                l[rng.randrange(n)] = 0
+            instances.append((f"zero_la_{n}_{'zero' if zero else 'none'}", zero_la_formula(l)))
+    for n in knapsack_sizes:
+        weights = [rng.randint(10, 40) for _ in range(n)]
+        values = [rng.randint(100, 600) for _ in range(n)]
+        cap = sum(weights) // 2
+        with contextlib.redirect_stdout(io.StringIO()):
+            best = zero_one_knapsack_dp(weights, values, cap)
+        instances.append((f"knapsack_{n}_best", knapsack_formula(weights, values, cap, best)))
+        instances.append((f"knapsack_{n}_best+1", knapsack_formula(weights, values, cap, best + 1)))
+
+    verbose, simpex.VERBOSE = simpex.VERBOSE, False
+    print(f"{'instance':<22}{'result':>8}{'dpllt':>12}{'z3':>12}{'conflicts':>11}{'theory':>8}{'implied':>9}")
+    try:
+        for name, formula in instances:
+            stats = {}
+            start = time.time()
+            result = dpllt(formula, stats=stats)
+            seconds = time.time() - start
+            start = time.time()
+            expected = _z3_check(formula)
+            z3_seconds = time.time() - start
+            status = result if isinstance(result, str) else "sat"
+            mark = "" if status == "unknown" or (status == "sat") == expected else "!"
+            print(f"{name:<22}{mark + status:>8}{seconds:>11.4f}s"
+                  f"{z3_seconds:>11.4f}s{stats['conflicts']:>11}{stats['checks']:>8}{stats['implied']:>9}")
+    finally:
+        simpex.VERBOSE = verbose
+
+
+class TestDpllT(unittest.TestCase):
+
+    def setUp(self):
+        self.verbose, simpex.VERBOSE = simpex.VERBOSE, False
+
+    def tearDown(self):
+        simpex.VERBOSE = self.verbose
+
+    def check(self, formula: BoolRef, **options):
+        result = dpllt(formula, **options)
+        self.assertEqual(result != "unsat", _z3_check(formula), formula)
+        if result != "unsat":
+            self.assertTrue(_holds(formula, result), (formula, result))
+
+    def test_abstraction(self):
+        x, y = Reals("x y")
+        a, b = Ints("a b")
+        abstraction = Abstraction(And(x + y <= 2, 2 * x + 2 * y > 4, Or(a > 0, 2 * a + 4 * b < 3)))
+        # x + y <= 2 and 2x + 2y > 4 are the same atom, a > 0 is a >= 1,
+        # and 2a + 4b < 3 is a + 2b <= 1
+        self.assertEqual(abstraction.atoms, {(0, 2, True): 0, (1, 1, False): 1, (2, 1, True): 2})
+        self.assertEqual(abstraction.coefficients(), [{0: 1, 1: 1}, {2: 1}, {2: 1, 3: 2}])
+        self.assertEqual(str(abstraction.formula), "And(Not(_a0), _a0, Or(_a1, Not(_a2)))")
+
+    def test_prefix(self):
+        x = Real("x")
+        with self.assertRaises(ValueError):
+            dpllt(And(x > 0, Bool(f"{ATOM_PREFIX}0")))
+        with self.assertRaises(ValueError):
+            dpllt(Or(x > 0, Bool("_t0")))
+
+    def test_sat_unsat(self):
+        x, y, z = Reals("x y z")
+        p = Bool("p")
+        self.check(And(x + y >= 2, x - y > 0, Or(x <= 1, p), Implies(p, z == x + 3)))
+        self.check(And(x + y >= 2, x - y > 0, Or(x < 1, y > x), y <= 10))
+        self.check(And(Or(x >= 3, y >= 3), x + y < 3, x >= 0, y >= 0))
+        self.check(And(Or(x >= 3, y >= 3), x + y < 6, x >= 0, y >= 0, Distinct(x, y)))
+        self.check(And(x == y, x != y))
+
+    def test_integers(self):
+        a, b, c = Ints("a b c")
+        x = Real("x")
+        # the real relaxation has a = b = 1/2
+        stats = {}
+        self.assertEqual(dpllt(And(a + b == 1, a - b == 0), stats=stats), "unsat")
+        self.assertGreater(stats["branches"], 0)
+        self.check(And(a + b == 1, a - b == 0))
+        self.check(And(3 * a + 2 * b == 7, a >= 0, b >= 0, 2 * a + b < 5))
+        self.check(And(2 * a - 2 * b == 1))
+        self.check(And(x == a + b, 2 * x == 5, Or(a > b, c == 3), a >= 0, b >= 0))
+        model = dpllt(And(3 * a - 2 * c == 1, a > 0, c > a))
+        self.assertEqual((model["a"], model["c"]), (3, 4))
+        # the rounded bounds decide 1 <= 3(a - b) <= 2 without branching
+        self.assertEqual(dpllt(And(3 * a - 3 * b >= 1, 3 * a - 3 * b <= 2)), "unsat")
+        # on unbounded variables the branches may go on forever
+        self.assertEqual(dpllt(And(x == a + b, 2 * x == 5), max_branches=10), "unknown")
+
+    def test_constant_atoms(self):
+        y, n = Real("y"), Int("n")
+        p = Bool("p")
+        self.assertEqual(dpllt(0 * y < 1), {"y": 0.0})
+        self.assertEqual(dpllt(And(0 * y + 0 * n < 1, Or(p, 0 * n > 1))), {"y": 0.0, "n": 0, "p": True})
+        self.assertEqual(dpllt(0 * n > 1), "unsat")
+
+    def test_explanation(self):
+        # x >= 1, y >= 1 and x + y <= 1 conflict, z >= 0 and x + y + z <= 10 do not matter
+        theory = LATheory(3, [{0: 1}, {1: 1}, {2: 1}, {0: 1, 1: 1, 2: 1}, {0: 1, 1: 1}],
+                          {1: (0, 1, False), 2: (1, 1, False), 3: (2, 0, False), 4: (3, 10, True), 5: (4, 1, True)})
+        clauses = theory.propagate([1, 3, -4, 2, -5], 0, [0] * 12)
+        self.assertEqual(len(clauses), 1)
+        self.assertEqual(sorted(clauses[0]), [-2, -1, 5])
+
+        # the atoms of random conflicts hold together without any one of them
+        rng = random.Random(1)
+        xs = Reals("x0 x1 x2 x3")
+        conflicts = 0
+        while conflicts < 20:
+            terms = [{var: Fraction(rng.choice([-3, -2, -1, 1, 2, 3])) for var in rng.sample(range(4), rng.randint(1, 3))}
+                     for _ in range(6)]
+            atoms = {var: (rng.randrange(6), Fraction(rng.randint(-5, 5)), rng.random() < 0.5) for var in range(1, 9)}
+            trail = [rng.choice([var, -var]) for var in atoms]
+            clauses = LATheory(4, terms, atoms, exact=True).propagate(trail, 0, [0] * 20)
+            if len(clauses) != 1 or any(-lit not in trail for lit in clauses[0]):
+                continue
+            conflicts += 1
+
+            def holds(lits):
+                solver = Solver()
+                for lit in lits:
+                    term, bound, strict = atoms[abs(lit)]
+                    t = Sum([a * xs[var] for var, a in terms[term].items()])
+                    solver.add((t > bound if strict else t >= bound) if lit > 0 else (t <= bound if strict else t < bound))
+                return solver.check() == sat
+
+            lits = [-lit for lit in clauses[0]]
+            self.assertFalse(holds(lits))
+            for lit in lits:
+                self.assertTrue(holds([q for q in lits if q != lit]))
+
+    def test_bound_propagation(self):
+        theory = LATheory(1, [{0: 1}], {1: (0, 1, False), 2: (0, 2, False), 3: (0, 3, True), 4: (0, 0, True),
+                                         5: (0, 4, False)})
+        vals = [0] * 12
+        vals[2] = 1
+        # x >= 2 implies x >= 1 and x > 0
+        self.assertEqual(theory.propagate([2], 0, vals), [[1, -2], [4, -2]])
+        vals[1] = vals[4] = 1
+        vals[3] = -1
+        # then x <= 3 implies not x >= 4
+        self.assertEqual(theory.propagate([2, 1, 4, -3], 1, vals), [[-5, 3]])
+        theory.backtrack(1)
+        self.assertEqual(theory.checkpoints, [0])
+        self.assertEqual(theory.simplex.upper_reason[1], -1)
+
+    def test_check_zero_la(self):
+        for l, zero in (([1, 2, 4, 5], False), ([3, 0, 8, 2], True), ([4, 0, 3, 0], True)):
+            for exact in (False, True):
+                result = dpllt(zero_la_formula(l), exact=exact)
+                self.assertEqual(result != "unsat", zero)
+                if zero:
+                    self.assertEqual([e for i, e in enumerate(l) if round(result[f"x_{i}"]) == 1], [0])
+
+    def test_knapsack(self):
+        cases = (([4, 6, 2, 2, 5, 1], [8, 10, 6, 3, 7, 2], 12, 24),
+                 ([23, 26, 20, 18, 32, 27, 29, 26, 30, 27], [505, 352, 458, 220, 354, 414, 498, 545, 473, 543],
+                  67, 1270))
+        for weights, values, cap, best in cases:
+            model = dpllt(knapsack_formula(weights, values, cap, best))
+            flags = [round(model[f"x_{i}"]) for i in range(len(weights))]
+            self.assertLessEqual(sum(w * f for w, f in zip(weights, flags)), cap)
+            self.assertGreaterEqual(sum(v * f for v, f in zip(values, flags)), best)
+            self.assertEqual(dpllt(knapsack_formula(weights, values, cap, best + 1)), "unsat")
+
+    def test_random(self):
+        rng = random.Random(0)
+        xs = Reals("x0 x1 x2")
+        ns = Ints("n0 n1")
+        ps = Bools("p0 p1")
+
+        def atom():
+            term = Sum([rng.randint(-3, 3) * v for v in rng.sample(xs + ns, rng.randint(1, 3))])
+            c = rng.randint(-4, 4)
+            return rng.choice([term <= c, term < c, term >= c, term > c, term == c])
+
+        for _ in range(100):
+            clauses = [Or([rng.choice([atom(), rng.choice(ps)]) for _ in range(rng.randint(1, 3))])
+                       for _ in range(rng.randint(2, 7))]
+            # bounded integers, so that the branches end
+            formula = And(clauses + [And(-5 <= n, n <= 5) for n in ns])
+            self.check(formula, exact=rng.random() < 0.5)
+
+
+if __name__ == '__main__':
+    simpex.VERBOSE = False
+    benchmark()
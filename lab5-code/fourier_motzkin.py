@@ -1,51 +1,350 @@
+"""Fourier-Motzkin variable elimination
+
+The constraints are read like in `simplex()`: constraint i is
+`value <= coefficients . x`, strict for Rel.LT, and an equation for
+Rel.EQ. The variables are eliminated one after the other:
+
+  * an equation is solved for one of its variables, which is then
+    substituted in the other constraints;
+  * a variable x with lower bounds l_p <= x and upper bounds x <= u_n
+    is replaced by all the constraints l_p <= u_n;
+  * a variable with bounds on one side only, or none, always has a
+    value satisfying its constraints, which are just dropped.
+
+The constraints are unsatisfiable iff a constraint without any variable
+left is false. Otherwise the eliminated variables get their values in
+the reverse order, from the constraints they were eliminated with.
+
+The number of constraints can square with each elimination, and so can
+the size of their coefficients, so by default the elimination is exact,
+on `Fraction`s; `exact=False` uses floats. Most of the combined
+constraints are redundant, so each elimination:
+
+  * eliminates the variable adding the fewest constraints first (min-fill);
+  * drops the combinations of too many constraints (Chernikov and Imbert);
+  * keeps one constraint of those equal up to a positive factor, the
+    tightest, found by hashing the normalized constraints.
+
+With VERBOSE, the number of constraints before and after each
+elimination is printed.
+"""
+
 import unittest
-from typing import List
+from fractions import Fraction
+from itertools import product
+from typing import List, Tuple
 
+import numpy as np
 import pandas as pd
 
 from tableau import Tableau
-from constraint import Rel, Constraint, IllegalConstraintError
-
-
-def eli_equations(table: Tableau) -> Tableau:
-    # Challenge : finish the equation elimination step for the
-    # fourier_motzkin  algorithm
-    #
-    # Your src here
-    raise NotImplementedError('TODO: Your code here!') 
-
-
-def eli_unbounded_vars(table: Tableau) -> Tableau:
-    # Challenge : finish the unbounded variable elimination step for the
-    # fourier_motzkin  algorithm
-    #
-    # Your src here
-    raise NotImplementedError('TODO: Your code here!') 
-
-def eli_vars(table: Tableau) -> Tableau:
-    # Challenge : finish the bounded variable elimination step for the
-    # fourier_motzkin  algorithm
-    #
-    # Your src here
-    raise NotImplementedError('TODO: Your code here!') 
-
-def solve_one_var(table: Tableau) -> float:
-    # Challenge : finish the solve the last variable step for the
-    # fourier_motzkin  algorithm
-    #
-    # Your src here
-    raise NotImplementedError('TODO: Your code here!') 
-
-
-def fourier_motzkin(la_prop: List[Constraint]) -> dict | str:
-    # Challenge : finish the fourier_motzkin  algorithm by assembling the
-    # four steps above
-    #
-    # Your src here
+from constraint import Rel, Constraint, ConstraintSystem, IllegalConstraintError
+
+VERBOSE = True
+
+# float comparisons tolerate this error
+EPS = 1e-9
+# normalized float coefficients are hashed rounded to these decimals
+DECIMALS = 9
+
+# an eliminated variable, and the constraints it was eliminated with:
+# their coefficients by variable name, values and relations
+Step = Tuple[str, List[Tuple[dict, object, Rel]]]
+# an eliminated variable, and the numbers of constraints before and after
+Count = Tuple[str, int, int]
+
+
+def _names(table: Tableau) -> List[str]:
+    return [table.names[var] for var in table.nonbasic]
+
+
+def _zeros(table: Tableau) -> np.ndarray:
+    if table.exact:
+        return table.matrix == 0
+    return np.abs(table.matrix) <= EPS
+
+
+def _select(table: Tableau, rows, cols, matrix=None, values=None, relations=None) -> Tableau:
+    # a table on some rows and columns, or on new ones
+    names = _names(table)
+    if matrix is None:
+        matrix = table.matrix[np.ix_(rows, cols)]
+        values = table.values[rows]
+        relations = [table.relations[i] for i in rows]
+    return Tableau.from_matrix(matrix, [names[j] for j in cols], values=values, relations=relations)
+
+
+def _record(table: Tableau, rows, col: int, steps: List[Step] | None):
+    if steps is None:
+        return
+    names = _names(table)
+    zeros = _zeros(table)
+    steps.append((names[col], [({names[j]: table.matrix[i, j] for j in range(len(names)) if not zeros[i, j]},
+                                table.values[i], table.relations[i]) for i in rows]))
+
+
+def _holds(value, relation: Rel, exact: bool) -> bool:
+    # whether a constraint without variables holds: value <= 0, value < 0
+    # or value == 0
+    eps = 0 if exact else EPS
+    if relation == Rel.EQ:
+        return abs(value) <= eps
+    if relation == Rel.LT:
+        return value < -eps
+    return value <= eps
+
+
+def _unique(table: Tableau, rows: np.ndarray, sizes: np.ndarray | None = None) -> np.ndarray:
+    # the tightest of the inequalities `rows` equal up to a positive factor:
+    # a_i x >= v_i is a x >= v_i / s_i with a = a_i / s_i for s_i = max |a_i|.
+    # With the `sizes` of their histories, only the same inequalities are
+    # merged, into the one of the smallest history: a tighter one can have
+    # a larger history, and the redundancy of its combinations rely on the
+    # looser one
+    matrix = table.matrix[rows]
+    scale = np.abs(matrix).max(axis=1)
+    values = table.values[rows] / scale
+    strict = np.array([table.relations[i] == Rel.LT for i in rows])
+    if table.exact:
+        best = {}
+        for k, row in enumerate(matrix / scale[:, None]):
+            key = tuple(row) if sizes is None else (tuple(row), values[k], strict[k])
+            if key not in best:
+                best[key] = k
+            elif sizes is None and (values[k], strict[k]) > (values[best[key]], strict[best[key]]):
+                best[key] = k
+            elif sizes is not None and sizes[k] < sizes[best[key]]:
+                best[key] = k
+        return rows[sorted(best.values())]
+    keys = np.round(matrix / scale[:, None], DECIMALS) + 0.0
+    if sizes is not None:
+        keys = np.column_stack([keys, np.round(values, DECIMALS) + 0.0, strict])
+    _, group = np.unique(keys, axis=0, return_inverse=True)
+    group = group.ravel()
+    # the last row of each group, sorted by value and strictness, or by size
+    order = np.lexsort((strict, values, group) if sizes is None else (-sizes, group))
+    last = np.append(group[order][1:] != group[order][:-1], True)
+    return rows[np.sort(order[last])]
+
+
+def _kept(table: Tableau, sizes: np.ndarray | None = None) -> np.ndarray:
+    # the rows that _prune keeps
+    empty = _zeros(table).all(axis=1)
+    false = [i for i in np.flatnonzero(empty) if not _holds(table.values[i], table.relations[i], table.exact)]
+    equations = [i for i in np.flatnonzero(~empty) if table.relations[i] == Rel.EQ]
+    inequalities = np.array([i for i in np.flatnonzero(~empty) if table.relations[i] != Rel.EQ], dtype=np.int64)
+    if len(inequalities):
+        inequalities = _unique(table, inequalities, None if sizes is None else sizes[inequalities])
+    return np.sort(np.concatenate([np.array(false + equations, dtype=np.int64), inequalities]))
+
+
+def _prune(table: Tableau) -> Tableau:
+    """Drop the true constraints without variables, keep the false ones, and keep the
+    tightest of the inequalities equal up to a positive factor."""
+    keep = _kept(table)
+    if len(keep) == len(table.values):
+        return table
+    return _select(table, keep, range(len(table.nonbasic)))
+
+
+def contradiction(table: Tableau) -> bool:
+    """Whether a constraint without variables is false."""
+    empty = _zeros(table).all(axis=1)
+    return any(not _holds(table.values[i], table.relations[i], table.exact) for i in np.flatnonzero(empty))
+
+
+def _count(counts: List[Count] | None, name: str, before: int, after: int):
+    if counts is not None:
+        counts.append((name, before, after))
+
+
+def eli_equations(table: Tableau, steps: List[Step] | None = None, counts: List[Count] | None = None) -> Tableau:
+    """Eliminate a variable with each equation, by substitution."""
+    table = _prune(table)
+    while True:
+        zeros = _zeros(table)
+        equations = [i for i, relation in enumerate(table.relations)
+                     if relation == Rel.EQ and not zeros[i].all()]
+        if not equations:
+            return table
+        row = equations[0]
+        # the largest pivot for floats, any for fractions
+        if table.exact:
+            col = int(np.flatnonzero(~zeros[row])[0])
+        else:
+            col = int(np.argmax(np.abs(table.matrix[row])))
+        _record(table, [row], col, steps)
+
+        # x_col = (value - sum_{j != col} a_j x_j) / a_col in every other row
+        factors = table.matrix[:, col] / table.matrix[row, col]
+        matrix = table.matrix - np.outer(factors, table.matrix[row])
+        values = table.values - factors * table.values[row]
+        rows = [i for i in range(len(values)) if i != row]
+        cols = [j for j in range(len(table.nonbasic)) if j != col]
+        name, before = _names(table)[col], len(values)
+        table = _prune(_select(table, rows, cols, matrix[np.ix_(rows, cols)], values[rows],
+                               [table.relations[i] for i in rows]))
+        _count(counts, name, before, len(table.values))
+
+
+def eli_unbounded_vars(table: Tableau, steps: List[Step] | None = None,
+                       counts: List[Count] | None = None) -> Tableau:
+    """Drop the variables bounded on one side only, or not at all, with their constraints."""
+    while len(table.nonbasic):
+        zeros = _zeros(table)
+        positive = ((table.matrix > 0) & ~zeros).any(axis=0)
+        negative = ((table.matrix < 0) & ~zeros).any(axis=0)
+        unbounded = np.flatnonzero(~(positive & negative))
+        if not len(unbounded):
+            return table
+        col = int(unbounded[0])
+        rows = np.flatnonzero(~zeros[:, col])
+        _record(table, rows, col, steps)
+        name, before = _names(table)[col], len(table.values)
+        table = _select(table, np.flatnonzero(zeros[:, col]),
+                        [j for j in range(len(table.nonbasic)) if j != col])
+        _count(counts, name, before, len(table.values))
+    return table
+
+
+def eli_vars(table: Tableau, steps: List[Step] | None = None, counts: List[Count] | None = None,
+             prune: bool = True) -> Tableau:
+    """Eliminate the variables bounded on both sides, by combining their bounds.
+
+    Each constraint remembers its history, the constraints of `table` it
+    combines. A combination of more constraints than one plus the number
+    of eliminated variables occurring in them is the sum of combinations
+    of fewer of them, and is redundant (Chernikov, with the refinement of
+    Imbert to the variables eliminated effectively or implicitly); with
+    `prune`, it is dropped.
+    """
+    history = np.eye(len(table.values), dtype=bool)
+    # the variables occurring in the constraints of table
+    names = _names(table)
+    occurs = ~_zeros(table)
+    eliminated = np.zeros(len(names), dtype=bool)
+    while len(table.nonbasic) and not contradiction(table):
+        zeros = _zeros(table)
+        positive = (table.matrix > 0) & ~zeros
+        negative = (table.matrix < 0) & ~zeros
+        n_positive, n_negative = positive.sum(axis=0), negative.sum(axis=0)
+        bounded = np.flatnonzero((n_positive > 0) & (n_negative > 0))
+        if not len(bounded):
+            return table
+        # the variable adding the fewest constraints
+        fill = n_positive[bounded] * n_negative[bounded] - n_positive[bounded] - n_negative[bounded]
+        col = int(bounded[np.argmin(fill)])
+        lower, upper = np.flatnonzero(positive[:, col]), np.flatnonzero(negative[:, col])
+        others = np.flatnonzero(zeros[:, col])
+        _record(table, np.concatenate([lower, upper]), col, steps)
+        name, before = _names(table)[col], len(table.values)
+        eliminated[names.index(name)] = True
+
+        # a_p x + ... >= v_p with a_p > 0, and a_n x + ... >= v_n with
+        # a_n < 0, give -a_n (a_p x + ...) + a_p (a_n x + ...) >= -a_n v_p + a_p v_n
+        combined_history = (history[lower][:, None, :] | history[upper][None, :, :]).reshape(-1, history.shape[1])
+        pairs = np.ones(len(combined_history), dtype=bool)
+        if prune:
+            n_eliminated = ((combined_history.astype(np.int64) @ occurs[:, eliminated].astype(np.int64)) > 0).sum(axis=1)
+            pairs = combined_history.sum(axis=1) <= 1 + n_eliminated
+        p, n = (index.ravel()[pairs] for index in np.meshgrid(lower, upper, indexing="ij"))
+        matrix, values = table.matrix, table.values
+        a_p, a_n = matrix[p, col], matrix[n, col]
+        combined = -a_n[:, None] * matrix[p] + a_p[:, None] * matrix[n]
+        combined_values = -a_n * values[p] + a_p * values[n]
+        combined_relations = [Rel.LT if Rel.LT in (table.relations[i], table.relations[j]) else Rel.LE
+                              for i, j in zip(p, n)]
+
+        cols = [j for j in range(matrix.shape[1]) if j != col]
+        table = _select(table, None, cols, np.concatenate([matrix[others], combined])[:, cols],
+                        np.concatenate([values[others], combined_values]),
+                        [table.relations[i] for i in others] + combined_relations)
+        history = np.concatenate([history[others], combined_history[pairs]])
+        keep = _kept(table, history.sum(axis=1) if prune else None)
+        if len(keep) < len(table.values):
+            table = _select(table, keep, range(len(cols)))
+            history = history[keep]
+        _count(counts, name, before, len(table.values))
+    return table
+
+
+def solve_one_var(table: Tableau) -> object | None:
+    """A value of the only variable of `table` satisfying its constraints, None if there is none.
+
+    It is the largest lower bound, or else the smallest upper bound, or
+    0 without bounds; strict bounds move it inside.
+    """
+    lower = upper = None
+    lower_strict = upper_strict = False
+    zeros = _zeros(table)
+    for i, (value, relation) in enumerate(zip(table.values, table.relations)):
+        if zeros[i, 0]:
+            continue
+        a = table.matrix[i, 0]
+        bound = value / a
+        if relation == Rel.EQ:
+            return bound
+        strict = relation == Rel.LT
+        if a > 0:
+            if lower is None or bound > lower or bound == lower and strict:
+                lower, lower_strict = bound, strict
+        elif upper is None or bound < upper or bound == upper and strict:
+            upper, upper_strict = bound, strict
+
+    if lower is not None and upper is not None:
+        if table.exact:
+            if lower > upper or lower == upper and (lower_strict or upper_strict):
+                return None
+        elif lower > upper + EPS:
+            return None
+        elif lower >= upper:
+            # equal up to the rounding errors
+            return (lower + upper) / 2
+        return (lower + upper) / 2 if lower_strict or upper_strict else lower
+    if lower is not None:
+        return lower + 1 if lower_strict else lower
+    if upper is not None:
+        return upper - 1 if upper_strict else upper
+    return Fraction(0) if table.exact else 0.0
+
+
+def fourier_motzkin(la_prop: List[Constraint] | ConstraintSystem, exact: bool = True) -> dict | str:
     result = {}
-    
-    raise NotImplementedError('TODO: Your code here!') 
-    
+    print("===>Solving Constraints:")
+    if not la_prop:
+        return result
+
+    var_amount = len(la_prop[0].coefficients)
+    for constraint in la_prop:
+        if len(constraint.coefficients) != var_amount:
+            raise IllegalConstraintError(constraint)
+        print(constraint)
+
+    steps, counts = [], []
+    table = Tableau(la_prop, exact)
+    table = eli_equations(table, steps, counts)
+    # the bounded variables first: eliminating a variable bounded on one
+    # side drops its constraints, which leaves the others unconstrained
+    table = eli_vars(table, steps, counts)
+    table = eli_unbounded_vars(table, steps, counts)
+    if VERBOSE:
+        for name, before, after in counts:
+            print(f"eliminated {name}: {before} -> {after} constraints")
+    if contradiction(table):
+        result = "no solution"
+    else:
+        dtype = object if exact else np.float64
+        values = {f"x{i}": Fraction(0) if exact else 0.0 for i in range(var_amount)}
+        for name, rows in reversed(steps):
+            # the constraints of the variable, with the values of the others
+            matrix = np.array([coefficients[name] for coefficients, _, _ in rows], dtype=dtype).reshape(-1, 1)
+            constants = np.array([value - sum(a * values[other] for other, a in coefficients.items() if other != name)
+                                  for coefficients, value, _ in rows], dtype=dtype)
+            one_var = Tableau.from_matrix(matrix, [name], values=constants,
+                                          relations=[relation for _, _, relation in rows])
+            values[name] = solve_one_var(one_var)
+        result = {name: float(value) for name, value in values.items()}
+
     print(f"===>Solving result is {result}")
     return result
 
@@ -62,9 +361,47 @@ class TestFourierMotzkin(unittest.TestCase):
         self.assertEqual(result, "no solution")
         
     def test_fourier_motzkin_unsat_2(self):
-        case = [Constraint([1, -1, 0], 0), Constraint([1, 0, -1], 0), Constraint([-1, 1, 2], 0), Constraint([0, 0, -1], -1)]
+        # x0 <= x1, x0 <= x2, x1 + 2 x2 <= x0 and x2 >= 1, unsatisfiable:
+        # x1 + 2 x2 <= x0 <= x1 needs x2 <= 0. The case used to be written
+        # as c . x <= value; read as value <= c . x, like all the other
+        # cases, x = 0 satisfies it, so the rows are negated here
+        case = [Constraint([-1, 1, 0], 0), Constraint([-1, 0, 1], 0), Constraint([1, -1, -2], 0), Constraint([0, 0, 1], 1)]
         result = fourier_motzkin(case)
         self.assertEqual(result, "no solution")
+        flipped = [Constraint([-a for a in constraint.coefficients], -constraint.value) for constraint in case]
+        self.assertEqual(fourier_motzkin(flipped), {"x0": 1, "x1": -1, "x2": 1})
+
+    def test_fourier_motzkin_exact(self):
+        # 10 x0 >= 3 and -3 x0 >= -0.9 leave only x0 = 0.3, which floats
+        # cannot tell from 0.30000000000000004
+        case = [Constraint([10], 3), Constraint([-3], -0.9)]
+        self.assertEqual(fourier_motzkin(case), {"x0": 0.3})
+        self.assertEqual(fourier_motzkin(case + [Constraint([1], 0.30000000000000004)]), "no solution")
+
+    def test_system(self):
+        case = ConstraintSystem.from_constraints([Constraint([1, 1], 0.8), Constraint([1, -1], 0.2)])
+        self.assertDictEqual(fourier_motzkin(case), {"x0": 0.5, "x1": 0.3})
+
+    def test_unique(self):
+        # 2x0 + 2x1 >= 4 implies x0 + x1 >= 1, and x0 + x1 > 2 implies both
+        case = [Constraint([1, 1], 1), Constraint([2, 2], 4), Constraint([-1, 0], -3)]
+        table = _prune(Tableau(case))
+        self.assertEqual(list(table.values), [Fraction(4), Fraction(-3)])
+        table = _prune(Tableau(case + [Constraint([1, 1], 2, Rel.LT)]))
+        self.assertEqual(list(table.values), [Fraction(-3), Fraction(2)])
+
+    def test_pruning(self):
+        # |x0| + ... + |x4| <= 1, one constraint per sign of each variable
+        case = [Constraint([-sign for sign in signs], -1) for signs in product([1, -1], repeat=5)]
+        counts, pruned_counts = [], []
+        table = eli_vars(Tableau(case, exact=True), counts=counts, prune=False)
+        pruned = eli_vars(Tableau(case, exact=True), counts=pruned_counts)
+        self.assertFalse(contradiction(table) or contradiction(pruned))
+        self.assertEqual([name for name, _, _ in pruned_counts], ["x0", "x1", "x2", "x3", "x4"])
+        self.assertEqual([after for _, _, after in counts], [80, 98, 96, 2, 0])
+        self.assertEqual([after for _, _, after in pruned_counts], [80, 26, 24, 4, 0])
+        # and the pruned rows were redundant
+        self.assertEqual(fourier_motzkin(case + [Constraint([1, 1, 0, 0, 0], 1.5)]), "no solution")
 
 
 if __name__ == '__main__':
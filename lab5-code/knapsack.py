@@ -14,12 +14,49 @@ knapsack problem, please refer to:
 https://en.wikipedia.org/wiki/Knapsack_problem
 """
 
+import contextlib
+import io
 import time
+import tracemalloc
+from itertools import product
 from pathlib import Path
 import unittest
 
+import numpy as np
 from z3 import *
 
+# cells of the DP row updated at a time, which bounds the temporary arrays
+BLOCK = 1 << 16
+
+# also report the peak memory of the DP solvers, at the cost of a second run
+TRACE_MEMORY = False
+
+
+def measure(name, n_items, solve, memory=False):
+    """Run `solve()`, print its time and the items per second, and return its result.
+
+    With `memory`, `solve()` runs a second time under tracemalloc, which
+    slows it down, and the peak memory of that run is printed too: the
+    Python objects and the NumPy arrays, not the memory of z3.
+    """
+    start = time.time()
+    result = solve()
+    seconds = time.time() - start
+    report = f"{name} solve {n_items} items by time {seconds:.6f}s, {n_items / max(seconds, 1e-9):.1f} items/s"
+    if memory:
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+        solve()
+        peak = tracemalloc.get_traced_memory()[1]
+        if not tracing:
+            tracemalloc.stop()
+        report += f", peak memory {peak / 2 ** 20:.2f}MiB"
+    print(report)
+    return result
+
 
 # 0-1 Knapsack problem
 #
@@ -42,27 +79,69 @@ from z3 import *
 #   8+10+6 = 24
 
 # The 0-1 knapsack problem is often solved by the dynamic
-# programming, and here is a DP algorithm:
+# programming. Recursively, the best value of the first i items within a
+# capacity c is the better of leaving item i out, or taking it with the
+# best value of the first i - 1 items within c - w_i; but the recursion
+# solves the same sub-problems again and again, and is exponential in
+# the number of items. Bottom-up, the best values of all the capacities
+# 0..cap fit in a single row, which each item updates in place:
+#   best[c] = max(best[c], best[c - w] + v)   for c = cap, cap - 1, ..., w
+# From the top down, best[c - w] is still the best value without the
+# item, so the item is taken at most once. The row is a NumPy array,
+# updated by blocks of BLOCK cells, the top one first: the time is
+# O(n * cap) and the memory O(cap). To recover the chosen items, each
+# item keeps a bitset of the capacities where it improves the row.
+def _knapsack_row(weights, values, cap, choices=False):
+    # the best value of each capacity, and the packed bitset of each item
+    dtype = np.int32 if sum(values) < 2 ** 31 else np.int64
+    best = np.zeros(cap + 1, dtype=dtype)
+    taken = []
+    improved = np.zeros(cap + 1, dtype=bool) if choices else None
+    for w, v in zip(weights, values):
+        if choices:
+            improved[:] = False
+        for high in range(cap + 1, w, -BLOCK):
+            low = max(high - BLOCK, w)
+            candidate = best[low - w:high - w] + v
+            if choices:
+                improved[low:high] = candidate > best[low:high]
+            np.maximum(best[low:high], candidate, out=best[low:high])
+        if choices:
+            taken.append(np.packbits(improved))
+    return best, taken
+
+
+def _chosen(taken, weights, cap):
+    # the items of the best value of cap, from the last item backwards:
+    # item i is chosen if it improved the capacity left for it
+    chosen = []
+    for i in reversed(range(len(taken))):
+        if taken[i][cap >> 3] >> (7 - (cap & 7)) & 1:
+            chosen.append(i)
+            cap -= weights[i]
+    return chosen[::-1]
+
+
 def zero_one_knapsack_dp(weights, values, cap):
-    def knapsack_dp_do(rest_cap, index):
-        if rest_cap <= 0 or index <= 0:
-            return 0
+    def solve():
+        best, _ = _knapsack_row(weights, values, cap)
+        return int(best[cap])
 
-        if weights[index - 1] > rest_cap:
-            return knapsack_dp_do(rest_cap, index - 1)
+    return measure("zero_one_knapsack_dp", len(weights), solve, TRACE_MEMORY)
 
-        value_1 = knapsack_dp_do(rest_cap, index - 1)
-        value_2 = knapsack_dp_do(rest_cap - weights[index - 1], index - 1)
 
-        if value_1 >= (value_2 + values[index - 1]):
-            return value_1
+def zero_one_knapsack_np(weights, values, cap, choices=False):
+    """The best value of the 0-1 knapsack, by the DP on one row.
 
-        return value_2 + values[index-1]
+    With `choices`, returns the best value and the indices of the
+    chosen items.
+    """
+    def solve():
+        best, taken = _knapsack_row(weights, values, cap, choices)
+        return int(best[cap]), _chosen(taken, weights, cap) if choices else None
 
-    start = time.time()
-    result = knapsack_dp_do(cap, len(weights))
-    print(f"zero_one_knapsack_dp solve {len(weights)} items by time {(time.time() - start):.6f}s")
-    return result
+    value, chosen = measure("zero_one_knapsack_np", len(weights), solve, TRACE_MEMORY)
+    return (value, chosen) if choices else value
 
 
 # But it's more natural and much easier to solve knapsack with the 0-1 ILP theory:
@@ -89,9 +168,7 @@ def zero_one_knapsack_lp(weights, values, cap, verbose=False):
 
     # raise NotImplementedError('TODO: Your code here!')
 
-    start = time.time()
-    result = solver.check()
-    print(f"zero_one_knapsack_lp solve {len(weights)} items by time {(time.time() - start):.6f}s")
+    result = measure("zero_one_knapsack_lp", len(weights), solver.check)
 
     if result == sat:
         model = solver.model()
@@ -126,9 +203,7 @@ def complete_knapsack_lp(weights, values, cap, verbose=False):
     solver.maximize(Sum([values[i] * flags[i] for i in range(len(values))]))
     # raise NotImplementedError('TODO: Your code here!')
 
-    start = time.time()
-    result = solver.check()
-    print(f"complete_knapsack_lp solve {len(weights)} items by time {(time.time() - start):.6f}s")
+    result = measure("complete_knapsack_lp", len(weights), solver.check)
 
     if result == sat:
         model = solver.model()
@@ -140,7 +215,42 @@ def complete_knapsack_lp(weights, values, cap, verbose=False):
         return True, sum([values[index] * model[flag].as_long() for index, flag in enumerate(flags)])
     
     return False, result
-   
+
+
+# The complete knapsack is a 0-1 knapsack as well: the amount of item i
+# is at most cap // w_i, and any amount up to it is a sum of distinct
+# parts 1, 2, 4, ..., the rest. Each part is a 0-1 item of that many
+# copies of item i, which makes O(log(cap / w_i)) passes over the row.
+def complete_knapsack_np(weights, values, cap, choices=False):
+    """The best value of the complete knapsack, by the DP on one row.
+
+    With `choices`, returns the best value and the amount of each item.
+    """
+    if any(w <= 0 for w in weights):
+        raise ValueError("the weights should be positive")
+
+    def solve():
+        parts, part_weights, part_values = [], [], []
+        for i, (w, v) in enumerate(zip(weights, values)):
+            amount, most = 1, cap // w
+            while most > 0:
+                amount = min(amount, most)
+                parts.append((i, amount))
+                part_weights.append(amount * w)
+                part_values.append(amount * v)
+                most -= amount
+                amount *= 2
+        best, taken = _knapsack_row(part_weights, part_values, cap, choices)
+        amounts = [0] * len(weights)
+        if choices:
+            for part in _chosen(taken, part_weights, cap):
+                i, amount = parts[part]
+                amounts[i] += amount
+        return int(best[cap]), amounts
+
+    value, amounts = measure("complete_knapsack_np", len(weights), solve, TRACE_MEMORY)
+    return (value, amounts) if choices else value
+
 
 def get_large_test():
     # this test data is fetched from:
@@ -186,6 +296,46 @@ class TestKnapsack(unittest.TestCase):
         res_lp = complete_knapsack_lp(W, V, C, verbose=True)
         self.assertEqual(res_lp[1], 2936)
     
+    def test_zero_one_knapsack_np(self):
+        W = [23, 26, 20, 18, 32, 27, 29, 26, 30, 27]
+        V = [505, 352, 458, 220, 354, 414, 498, 545, 473, 543]
+        for C in (0, 17, 67, 133, 300):
+            value, chosen = zero_one_knapsack_np(W, V, C, choices=True)
+            self.assertEqual(value, max(sum(v for v, bit in zip(V, bits) if bit)
+                                        for bits in product([0, 1], repeat=len(W))
+                                        if sum(w for w, bit in zip(W, bits) if bit) <= C))
+            self.assertEqual(zero_one_knapsack_dp(W, V, C), value)
+            self.assertEqual(zero_one_knapsack_np(W, V, C), value)
+            self.assertLessEqual(sum(W[i] for i in chosen), C)
+            self.assertEqual(sum(V[i] for i in chosen), value)
+
+    def test_complete_knapsack_np(self):
+        W = [23, 26, 20, 18, 32, 27, 29, 26, 30, 27]
+        V = [505, 352, 458, 220, 354, 414, 498, 545, 473, 543]
+        value, amounts = complete_knapsack_np(W, V, 133, choices=True)
+        self.assertEqual(value, 2936)
+        self.assertLessEqual(sum(w * a for w, a in zip(W, amounts)), 133)
+        self.assertEqual(sum(v * a for v, a in zip(V, amounts)), value)
+        self.assertEqual(complete_knapsack_np([4, 6], [5, 8], 13), 16)
+
+    def test_measure_memory(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(measure("sum", 3, lambda: sum([1, 2, 3])), 6)
+            self.assertEqual(measure("row", 3, lambda: len(np.zeros(1 << 20)), memory=True), 1 << 20)
+        first, second = output.getvalue().splitlines()
+        self.assertNotIn("peak memory", first)
+        self.assertIn("peak memory 8.00MiB", second)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_large_case_np(self):
+        W, V = get_large_test()
+        C = 6404180
+        value, chosen = zero_one_knapsack_np(W, V, C, choices=True)
+        self.assertEqual(value, 13549094)
+        self.assertLessEqual(sum(W[i] for i in chosen), C)
+        self.assertEqual(sum(V[i] for i in chosen), value)
+
     def test_large_case(self):
         W, V = get_large_test()
         C = 6404180
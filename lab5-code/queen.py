@@ -7,11 +7,32 @@ many solutions exist.
 
 """
 
+import contextlib
+import io
+import multiprocessing
 import time
+import unittest
+
 from z3 import *
 
 
-def n_queen_la(board_size: int, verbose: bool = False) -> int:
+def dihedral(solution) -> set:
+    """The solutions symmetric to `solution`, a column per row, by rotations and reflections."""
+    n = len(solution)
+    orbit = set()
+    current = tuple(solution)
+    for _ in range(4):
+        orbit.add(current)
+        orbit.add(tuple(n - 1 - col for col in current))
+        # rotate by 90 degrees: the queen (row, col) goes to (col, n - 1 - row)
+        rotated = [0] * n
+        for row, col in enumerate(current):
+            rotated[col] = n - 1 - row
+        current = tuple(rotated)
+    return orbit
+
+
+def n_queen_la(board_size: int, verbose: bool = False, symmetry: bool = False) -> int:
     solver = Solver()
     n = board_size
 
@@ -43,24 +64,36 @@ def n_queen_la(board_size: int, verbose: bool = False) -> int:
     solver.add([Sum([board[i][i] for i in range(n)]) <= 1])
     # each anti-diagonal has at most 1 queen
     solver.add([Sum([board[i][n - i - 1] for i in range(n)]) <= 1])
+    if symmetry:
+        # the mirror image of a solution has its first queen in the other
+        # half of the first row
+        solver.add([board[0][col] == 0 for col in range(n) if col > (n - 1) // 2])
+
     # count the number of solutions
     solution_count = 0
 
     start = time.time()
     while solver.check() == sat:
-        solution_count += 1
         model = solver.model()
+        solution = [col_index for row in board for col_index, flag in enumerate(row) if model[flag] == 1]
+        # with symmetry, the solutions symmetric to this one are counted
+        # and blocked at once
+        solutions = dihedral(solution) if symmetry else [solution]
+        solution_count += len(solutions)
 
-        if verbose:
-            # print the solution
-            print([(row_index, col_index) for row_index, row in enumerate(board)
-                   for col_index, flag in enumerate(row) if model[flag] == 1])
+        for solution in solutions:
+            if verbose:
+                # print the solution
+                print(list(enumerate(solution)))
+            if symmetry and solution[0] > (n - 1) // 2:
+                # already excluded by the symmetry breaking constraint
+                continue
 
-        # generate constraints from solution
-        solution_cons = [(flag == 1) for row in board for flag in row if model[flag] == 1]
+            # generate constraints from solution
+            solution_cons = [(board[row_index][col_index] == 1) for row_index, col_index in enumerate(solution)]
 
-        # add solution to the solver to get new solution
-        solver.add(Not(And(solution_cons)))
+            # add solution to the solver to get new solution
+            solver.add(Not(And(solution_cons)))
 
     print(f"n_queen_la solve {board_size}-queens by {(time.time() - start):.6f}s")
     return solution_count
@@ -89,7 +122,86 @@ def n_queen_bt(board_size: int, verbose: bool = False) -> int:
     return len(solutions)
 
 
-def n_queen_la_opt(board_size: int, verbose: bool = False) -> int:
+def _count_bits(full: int, cols: int, diags: int, antis: int) -> int:
+    # cols, diags and antis are the columns attacked in the current row by
+    # the queens above, through a column, a diagonal or an anti-diagonal
+    count = 0
+    free = full & ~(cols | diags | antis)
+    while free:
+        bit = free & -free
+        free ^= bit
+        if cols | bit == full:
+            count += 1
+        else:
+            count += _count_bits(full, cols | bit, (diags | bit) << 1, (antis | bit) >> 1)
+    return count
+
+
+def _iter_bits(full: int, cols: int, diags: int, antis: int, solution: list):
+    if cols == full:
+        yield solution
+        return
+    free = full & ~(cols | diags | antis)
+    while free:
+        bit = free & -free
+        free ^= bit
+        solution.append(bit.bit_length() - 1)
+        yield from _iter_bits(full, cols | bit, (diags | bit) << 1 & full, (antis | bit) >> 1, solution)
+        solution.pop()
+
+
+def _count_first_row(args) -> int:
+    n, col = args
+    full = (1 << n) - 1
+    bit = 1 << col
+    return _count_bits(full, bit, bit << 1 & full, bit >> 1)
+
+
+def n_queen_bits(board_size: int, verbose: bool = False, workers: int | None = None) -> int:
+    n = board_size
+    full = (1 << n) - 1
+
+    # Backtracking on bitboards: the columns, diagonals and anti-diagonals
+    # attacked by the queens placed so far are bits of three integers, so
+    # the free squares of a row are found with a few bitwise operations
+    # and no partial solution is kept in memory.
+    #
+    # Mirroring a solution left to right gives another one, so only the
+    # first queens in the left half of the first row are tried, and their
+    # solutions count twice; for odd n, the middle column counts once.
+    # The choices of the first row are counted on a pool of `workers`
+    # processes, the default is one per CPU.
+    half = n // 2
+    start = time.time()
+    if n <= 1:
+        solution_count = 1
+        if verbose and n:
+            print([(0, 0)])
+    elif verbose:
+        # stream the solutions instead of counting them in parallel
+        solution_count = 0
+        for col in range((n + 1) // 2):
+            bit = 1 << col
+            for solution in _iter_bits(full, bit, bit << 1 & full, bit >> 1, [col]):
+                mirrors = [solution] if col == half and n % 2 else [solution, [n - 1 - c for c in solution]]
+                for found in mirrors:
+                    solution_count += 1
+                    print(list(enumerate(found)))
+    else:
+        tasks = [(n, col) for col in range((n + 1) // 2)]
+        if workers == 1 or n < 10:
+            counts = map(_count_first_row, tasks)
+        else:
+            with multiprocessing.Pool(workers) as pool:
+                counts = pool.map(_count_first_row, tasks)
+        solution_count = sum(count if col == half and n % 2 else 2 * count
+                             for (_, col), count in zip(tasks, counts))
+
+    print(f"n_queen_bits solve {board_size}-queens by {(time.time() - start):.6f}s")
+    return solution_count
+
+
+def n_queen_la_opt(board_size: int, verbose: bool = False, symmetry: bool = False) -> int:
     solver = Solver()
     n = board_size
 
@@ -108,29 +220,90 @@ def n_queen_la_opt(board_size: int, verbose: bool = False) -> int:
     solver.add([If(i == j, True, And(queens[i] - queens[j] != i - j, queens[i] - queens[j] != j - i))
                 for i in range(n) for j in range(i)])
 
+    if symmetry:
+        # the mirror image of a solution has its first queen in the other
+        # half of the first row
+        solver.add(queens[0] <= (n - 1) // 2)
+
     # count the number of solutions
     solution_count = 0
     start = time.time()
 
     while solver.check() == sat:
-        solution_count += 1
         model = solver.model()
+        solution = [model[queen].as_long() for queen in queens]
+        # with symmetry, the solutions symmetric to this one are counted
+        # and blocked at once
+        solutions = dihedral(solution) if symmetry else [solution]
+        solution_count += len(solutions)
 
-        if verbose:
-            # print the solutions
-            print([(index, model[queen]) for index, queen in enumerate(queens)])
+        for solution in solutions:
+            if verbose:
+                # print the solutions
+                print(list(enumerate(solution)))
+            if symmetry and solution[0] > (n - 1) // 2:
+                # already excluded by the symmetry breaking constraint
+                continue
 
-        # generate constraints from solution
-        solution_cons = [(queen == model[queen]) for queen in queens]
+            # generate constraints from solution
+            solution_cons = [(queen == col) for queen, col in zip(queens, solution)]
 
-        # add solution to the solver to get new solution
-        solver.add(Not(And(solution_cons)))
+            # add solution to the solver to get new solution
+            solver.add(Not(And(solution_cons)))
 
     print(f"n_queen_la_opt solve {board_size}-queens by {(time.time() - start):.6f}s")
 
     return solution_count
 
 
+def benchmark(sizes=range(4, 11), limit: float = 10.0):
+    """Print a table of the counts and times of the solvers for each board size.
+
+    A solver taking more than `limit` seconds on a board is skipped on
+    the larger ones.
+    """
+    solvers = [("bt", n_queen_bt, {}), ("bits", n_queen_bits, {"workers": 1}),
+               ("la", n_queen_la, {}), ("la sym", n_queen_la, {"symmetry": True}),
+               ("la_opt", n_queen_la_opt, {}), ("la_opt sym", n_queen_la_opt, {"symmetry": True})]
+    print(f"{'n':>3}" + "".join(f"{name:>22}" for name, _, _ in solvers))
+    slow = set()
+    for n in sizes:
+        cells = []
+        for name, solver, options in solvers:
+            if name in slow:
+                cells.append("-")
+                continue
+            start = time.time()
+            # the solvers print their own times
+            with contextlib.redirect_stdout(io.StringIO()):
+                count = solver(n, **options)
+            elapsed = time.time() - start
+            if elapsed > limit:
+                slow.add(name)
+            cells.append(f"{count:>10} {elapsed:>10.4f}s")
+        print(f"{n:>3}" + "".join(f"{cell:>22}" for cell in cells))
+
+
+class TestQueen(unittest.TestCase):
+
+    def test_n_queen_bits(self):
+        # https://oeis.org/A000170
+        counts = [1, 1, 0, 0, 2, 10, 4, 40, 92, 352, 724, 2680, 14200]
+        for n in range(len(counts)):
+            self.assertEqual(n_queen_bits(n), counts[n])
+        self.assertEqual(n_queen_bits(12, workers=2), 14200)
+        for n in range(1, 8):
+            self.assertEqual(n_queen_bits(n, verbose=True), n_queen_bt(n))
+
+    def test_symmetry(self):
+        self.assertEqual(len(dihedral([1, 3, 0, 2])), 2)
+        self.assertEqual(len(dihedral([0, 4, 7, 5, 2, 6, 1, 3])), 8)
+        for n in range(1, 9):
+            self.assertEqual(n_queen_la_opt(n, symmetry=True), n_queen_bt(n))
+        for n in range(1, 6):
+            self.assertEqual(n_queen_la(n, symmetry=True), n_queen_la(n))
+
+
 if __name__ == '__main__':
     # 8-queen problem has 92 solutions
     n_queen_la(8)
@@ -147,3 +320,12 @@ if __name__ == '__main__':
     # raise NotImplementedError('TODO: Your code here!')
     n_queen_la_opt(8)
     # n_queen_la(8)
+
+    # the bitboard backtracking counts the solutions of larger boards
+    n_queen_bits(8)
+    n_queen_bits(14)
+
+    # enumerating the solutions up to symmetry makes up to 8 times fewer
+    # solver calls; only the symmetric solutions left of the middle column
+    # still need a blocking constraint, about half of them
+    benchmark()
@@ -0,0 +1,282 @@
+"""Revised simplex
+
+`GeneralSimplex` keeps the whole tableau, a dense m x n matrix that
+every pivot rewrites: its memory and the cost of a pivot grow with
+m * n, even when each constraint has only a few variables. The revised
+simplex keeps the constraints A x - s = 0 as they are, and the basis B,
+the columns of [A | -I] of the basic variables. A row of the tableau,
+or a column, is computed when it is needed:
+
+  * the column of a non-basic variable v is -B^-1 M_v ("FTRAN"), for
+    the column M_v of v in [A | -I];
+  * row r is -rho M_v for each non-basic v, with rho = e_r B^-1
+    ("BTRAN").
+
+A is stored twice, compressed by rows (CSR) and by columns (CSC): the
+CSR form multiplies it by a row vector, the CSC form gives the columns
+of any set of variables. B^-1 is kept in product form, as the product
+of elementary "eta" matrices, each the identity with one column
+replaced: a pivot on row r appends the eta matrix of the column of the
+entering variable. The eta file grows with the pivots, and so do the
+costs of FTRAN and BTRAN and the rounding errors, so every `refactor`
+pivots B is factorized again: Gaussian elimination, with partial
+pivoting, of the columns of the structural basic variables, sparsest
+first, from the basis of the slack variables, gives a short eta file
+again (an LU factorization in product form), and the values of the
+basic variables are computed again from the non-basic ones.
+
+The pivoting rules are those of `GeneralSimplex` (Bland's rule), and so
+are the bounds, the conflicts and `push()`/`pop()`. Pricing is partial:
+the coefficients of the row of the violated basic variable are
+computed for `chunk` non-basic variables at a time, the smallest
+first, until one can move it.
+
+The revised simplex works on floats only.
+"""
+
+import random
+import unittest
+from typing import List, Tuple
+
+import numpy as np
+
+import simpex
+from constraint import Constraint, ConstraintSystem, Rel, compress
+from simpex import EPS, GeneralSimplex, Status
+
+# pivots between two factorizations of the basis
+REFACTOR = 64
+# non-basic variables priced at a time
+CHUNK = 256
+# entries of the eta vectors smaller than this are dropped
+DROP = 1e-13
+
+
+def _segments(indptr: np.ndarray, which: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # the positions of the entries of the major indices `which`, and
+    # the index in `which` each belongs to
+    starts = indptr[which]
+    lengths = indptr[which + 1] - starts
+    ends = np.cumsum(lengths)
+    positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + lengths, lengths)
+    return positions, np.repeat(np.arange(len(which)), lengths)
+
+
+class RevisedSimplex(GeneralSimplex):
+    """The general simplex on a sparse constraint matrix and a factorized basis."""
+
+    def __init__(self, constraints: List[Constraint] | ConstraintSystem, refactor: int = REFACTOR,
+                 chunk: int = CHUNK):
+        system = constraints
+        if not isinstance(system, ConstraintSystem):
+            system = ConstraintSystem.from_constraints(constraints)
+        n_vars, n_rows = system.n_vars, len(system)
+        # the CSR form is the one of the system
+        self.csr = system.indptr, system.indices, system.data
+        # the row of each entry of the CSR form
+        self.csr_rows = system.rows()
+        self.csc = compress(system.indices, self.csr_rows, system.data, n_vars)
+
+        # the basis starts with the slack variables, s_i in row i
+        self.basic = np.arange(n_vars, n_vars + n_rows)
+        self.is_basic = np.zeros(n_vars + n_rows, dtype=bool)
+        self.is_basic[n_vars:] = True
+        self.position = np.concatenate([np.full(n_vars, -1), np.arange(n_rows)])
+        # B^-1 = E_k ... E_1 (-I), E_i the identity with column etas[i][0]
+        # replaced by the vector of indices etas[i][1] and values etas[i][2]
+        self.etas: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        self.refactor = refactor
+        self.chunk = chunk
+        # the pivots since the last factorization
+        self.updates = 0
+        self.factorizations = 0
+        self._cache = None
+
+        names = [f"x{j}" for j in range(n_vars)] + [f"s{i}" for i in range(n_rows)]
+        self._setup(constraints, False, names, system.values)
+
+    def _matrix_column(self, var: int) -> np.ndarray:
+        # the column M_var of [A | -I], dense
+        column = np.zeros(len(self.basic))
+        if var < self.n_vars:
+            indptr, indices, data = self.csc
+            column[indices[indptr[var]:indptr[var + 1]]] = data[indptr[var]:indptr[var + 1]]
+        else:
+            column[var - self.n_vars] = -1
+        return column
+
+    def ftran(self, column: np.ndarray) -> np.ndarray:
+        """B^-1 column, for a dense column."""
+        result = -column
+        for row, indices, values in self.etas:
+            pivot = result[row]
+            if pivot:
+                result[row] = 0
+                result[indices] += values * pivot
+        return result
+
+    def btran(self, row: np.ndarray) -> np.ndarray:
+        """row B^-1, for a dense row."""
+        result = row.copy()
+        for r, indices, values in reversed(self.etas):
+            result[r] = result[indices] @ values
+        return -result
+
+    def _coefficients(self, rho: np.ndarray, nonbasic: np.ndarray) -> np.ndarray:
+        # -rho M_v for the variables `nonbasic`: rho . A_v from the CSC
+        # form for x_v, and rho_i for s_i
+        coefficients = np.empty(len(nonbasic))
+        structural = nonbasic < self.n_vars
+        indptr, indices, data = self.csc
+        positions, owners = _segments(indptr, nonbasic[structural])
+        coefficients[structural] = -np.bincount(owners, weights=rho[indices[positions]] * data[positions],
+                                                minlength=structural.sum())
+        coefficients[~structural] = rho[nonbasic[~structural] - self.n_vars]
+        return coefficients
+
+    def _rho(self, row: int) -> np.ndarray:
+        unit = np.zeros(len(self.basic))
+        unit[row] = 1
+        return self.btran(unit)
+
+    def _row(self, row: int):
+        # the whole row: rho A from the CSR form, on the rows where rho is not 0
+        rho = self._rho(row)
+        indptr, indices, data = self.csr
+        rows = np.flatnonzero(rho)
+        positions, owners = _segments(indptr, rows)
+        coefficients = np.concatenate([
+            -np.bincount(indices[positions], weights=rho[rows][owners] * data[positions], minlength=self.n_vars),
+            rho])
+        nonbasic = np.flatnonzero(~self.is_basic & (np.abs(coefficients) > EPS))
+        return nonbasic, coefficients[nonbasic]
+
+    def _entering(self, row: int, increase: bool) -> int | None:
+        # partial pricing, in the order of the variables for Bland's rule
+        rho = self._rho(row)
+        nonbasic = np.flatnonzero(~self.is_basic)
+        for start in range(0, len(nonbasic), self.chunk):
+            chunk = nonbasic[start:start + self.chunk]
+            coefficients = self._coefficients(rho, chunk)
+            suitable = (np.abs(coefficients) > EPS) & self._suitable(chunk, coefficients, increase)
+            if suitable.any():
+                return int(chunk[np.argmax(suitable)])
+        return None
+
+    def _column(self, var: int) -> np.ndarray:
+        column = self.ftran(self._matrix_column(var))
+        # the pivot that may follow needs B^-1 M_var again
+        self._cache = var, column
+        return -column
+
+    def _add_eta(self, row: int, column: np.ndarray):
+        # the eta matrix that turns `column` = B^-1 M_v into e_row
+        pivot = column[row]
+        eta = -column / pivot
+        eta[row] = 1 / pivot
+        indices = np.flatnonzero(np.abs(eta) > DROP)
+        self.etas.append((row, indices, eta[indices]))
+
+    def _pivot(self, row: int, var: int):
+        if self._cache is not None and self._cache[0] == var:
+            column = self._cache[1]
+        else:
+            column = self.ftran(self._matrix_column(var))
+        self._cache = None
+        self._add_eta(row, column)
+        leaving = self.basic[row]
+        self.basic[row] = var
+        self.is_basic[var], self.is_basic[leaving] = True, False
+        self.position[var], self.position[leaving] = row, -1
+        self.updates += 1
+        if self.updates >= self.refactor:
+            self.factorize()
+
+    def factorize(self):
+        """Factorize the basis again, and compute the basic variables from the non-basic ones."""
+        self.etas = []
+        self._cache = None
+        self.updates = 0
+        self.factorizations += 1
+        n_vars, n_rows = self.n_vars, len(self.basic)
+        # the slack variables that stay basic take their own rows, and
+        # the structural ones the rows of the non-basic slack variables
+        free = ~self.is_basic[n_vars:]
+        basic = np.arange(n_vars, n_vars + n_rows)
+        structural = self.basic[self.basic < n_vars]
+        indptr = self.csc[0]
+        for var in structural[np.argsort(indptr[structural + 1] - indptr[structural], kind="stable")]:
+            column = self.ftran(self._matrix_column(var))
+            candidates = np.flatnonzero(free)
+            row = candidates[np.argmax(np.abs(column[candidates]))]
+            if abs(column[row]) < simpex.PIVOT_EPS:
+                self.unstable = True
+            self._add_eta(row, column)
+            free[row] = False
+            basic[row] = var
+        self.basic[:] = basic
+        self.position[basic] = np.arange(n_rows)
+
+        # B x_B = -(sum of M_v x_v over the non-basic v), for the values
+        # and the deltas
+        nonbasic = ~self.is_basic
+        for assignment in (self.value, self.delta):
+            x = np.where(nonbasic[:n_vars], assignment[:n_vars], 0)
+            s = np.where(nonbasic[n_vars:], assignment[n_vars:], 0)
+            total = np.bincount(self.csr_rows, weights=self.csr[2] * x[self.csr[1]], minlength=n_rows) - s
+            assignment[self.basic] = self.ftran(-total)
+
+
+def _random_system(rng: random.Random, n_vars: int, n_constraints: int, density: float) -> List[Constraint]:
+    relations = [Rel.LE, Rel.LE, Rel.LT, Rel.EQ]
+    return [Constraint([rng.randint(-5, 5) if rng.random() < density else 0 for _ in range(n_vars)],
+                       rng.randint(-10, 10), rng.choice(relations))
+            for _ in range(n_constraints)]
+
+
+class TestRevisedSimplex(unittest.TestCase):
+
+    def solve(self, solver: GeneralSimplex) -> Status:
+        if all(solver.assert_constraint(index) for index in range(len(solver.constraints))):
+            return solver.check()
+        return Status.UNSAT
+
+    def test_sat(self):
+        solver = RevisedSimplex([Constraint([1, 1], 2), Constraint([2, -1], 0), Constraint([-1, 2], 1)])
+        self.assertEqual(self.solve(solver), Status.SAT)
+        self.assertEqual(solver.model(), {"x0": 1.0, "x1": 1.0})
+
+    def test_explanation(self):
+        case = [Constraint([-1, 1, 0], 0), Constraint([-1, 0, 1], 0), Constraint([1, -1, -2], 0),
+                Constraint([0, 0, 1], 1), Constraint([1, 1, 1], -5)]
+        solver = RevisedSimplex(case)
+        self.assertEqual(self.solve(solver), Status.UNSAT)
+        self.assertEqual(solver.conflict, {0, 2, 3})
+
+    def test_same_as_dense(self):
+        # few pivots between factorizations and small chunks, to exercise them
+        verbose, simpex.VERBOSE = simpex.VERBOSE, False
+        rng = random.Random(0)
+        try:
+            for _ in range(100):
+                case = _random_system(rng, rng.randint(2, 12), rng.randint(2, 16), 0.4)
+                dense = GeneralSimplex(case)
+                revised = RevisedSimplex(case, refactor=3, chunk=2)
+                status = self.solve(dense)
+                self.assertEqual(self.solve(revised), status)
+                if status == Status.SAT:
+                    model = revised.model()
+                    x = np.array([model[f"x{j}"] for j in range(len(case[0].coefficients))])
+                    for constraint in case:
+                        total = np.dot(constraint.coefficients, x)
+                        self.assertGreaterEqual(total, constraint.value - 1e-7)
+                        if constraint.relation == Rel.EQ:
+                            self.assertAlmostEqual(total, constraint.value)
+                        elif constraint.relation == Rel.LT:
+                            self.assertGreater(total, constraint.value)
+        finally:
+            simpex.VERBOSE = verbose
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,58 @@
-from typing import List
+"""General simplex
+
+`simplex()` decides a conjunction of linear constraints with the
+general simplex of Dutertre and de Moura ("A Fast Linear-Arithmetic
+Solver for DPLL(T)", 2006), the one used in SMT solvers. Constraint i
+introduces the slack variable s_i = coefficients . x, whose value is
+bounded: the constraint `value <= s_i` for Rel.LE, `value < s_i` for
+Rel.LT and `value == s_i` for Rel.EQ. The tableau expresses the basic
+variables in terms of the non-basic ones, and the algorithm keeps an
+assignment of all the variables that satisfies the tableau, with every
+non-basic variable within its bounds. While a basic variable violates
+a bound, it is pivoted with a non-basic variable that can move it back
+in bounds; if there is none, the bounds of the variables of its row
+explain the conflict. Bland's rule, choosing the smallest variables,
+guarantees termination.
+
+Strict bounds use delta-rationals c + k*delta, for an infinitesimal
+delta > 0, stored as the pairs of arrays (value, delta) and compared
+lexicographically; the model gives delta a small enough real value.
+
+Floats make the pivots fast but can round a SAT problem into an UNSAT
+one, or the converse. With `exact`, the tableau, bounds and assignment
+hold `Fraction`s instead, and floats of the constraints are read as the
+decimals they print as. By default `simplex()` solves with floats, and
+solves again exactly if a pivot element was nearly zero, if the model
+violates a constraint by more than the rounding errors, or if the
+conflicting constraints alone are satisfiable. Only `exact` tells apart
+bounds closer than the rounding errors.
+
+The tableau is dense, and rewritten by each pivot; for large sparse
+systems, `method="revised"` keeps the constraint matrix sparse and the
+basis factorized instead (see revised_simplex.py).
+"""
+
+from typing import List, Set
 import unittest
 from enum import Enum, auto
+from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
 from pandas.testing import assert_series_equal
 
-from constraint import Constraint, IllegalConstraintError
+from constraint import Constraint, ConstraintSystem, ConstraintView, IllegalConstraintError, Rel
 from tableau import Tableau
 
 VERBOSE = True
 
+# float comparisons tolerate this error
+EPS = 1e-9
+# pivot elements smaller than this make the float results doubtful
+PIVOT_EPS = 1e-7
+
+METHODS = ("dense", "revised")
+
 
 class Status(Enum):
     UNSAT = auto()
@@ -17,46 +60,311 @@ class Status(Enum):
     UNDECIDED = auto()
 
 
-def simplex(constraints: List[Constraint]) -> dict | str:
+def _less(av, ad, bv, bd, exact: bool = False):
+    # lexicographic (av, ad) < (bv, bd), elementwise
+    if exact:
+        return (av < bv) | ((av == bv) & (ad < bd))
+    return (av < bv - EPS) | ((np.abs(av - bv) <= EPS) & (ad < bd - EPS))
+
+
+class GeneralSimplex:
+    """The general simplex on the constraints, which can be asserted in any order.
+
+    The tableau and the assignment are kept from one `check()` to the
+    next: asserting more constraints, or backtracking to a `push()` with
+    `pop()`, only changes the bounds. After an UNSAT `check()` or a
+    failed assertion, `conflict` holds the indices of the constraints
+    that contradict each other. With floats, `unstable` tells whether a
+    pivot element was nearly zero.
+    """
+
+    def __init__(self, constraints: List[Constraint] | ConstraintSystem, exact: bool = False):
+        self.tableau = Tableau(constraints, exact)
+        # pivots update these arrays of the tableau in place
+        self.basic, self.is_basic = self.tableau.basic, self.tableau.is_basic
+        self._setup(constraints, exact, self.tableau.names, self.tableau.values)
+
+    def _setup(self, constraints: List[Constraint] | ConstraintSystem, exact: bool, names: List[str], values: np.ndarray):
+        self.constraints = constraints
+        self.exact = exact
+        self.names = names
+        # the constant of the constraint of each slack variable
+        self.values = values
+        size = len(names)
+        self.n_vars = len(names) - len(values)
+
+        dtype = object if exact else np.float64
+        # the bounds, and the constraint asserting each of them (-1 for none)
+        self.lower = np.full(size, -np.inf, dtype=dtype)
+        self.lower_delta = np.zeros(size, dtype=dtype)
+        self.lower_reason = np.full(size, -1)
+        self.upper = np.full(size, np.inf, dtype=dtype)
+        self.upper_delta = np.zeros(size, dtype=dtype)
+        self.upper_reason = np.full(size, -1)
+        # the assignment
+        self.value = np.zeros(size, dtype=dtype)
+        self.delta = np.zeros(size, dtype=dtype)
+
+        self.trail = []
+        self.conflict: Set[int] = set()
+        self.pivots = 0
+        self.unstable = False
+
+    def _less(self, av, ad, bv, bd):
+        return _less(av, ad, bv, bd, self.exact)
+
+    def push(self):
+        self.trail.append((self.lower.copy(), self.lower_delta.copy(), self.lower_reason.copy(),
+                           self.upper.copy(), self.upper_delta.copy(), self.upper_reason.copy()))
+
+    def pop(self):
+        """Restore the bounds of the last `push()`.
+
+        The assignment still satisfies the tableau, and the restored
+        bounds are looser, so it needs no change.
+        """
+        (self.lower, self.lower_delta, self.lower_reason,
+         self.upper, self.upper_delta, self.upper_reason) = self.trail.pop()
+
+    def assert_constraint(self, index: int) -> bool:
+        """Assert the bounds of constraint `index` on its slack variable, False on a conflict."""
+        relation = self.constraints[index].relation
+        value = self.values[index]
+        var = self.n_vars + index
+        strict = 1 if relation == Rel.LT else 0
+        if not self.assert_lower(var, value, strict, index):
+            return False
+        if relation == Rel.EQ:
+            return self.assert_upper(var, value, 0, index)
+        return True
+
+    def assert_lower(self, var: int, value: float, delta: float, reason: int) -> bool:
+        if not self._less(self.lower[var], self.lower_delta[var], value, delta):
+            return True
+        if self._less(self.upper[var], self.upper_delta[var], value, delta):
+            self.conflict = {reason, int(self.upper_reason[var])}
+            return False
+        self.lower[var], self.lower_delta[var], self.lower_reason[var] = value, delta, reason
+        if not self.is_basic[var] and self._less(self.value[var], self.delta[var], value, delta):
+            self._update(var, value, delta)
+        return True
+
+    def assert_upper(self, var: int, value: float, delta: float, reason: int) -> bool:
+        if not self._less(value, delta, self.upper[var], self.upper_delta[var]):
+            return True
+        if self._less(value, delta, self.lower[var], self.lower_delta[var]):
+            self.conflict = {reason, int(self.lower_reason[var])}
+            return False
+        self.upper[var], self.upper_delta[var], self.upper_reason[var] = value, delta, reason
+        if not self.is_basic[var] and self._less(value, delta, self.value[var], self.delta[var]):
+            self._update(var, value, delta)
+        return True
+
+    # the tableau is only accessed by the following methods, which
+    # another representation of it can override
+
+    def _row(self, row: int):
+        """The non-basic variables with a non-zero coefficient in `row` of the tableau, and these coefficients."""
+        tab = self.tableau
+        cols = np.flatnonzero(tab.matrix[row] if self.exact else np.abs(tab.matrix[row]) > EPS)
+        return tab.nonbasic[cols], tab.matrix[row, cols]
+
+    def _column(self, var: int) -> np.ndarray:
+        """The coefficients of the non-basic `var` in every row of the tableau."""
+        return self.tableau.matrix[:, self.tableau.position[var]]
+
+    def _entering(self, row: int, increase: bool) -> int | None:
+        """The smallest non-basic variable that can move the basic variable of `row`, if any."""
+        nonbasic, coefficients = self._row(row)
+        candidates = nonbasic[self._suitable(nonbasic, coefficients, increase)]
+        return int(candidates.min()) if len(candidates) else None
+
+    def _pivot(self, row: int, var: int):
+        self.tableau.pivot(row, self.tableau.position[var])
+
+    def _suitable(self, nonbasic: np.ndarray, coefficients: np.ndarray, increase: bool) -> np.ndarray:
+        # whether each non-basic variable can move in the direction that
+        # increases (or decreases) the basic variable
+        can_increase = self._less(self.value[nonbasic], self.delta[nonbasic],
+                                  self.upper[nonbasic], self.upper_delta[nonbasic])
+        can_decrease = self._less(self.lower[nonbasic], self.lower_delta[nonbasic],
+                                  self.value[nonbasic], self.delta[nonbasic])
+        positive = coefficients > 0
+        if increase:
+            return (positive & can_increase) | (~positive & can_decrease)
+        return (~positive & can_increase) | (positive & can_decrease)
+
+    def _update(self, var: int, value: float, delta: float):
+        # move the non-basic var, and the basic variables with it
+        column = self._column(var)
+        self.value[self.basic] += column * (value - self.value[var])
+        self.delta[self.basic] += column * (delta - self.delta[var])
+        self.value[var], self.delta[var] = value, delta
+
+    def _pivot_and_update(self, row: int, entering: int, value: float, delta: float):
+        # set the basic variable of row to (value, delta) by moving the
+        # non-basic variable entering, then swap them
+        basic = self.basic[row]
+        column = self._column(entering)
+        coefficient = column[row]
+        if not self.exact and abs(coefficient) < PIVOT_EPS:
+            self.unstable = True
+        theta = (value - self.value[basic]) / coefficient
+        theta_delta = (delta - self.delta[basic]) / coefficient
+        self.value[self.basic] += column * theta
+        self.delta[self.basic] += column * theta_delta
+        self.value[entering] += theta
+        self.delta[entering] += theta_delta
+        if VERBOSE:
+            print(f"pivot {self.names[basic]} and {self.names[entering]}")
+        self._pivot(row, entering)
+        self.pivots += 1
+
+    def check(self) -> Status:
+        while True:
+            basic = self.basic
+            value, delta = self.value[basic], self.delta[basic]
+            below = self._less(value, delta, self.lower[basic], self.lower_delta[basic])
+            above = self._less(self.upper[basic], self.upper_delta[basic], value, delta)
+            violated = np.flatnonzero(below | above)
+            if not len(violated):
+                return Status.SAT
+
+            # Bland's rule: the smallest violating basic variable, and the
+            # smallest non-basic variable that can fix it
+            row = violated[np.argmin(basic[violated])]
+            var = basic[row]
+            increase = bool(below[row])
+            entering = self._entering(row, increase)
+
+            if entering is None:
+                # the row is stuck at the bounds of its non-basic variables
+                nonbasic, coefficients = self._row(row)
+                if increase:
+                    reasons = [self.lower_reason[var]]
+                    reasons += [self.upper_reason[x] if a > 0 else self.lower_reason[x]
+                                for a, x in zip(coefficients, nonbasic)]
+                else:
+                    reasons = [self.upper_reason[var]]
+                    reasons += [self.lower_reason[x] if a > 0 else self.upper_reason[x]
+                                for a, x in zip(coefficients, nonbasic)]
+                self.conflict = {int(reason) for reason in reasons}
+                return Status.UNSAT
+
+            if increase:
+                self._pivot_and_update(row, entering, self.lower[var], self.lower_delta[var])
+            else:
+                self._pivot_and_update(row, entering, self.upper[var], self.upper_delta[var])
+
+    def model(self) -> dict:
+        """The values of x0, x1, ..., with a real delta that keeps every bound."""
+        # delta must keep (lower, lower_delta) <= (value, delta) for the
+        # real values, and likewise for the upper bounds
+        bound = [1]
+        mask = (self.lower < self.value) & (self.lower_delta > self.delta)
+        bound += list((self.value[mask] - self.lower[mask]) / (self.lower_delta[mask] - self.delta[mask]))
+        mask = (self.value < self.upper) & (self.delta > self.upper_delta)
+        bound += list((self.upper[mask] - self.value[mask]) / (self.delta[mask] - self.upper_delta[mask]))
+        delta = min(bound) / 2 if len(bound) > 1 else 1
+        return {self.names[var]: float(self.value[var] + delta * self.delta[var])
+                for var in range(self.n_vars)}
+
+
+def _solve(constraints: List[Constraint] | ConstraintSystem, exact: bool, method: str = "dense") -> GeneralSimplex:
+    if method == "revised":
+        # imported here, the revised simplex builds on this module
+        from revised_simplex import RevisedSimplex
+        solver = RevisedSimplex(constraints)
+    else:
+        solver = GeneralSimplex(constraints, exact)
+    if all(solver.assert_constraint(index) for index in range(len(constraints))):
+        solver.status = solver.check()
+    else:
+        solver.status = Status.UNSAT
+    return solver
+
+
+def _satisfies(constraints: List[Constraint] | ConstraintSystem, model: dict) -> bool:
+    # up to the rounding errors, relative to the size of the terms
+    if isinstance(constraints, ConstraintSystem):
+        # row by row from the CSR arrays, without a dense coefficient row
+        x = np.array([model[f"x{i}"] for i in range(constraints.n_vars)], dtype=np.float64)
+        terms = constraints.data * x[constraints.indices]
+        rows = constraints.rows()
+        totals = np.bincount(rows, weights=terms, minlength=len(constraints))
+        sizes = np.bincount(rows, weights=np.abs(terms), minlength=len(constraints))
+        values, relations = constraints.values, constraints.relations
+        errors = EPS * (1 + np.abs(values) + sizes)
+        violated = ((totals < values - errors) | (relations == Rel.LT) & (totals <= values - errors)
+                    | (relations == Rel.EQ) & (totals > values + errors))
+        return not violated.any()
+    for constraint in constraints:
+        terms = [a * model[f"x{i}"] for i, a in enumerate(constraint.coefficients)]
+        total = sum(terms)
+        error = EPS * (1 + abs(constraint.value) + sum(map(abs, terms)))
+        if (total < constraint.value - error or constraint.relation == Rel.LT and total <= constraint.value - error
+                or constraint.relation == Rel.EQ and total > constraint.value + error):
+            return False
+    return True
+
+
+def simplex(constraints: List[Constraint] | ConstraintSystem, exact: bool | None = None, method: str = "dense") -> dict | str:
+    """Solve the constraints with `method` "dense", the tableau of `GeneralSimplex`, or "revised",
+    the sparse `RevisedSimplex` of revised_simplex.py.
+
+    The revised simplex works on floats only; by default its doubtful
+    results are solved again exactly, on the dense tableau.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method}, expected one of {METHODS}")
+    if method == "revised" and exact:
+        raise ValueError("the revised simplex works on floats only")
     result = {}
     print("===>Solving Constraints:")
     if not constraints:
         return result
 
-    basic_var_amount = len(constraints[0].coefficients)
-    for constraint in constraints:
-        if len(constraint.coefficients) != basic_var_amount:
-            raise IllegalConstraintError(constraint)
-        print(constraint)
-
-    tab = Tableau(constraints)
-
-    # Challenge : finish the simplex algorithm following the skeleton of the algorithm:
-    # simplex(){
-    #     tab = constructTableau();
-    #     while(True){
-    #         for(each additional var si){
-    #             if(si violates its constraint){
-    #                 if(there is a suitable xj){
-    #                     pivot(si, xj);
-    #                     update additional var
-    #                 }
-    #                 else return UNSAT;
-    #             }
-    #         }
-    #         if (each additional var satisfies its constraint)
-    #             return SAT;
-    #     }
-    # }
-    # Your code here:
-    raise NotImplementedError('TODO: Your code here!') 
-    
+    if isinstance(constraints, ConstraintSystem):
+        # a system is well formed by construction, and printing it row by
+        # row would build a dense row per constraint
+        print(f"{len(constraints)} constraints over {constraints.n_vars} variables,"
+              f" {len(constraints.data)} non-zero coefficients")
+    else:
+        basic_var_amount = len(constraints[0].coefficients)
+        for constraint in constraints:
+            if len(constraint.coefficients) != basic_var_amount:
+                raise IllegalConstraintError(constraint)
+            print(constraint)
+
+    solver = _solve(constraints, bool(exact), method)
+    if exact is None and not solver.unstable:
+        # check the float answer: the model, or the conflict alone exactly
+        if solver.status == Status.SAT:
+            doubtful = not _satisfies(constraints, solver.model())
+        else:
+            doubtful = _solve([constraints[i] for i in sorted(solver.conflict)], True).status == Status.SAT
+    else:
+        doubtful = exact is None
+    if doubtful:
+        if VERBOSE:
+            print("float results are doubtful, solving exactly")
+        solver = _solve(constraints, True)
+
+    if solver.status == Status.SAT:
+        result = solver.model()
+    else:
+        if VERBOSE:
+            print(f"conflicting constraints: {sorted(solver.conflict)}")
+        result = "no solution"
+
     print(f"===>Solving result is {result}")
     return result
 
 
 class TestSimplex(unittest.TestCase):
 
+    case_sat = [Constraint([1, 1], 2), Constraint([2, -1], 0), Constraint([-1, 2], 1)]
+
     def test_simplex_sat(self):
         case = [Constraint([1, 1], 2), Constraint([2, -1], 0), Constraint([-1, 2], 1)]
         result = simplex(case)
@@ -68,6 +376,70 @@ class TestSimplex(unittest.TestCase):
         result = simplex(case)
         self.assertEqual(result, "no solution")
 
+    def test_explanation(self):
+        case = [Constraint([-1, 1, 0], 0), Constraint([-1, 0, 1], 0), Constraint([1, -1, -2], 0),
+                Constraint([0, 0, 1], 1), Constraint([1, 1, 1], -5)]
+        solver = GeneralSimplex(case)
+        for index in range(len(case)):
+            self.assertTrue(solver.assert_constraint(index))
+        self.assertEqual(solver.check(), Status.UNSAT)
+        self.assertEqual(solver.conflict, {0, 2, 3})
+
+    def test_revised(self):
+        assert_series_equal(pd.Series(simplex(self.case_sat, method="revised")), pd.Series({"x0": 1.0, "x1": 1.0}))
+        case = [Constraint([-1, 1, 0], 0), Constraint([-1, 0, 1], 0), Constraint([1, -1, -2], 0),
+                Constraint([0, 0, 1], 1)]
+        self.assertEqual(simplex(case, method="revised"), "no solution")
+        with self.assertRaises(ValueError):
+            simplex(case, exact=True, method="revised")
+
+    def test_system(self):
+        system = ConstraintSystem.from_constraints(self.case_sat)
+        for method in METHODS:
+            assert_series_equal(pd.Series(simplex(system, method=method)), pd.Series({"x0": 1.0, "x1": 1.0}))
+        system = ConstraintSystem.from_dense([[-1, 1, 0], [-1, 0, 1], [1, -1, -2], [0, 0, 1]], [0, 0, 0, 1])
+        self.assertEqual(simplex(system, exact=True), "no solution")
+
+    def test_satisfies(self):
+        case = [Constraint([1, 1], 2), Constraint([0, 0], -1, Rel.LT), Constraint([1, -1], 0, Rel.EQ),
+                Constraint([2, -1], 0, Rel.LT)]
+        system = ConstraintSystem.from_constraints(case)
+        for x0, x1 in [(1, 1), (1.5, 1.5), (2, 0), (0, 2), (1, 1 - 1e-12)]:
+            model = {"x0": x0, "x1": x1}
+            self.assertEqual(_satisfies(system, model), _satisfies(case, model))
+        # a system is solved without building its dense rows
+        with patch.object(ConstraintView, "coefficients", property(lambda view: self.fail("densified"))):
+            for method in METHODS:
+                self.assertEqual(simplex(system, method=method), {"x0": 1.0, "x1": 1.0})
+
+    def test_incremental(self):
+        # x0 + x1 >= 2, x0 - x1 > 0, then x0 = 1 makes x1 < 1 and x1 >= 1
+        case = [Constraint([1, 1], 2), Constraint([1, -1], 0, Rel.LT), Constraint([1, 0], 1, Rel.EQ)]
+        solver = GeneralSimplex(case)
+        solver.assert_constraint(0)
+        solver.assert_constraint(1)
+        self.assertEqual(solver.check(), Status.SAT)
+        model = solver.model()
+        self.assertGreaterEqual(model["x0"] + model["x1"], 2)
+        self.assertGreater(model["x0"], model["x1"])
+        solver.push()
+        solver.assert_constraint(2)
+        self.assertEqual(solver.check(), Status.UNSAT)
+        self.assertEqual(solver.conflict, {0, 1, 2})
+        solver.pop()
+        self.assertEqual(solver.check(), Status.SAT)
+
+    def test_exact(self):
+        # x0 >= 0.1 * 3 and 3 * x0 <= 0.9 leave only x0 = 0.3, which
+        # floats round away: 0.1 * 3 > 0.3
+        case = [Constraint([10, 0], 3), Constraint([-3, 0], -0.9), Constraint([1, -1], 0, Rel.EQ),
+                Constraint([0, 1], 0.30000000000000004)]
+        self.assertEqual(simplex(case, exact=True), "no solution")
+        self.assertEqual(simplex(case[:3], exact=True), {"x0": 0.3, "x1": 0.3})
+        self.assertEqual(simplex(case[:3]), {"x0": 0.3, "x1": 0.3})
+        for exact in (None, False, True):
+            assert_series_equal(pd.Series(simplex(self.case_sat, exact)), pd.Series({"x0": 1.0, "x1": 1.0}))
+
 
 if __name__ == '__main__':
     unittest.main()
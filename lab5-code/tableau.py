@@ -1,43 +1,153 @@
 import unittest
+from fractions import Fraction
+from typing import List
 
+import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
 
 from constraint import *
 
 
+def to_fraction(value) -> Fraction:
+    # a float becomes the fraction of its shortest repr, 0.1 is 1/10
+    return Fraction(str(value)) if isinstance(value, float) else Fraction(value)
+
+
+def as_array(values, exact: bool = False) -> np.ndarray:
+    """A float64 array of `values`, not copied if it is one, or an object array of `Fraction`s if `exact`."""
+    if not exact:
+        return np.asarray(values, dtype=np.float64)
+    array = np.array(values, dtype=object)
+    return np.vectorize(to_fraction, otypes=[object])(array) if array.size else array
+
+
 class Tableau:
-    def __init__(self, constraints):
-        assert constraints, "constraints should not empty"
+    """The tableau of the slack variables s_i = sum_j a_ij * x_j.
+
+    The coefficients are a float64 matrix, or with `exact` an object
+    matrix of `Fraction`s: row i is the basic variable basic[i], column j
+    the non-basic variable nonbasic[j]. Variables are numbered x0..x{n-1}
+    first, then s0..s{m-1}, and `position[v]` is the row of v if it is
+    basic, its column otherwise. The `data` frame with the names of the
+    variables is only built for display and tests.
+    """
+
+    def __init__(self, constraints, exact: bool = False):
+        assert len(constraints), "constraints should not empty"
 
-        col_size = len(constraints[0].coefficients)
         row_size = len(constraints)
-        self.col_names = [f"x{i}" for i in range(col_size)]
-        self.row_names = [f"s{i}" for i in range(row_size)]
+        if isinstance(constraints, ConstraintSystem):
+            # the dense matrix is a copy of the system; the values are
+            # shared with it unless `exact`, the relations always
+            col_size = constraints.n_vars
+            matrix = as_array(constraints.to_dense(), exact)
+            values, relations = as_array(constraints.values, exact), constraints.relations
+        else:
+            col_size = len(constraints[0].coefficients)
+            matrix = as_array([con.coefficients for con in constraints], exact).reshape(row_size, col_size)
+            values = as_array([con.value for con in constraints], exact)
+            relations = [con.relation for con in constraints]
+        self._setup(matrix, [f"x{i}" for i in range(col_size)], [f"s{i}" for i in range(row_size)],
+                    values, relations)
+
+    def _setup(self, matrix: np.ndarray, col_names: List[str], row_names: List[str],
+               values: np.ndarray, relations: List[Rel]):
+        row_size, col_size = matrix.shape
+        self.names = list(col_names) + list(row_names)
+        self.index = {name: var for var, name in enumerate(self.names)}
+        self.exact = matrix.dtype == object
+
+        self.matrix = matrix
+        self.nonbasic = np.arange(col_size)
+        self.basic = np.arange(col_size, col_size + row_size)
+        self.is_basic = np.zeros(col_size + row_size, dtype=bool)
+        self.is_basic[col_size:] = True
+        self.position = np.concatenate([np.arange(col_size), np.arange(row_size)])
+
+        # the constant and the relation of the constraint of each slack variable
+        self.values = values
+        self.relations = relations
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, col_names: List[str], row_names: List[str] | None = None,
+                    values: np.ndarray | None = None, relations: List[Rel] | None = None) -> "Tableau":
+        """Build a tableau on a matrix, which is not copied."""
+        tab = cls.__new__(cls)
+        row_size = matrix.shape[0]
+        if row_names is None:
+            row_names = [f"s{i}" for i in range(row_size)]
+        if values is None:
+            values = np.zeros(row_size, dtype=matrix.dtype)
+        if relations is None:
+            relations = [Rel.LE] * row_size
+        tab._setup(matrix, col_names, row_names, values, relations)
+        return tab
 
-        self.data = pd.DataFrame(data=[con.coefficients for con in constraints],
-                                 columns=self.col_names, index=self.row_names, dtype="float64")
+    @classmethod
+    def from_data(cls, data: pd.DataFrame) -> "Tableau":
+        """Build a tableau from a frame like `data`, with named rows and columns."""
+        return cls.from_matrix(data.to_numpy(dtype=np.float64, copy=True), list(data.columns), list(data.index))
 
-        self.values = pd.Series(data=[con.value for con in constraints], index=self.row_names, dtype="float64")
+    @property
+    def data(self) -> pd.DataFrame:
+        return pd.DataFrame(data=self.matrix.copy(), index=[self.names[var] for var in self.basic],
+                            columns=[self.names[var] for var in self.nonbasic])
 
     def __str__(self):
         return repr(self.data)
 
     def pivot(self, row, col):
-        # Challenge : finish the pivot function of Tableau
-        #
-        # the pivot function will changes the tableau's data like:
-        #
-        #          x0   x1                                           s0   x1
-        #     s0  1.0  1.0            pivot s0 and x0           x0  1.0 -1.0
-        #     s1  2.0 -1.0  --------------------------------->  s1  2.0 -3.0
-        #     s2 -1.0  2.0    s0 = x0+x1;  --> x0 = s0-x1;      s2 -1.0  3.0
-        #                     s1 = 2x0-x1 = 2(s0-x1)-x1 = 2s0 – 3x1
-        #                     s2 = -x0+2x1 = -(s0-x1)+2x1 = -s0+3x1
-        #
-        # check the lecture's slides to understand how this happened.
-        # Your code here:
-        raise NotImplementedError('TODO: Your code here!') 
+        """Swap the basic variable `row` and the non-basic variable `col`.
+
+        Both are names, or positions in the matrix. Solving the row for
+        col gives its new row, which is then substituted in the others:
+
+                 x0   x1                                           s0   x1
+            s0  1.0  1.0            pivot s0 and x0           x0  1.0 -1.0
+            s1  2.0 -1.0  --------------------------------->  s1  2.0 -3.0
+            s2 -1.0  2.0    s0 = x0+x1;  --> x0 = s0-x1;      s2 -1.0  3.0
+                            s1 = 2x0-x1 = 2(s0-x1)-x1 = 2s0 - 3x1
+                            s2 = -x0+2x1 = -(s0-x1)+2x1 = -s0+3x1
+
+        The matrix is updated in place, by a rank-one update of the rows
+        that contain col only.
+        """
+        if isinstance(row, str):
+            var = self.index[row]
+            assert self.is_basic[var], f"{row} is not basic"
+            row = self.position[var]
+        if isinstance(col, str):
+            var = self.index[col]
+            assert not self.is_basic[var], f"{col} is not non-basic"
+            col = self.position[var]
+
+        matrix = self.matrix
+        pivot = matrix[row, col]
+        if pivot == 0:
+            raise ValueError(f"cannot pivot {self.names[self.basic[row]]} and {self.names[self.nonbasic[col]]}"
+                             f" on a zero coefficient")
+        # the row of col: col = (row - sum_{j != col} a_j * x_j) / a_col
+        pivot_row = matrix[row] / -pivot
+        pivot_row[col] = 1 / pivot
+        matrix[row] = pivot_row
+
+        column = matrix[:, col].copy()
+        column[row] = 0
+        rows = np.flatnonzero(column)
+        if len(rows):
+            matrix[rows, col] = 0
+            if self.exact:
+                # each Fraction operation costs, skip the zeros of the pivot row
+                cols = np.flatnonzero(pivot_row)
+                matrix[np.ix_(rows, cols)] += column[rows, None] * pivot_row[cols]
+            else:
+                matrix[rows] += column[rows, None] * pivot_row
+
+        entering, leaving = self.nonbasic[col], self.basic[row]
+        self.basic[row], self.nonbasic[col] = entering, leaving
+        self.is_basic[entering], self.is_basic[leaving] = True, False
+        self.position[entering], self.position[leaving] = row, col
 
 
 class TestTableau(unittest.TestCase):
@@ -65,6 +175,26 @@ class TestTableau(unittest.TestCase):
                                                   dtype="float64"))
         print(tab.data)
 
+    def test_pivot_back(self):
+        # pivoting twice on the same pair gives the tableau back
+        data = pd.DataFrame(data=[[3.0, -1.0, 2.0], [1.0, 4.0, 0.0], [0.0, 2.0, 5.0]],
+                            index=["s0", "s1", "s2"], columns=["x0", "x1", "x2"])
+        tab = Tableau.from_data(data)
+        tab.pivot(1, 0)
+        self.assertEqual(list(tab.data.index), ["s0", "x0", "s2"])
+        tab.pivot("x0", "s1")
+        assert_frame_equal(tab.data, data)
+        with self.assertRaises(ValueError):
+            tab.pivot("s2", "x0")
+
+    def test_exact(self):
+        tab = Tableau([Constraint([0.1, 0.2], 0.3), Constraint([3, 1], 0)], exact=True)
+        tab.pivot("s0", "x0")
+        tab.pivot("s1", "x1")
+        # x0 = s0/0.1 - 2x1, s1 = 30s0 - 5x1: exactly x1 = 6s0 - s1/5
+        self.assertEqual(list(tab.matrix[1]), [Fraction(6), Fraction(-1, 5)])
+        self.assertEqual(tab.values[0], Fraction(3, 10))
+
 
 if __name__ == '__main__':
     unittest.main()